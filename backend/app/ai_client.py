@@ -0,0 +1,250 @@
+import os
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+from opentelemetry import trace
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+from . import prompt as prompts
+from .ai_providers import create_provider, contents_text, genai_errors
+from .metrics import record_ai_call
+from .tracing import span
+
+load_dotenv()
+
+# "gemini" talks to the real API; "stub" (alias "fake") is the deterministic offline provider
+AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini")
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "90"))
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "3"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "8"))
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+# Image generation at 4K routinely takes longer than text calls
+MODEL_DEADLINES: Dict[str, float] = {
+    prompts.MODEL_IMAGE_GEN: float(os.getenv("AI_IMAGE_TIMEOUT_SECONDS", "150")),
+}
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError, ConnectionError)):
+        return True
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return False
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # "Full jitter": uniform over [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive provider failures; after `reset_timeout`
+    a single probe call is let through (half-open) to decide whether to close again."""
+
+    def __init__(self, threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = self.clock()
+
+    def release_probe(self):
+        # The probe ended without a verdict (cancelled): let the next caller probe instead
+        self.probe_in_flight = False
+
+class ResilientModels:
+    """Drop-in for `client.aio.models` that adds an overall deadline per call,
+    jittered exponential retries for transient errors and a circuit breaker per model.
+
+    Failures are surfaced as HTTPExceptions (503/504/502) instead of raw provider errors."""
+
+    def __init__(
+        self,
+        models: Any,
+        timeout: float = AI_TIMEOUT_SECONDS,
+        max_attempts: int = AI_MAX_ATTEMPTS,
+        base_delay: float = AI_RETRY_BASE_DELAY,
+        max_delay: float = AI_RETRY_MAX_DELAY,
+        breaker_threshold: int = AI_BREAKER_THRESHOLD,
+        breaker_reset: float = AI_BREAKER_RESET_SECONDS,
+        deadlines: Optional[Dict[str, float]] = None,
+    ):
+        self._models = models
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.deadlines = MODEL_DEADLINES if deadlines is None else deadlines
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return self.breakers[model]
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None, timeout: Optional[float] = None):
+        thinking = getattr(getattr(config, "thinking_config", None), "thinking_level", None)
+        with span(
+            "gemini.generate_content",
+            **{
+                "gen_ai.system": "gemini",
+                "gen_ai.request.model": model,
+                "gen_ai.request.thinking_level": str(thinking) if thinking is not None else None,
+            },
+        ) as current:
+            if current.is_recording():
+                current.set_attribute("medmnemonic.prompt_chars", len(contents_text(contents)))
+            response = await self._generate(model, contents, config, timeout)
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None and current.is_recording():
+                for attr, value in (
+                    ("gen_ai.usage.input_tokens", getattr(usage, "prompt_token_count", None)),
+                    ("gen_ai.usage.output_tokens", getattr(usage, "candidates_token_count", None)),
+                    ("gen_ai.usage.thinking_tokens", getattr(usage, "thoughts_token_count", None)),
+                ):
+                    if value is not None:
+                        current.set_attribute(attr, value)
+            return response
+
+    async def _generate(self, model: str, contents: Any, config: Any, timeout: Optional[float]):
+        breaker = self.breaker(model)
+        probe = breaker.state == "half_open"
+        if not breaker.allow():
+            record_ai_call(model, 0.0, "circuit_open")
+            # Fail fast while the provider is known to be down: no worker waits on a doomed call
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AI provider temporarily unavailable. Please retry shortly.",
+                headers={"Retry-After": str(max(1, int(breaker.retry_after() + 0.5)))},
+            )
+
+        try:
+            budget = timeout or self.deadlines.get(model, self.timeout)
+            started = time.monotonic()
+            deadline = started + budget
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    response = await asyncio.wait_for(
+                        self._models.generate_content(model=model, contents=contents, config=config),
+                        timeout=remaining,
+                    )
+                    breaker.record_success()
+                    record_ai_call(model, time.monotonic() - started, "ok", response)
+                    return response
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The request itself is bad (400/403/...): the provider is healthy
+                        breaker.record_success()
+                        record_ai_call(model, time.monotonic() - started, "rejected")
+                        print(f"AI call to {model} failed (not retryable): {e}")
+                        # The provider's message stays in the logs: it can echo prompts, keys or internal details
+                        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI provider error")
+
+                    attempt += 1
+                    delay = backoff_delay(attempt - 1, self.base_delay, self.max_delay)
+                    out_of_time = time.monotonic() + delay >= deadline
+                    if attempt >= self.max_attempts or out_of_time:
+                        breaker.record_failure()
+                        print(f"AI call to {model} failed after {attempt} attempt(s): {e!r}")
+                        timed_out = isinstance(e, asyncio.TimeoutError) or out_of_time
+                        record_ai_call(model, time.monotonic() - started, "timeout" if timed_out else "unavailable")
+                        if timed_out:
+                            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="AI provider timed out")
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="AI provider temporarily unavailable. Please retry shortly.",
+                            headers={"Retry-After": "5"},
+                        )
+                    print(f"AI call to {model} failed (attempt {attempt}), retrying in {delay:.2f}s: {e!r}")
+                    trace.get_current_span().add_event("retry", {"attempt": attempt, "delay_s": delay, "error": repr(e)})
+                    await asyncio.sleep(delay)
+        finally:
+            # Also reached on CancelledError (client disconnect, shutdown), which the retry
+            # loop doesn't catch; a probe left in flight would keep the breaker open for good
+            if probe:
+                breaker.release_probe()
+
+
+class ResilientClient:
+    def __init__(self, models: Any, **kwargs):
+        self.models = ResilientModels(models, **kwargs)
+
+# --- Scripted fake (resilience tests) ---
+
+@dataclass
+class FakeResponse:
+    text: Optional[str] = "{}"
+    parts: List[Any] = field(default_factory=list)
+    candidates: List[Any] = field(default_factory=list)
+
+class FakeModels:
+    """Scripted stand-in for `client.aio.models`.
+
+    Each call consumes the next outcome: an exception instance is raised, "hang" sleeps
+    forever (to exercise deadlines), anything else is returned. When the script runs out,
+    `default` is returned."""
+
+    def __init__(self, outcomes: Optional[List[Any]] = None, latency: float = 0.0, default: Any = None):
+        self.outcomes = list(outcomes or [])
+        self.latency = latency
+        self.default = default if default is not None else FakeResponse()
+        self.calls: List[Dict[str, Any]] = []
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+def create_client() -> ResilientClient:
+    return ResilientClient(create_provider(AI_PROVIDER))
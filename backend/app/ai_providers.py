@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import math
+import zlib
+import array
+import struct
+import random
+import asyncio
+import hashlib
+import importlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from . import prompt as prompts
+from .models import MnemonicResponse, QuizList
+
+load_dotenv()
+
+class LazyModule:
+    """Imports the named module on first attribute access. google.genai takes ~0.5s to
+    import, which cold starts shouldn't pay until the first AI call."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+genai_types = LazyModule("google.genai.types")
+genai_errors = LazyModule("google.genai.errors")
+
+AI_STUB_LATENCY_MS = float(os.getenv("AI_STUB_LATENCY_MS", "0"))
+AI_STUB_JITTER = float(os.getenv("AI_STUB_JITTER", "0.2"))  # +/- fraction of the latency
+AI_STUB_ERROR_RATE = float(os.getenv("AI_STUB_ERROR_RATE", "0"))
+AI_STUB_ERROR_CODE = int(os.getenv("AI_STUB_ERROR_CODE", "503"))
+AI_STUB_SEED = int(os.getenv("AI_STUB_SEED", "0"))
+
+# Relative to AI_STUB_LATENCY_MS, roughly matching what we see from Gemini
+STUB_LATENCY_FACTORS: Dict[str, float] = {
+    prompts.MODEL_FLASH: 1.0,
+    prompts.MODEL_IMAGE_GEN: 3.0,
+    prompts.MODEL_TTS: 0.5,
+}
+
+class AIProvider(ABC):
+    """What ai_client needs from a model backend: the `generate_content` call of
+    `genai.Client().aio.models`, returning an object with `.text`, `.parts`,
+    `.candidates` and `.usage_metadata`."""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        ...
+
+class GeminiProvider(AIProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._client = None
+
+    @property
+    def models(self):
+        # Built on the first call rather than at import, see LazyModule. Keep the Client
+        # itself referenced: collecting it closes the HTTP client under .aio.models.
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self._api_key or os.environ.get("GEMINI_API_KEY"))
+        return self._client.aio.models
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        return await self.models.generate_content(model=model, contents=contents, config=config)
+
+# --- Local stub ---
+
+@dataclass
+class StubBlob:
+    data: bytes
+    mime_type: str
+
+@dataclass
+class StubPart:
+    text: Optional[str] = None
+    inline_data: Optional[StubBlob] = None
+
+@dataclass
+class StubContent:
+    parts: List[StubPart]
+
+@dataclass
+class StubCandidate:
+    content: StubContent
+
+@dataclass
+class StubUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+    thoughts_token_count: int = 0
+    total_token_count: int = 0
+
+@dataclass
+class StubResponse:
+    parts: List[StubPart]
+    usage_metadata: StubUsage
+    candidates: List[StubCandidate] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.candidates = [StubCandidate(content=StubContent(parts=self.parts))]
+
+    @property
+    def text(self) -> Optional[str]:
+        texts = [p.text for p in self.parts if p.text is not None]
+        return "".join(texts) if texts else None
+
+def contents_text(contents: Any) -> str:
+    """Flattens the `contents` argument (str, Content, Part or lists of them) to its text."""
+    if contents is None:
+        return ""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(contents_text(c) for c in contents)
+    if getattr(contents, "parts", None) is not None:
+        return contents_text(contents.parts)
+    return getattr(contents, "text", None) or ""
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def _png(width: int, height: int, rgb: tuple) -> bytes:
+    # Minimal valid PNG: solid background with a diagonal band, so images differ visibly per seed
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)  # filter: none
+        for x in range(width):
+            on_band = abs(x * height - y * width) < width * 4
+            rows.extend((255 - c for c in rgb) if on_band else rgb)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(bytes(rows))) + chunk(b"IEND", b"")
+
+def _pcm_tone(text: str, rng: random.Random, sample_rate: int = 24000) -> bytes:
+    # 16-bit mono PCM, like Gemini TTS: ~60ms per word, capped at 20s
+    seconds = min(20.0, max(0.5, 0.06 * len(text.split())))
+    freq = rng.choice([220.0, 261.6, 293.7, 329.6])
+    samples = array.array("h", (
+        int(3000 * math.sin(2 * math.pi * freq * n / sample_rate)) for n in range(int(seconds * sample_rate))
+    ))
+    return samples.tobytes()
+
+class StubProvider(AIProvider):
+    """Deterministic offline provider: the same model + prompt always yields the same,
+    schema-valid response. Latency and error injection make it usable for load tests."""
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = AI_STUB_LATENCY_MS,
+        jitter: float = AI_STUB_JITTER,
+        error_rate: float = AI_STUB_ERROR_RATE,
+        error_code: int = AI_STUB_ERROR_CODE,
+        seed: int = AI_STUB_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.seed = seed
+        # Separate stream so injected failures don't change response content
+        self._fault_rng = random.Random(seed)
+
+    def _rng(self, model: str, text: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{model}:{text}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None):
+        text = contents_text(contents)
+        rng = self._rng(model, text)
+
+        if self.latency_ms:
+            factor = STUB_LATENCY_FACTORS.get(model, 1.0)
+            spread = 1 + self._fault_rng.uniform(-self.jitter, self.jitter)
+            await asyncio.sleep(self.latency_ms * factor * spread / 1000)
+
+        if self.error_rate and self._fault_rng.random() < self.error_rate:
+            raise genai_errors.ServerError(
+                self.error_code, {"error": {"code": self.error_code, "message": "Injected stub failure", "status": "UNAVAILABLE"}}
+            )
+
+        parts = [self._respond(model, text, config, rng)]
+        output_tokens = _estimate_tokens(parts[0].text) if parts[0].text else 258
+        thinking = getattr(getattr(config, "thinking_config", None), "thinking_level", None)
+        usage = StubUsage(
+            prompt_token_count=_estimate_tokens(text),
+            candidates_token_count=output_tokens,
+            thoughts_token_count=output_tokens * 2 if str(thinking).lower().endswith("high") else 0,
+        )
+        usage.total_token_count = usage.prompt_token_count + usage.candidates_token_count + usage.thoughts_token_count
+        return StubResponse(parts=parts, usage_metadata=usage)
+
+    def _respond(self, model: str, text: str, config: Any, rng: random.Random) -> StubPart:
+        modalities = getattr(config, "response_modalities", None) or []
+        if "AUDIO" in modalities:
+            return StubPart(inline_data=StubBlob(data=_pcm_tone(text, rng), mime_type="audio/L16;codec=pcm;rate=24000"))
+        if getattr(config, "image_config", None) is not None or model == prompts.MODEL_IMAGE_GEN:
+            rgb = tuple(rng.randrange(40, 216) for _ in range(3))
+            return StubPart(inline_data=StubBlob(data=_png(64, 48, rgb), mime_type="image/png"))
+
+        schema = getattr(config, "response_schema", None)
+        if schema is MnemonicResponse:
+            return StubPart(text=json.dumps(self._mnemonic(text, rng)))
+        if schema is QuizList:
+            return StubPart(text=json.dumps(self._quiz(text, rng)))
+        if isinstance(schema, dict):
+            story = self._mnemonic(text, rng)
+            return StubPart(text=json.dumps({k: story[k] for k in ("story", "associations", "visualPrompt")}))
+        if "Target Character:" in text:
+            return StubPart(text=json.dumps(self._boxes(text, rng)))
+        return StubPart(text=f"A cartoon scene (stub #{rng.randrange(10**6)}) illustrating: {text[:200].strip()}")
+
+    def _mnemonic(self, text: str, rng: random.Random) -> dict:
+        words = [w for w in re.findall(r"[A-Za-z]{4,}", text)] or ["medicine"]
+        topic = words[0].capitalize()
+        count = rng.randint(3, 5)
+        associations = []
+        for i in range(count):
+            term = words[(i + 1) % len(words)].capitalize()
+            associations.append({
+                "medicalTerm": term,
+                "character": f"{term[:3]}-{rng.choice(['Bot', 'Cat', 'Clown', 'Knight', 'Chef'])}",
+                "explanation": f"The {term[:3]} character stands for {term}.",
+            })
+        return {
+            "topic": topic,
+            "facts": [f"{a['medicalTerm']} is a key fact about {topic}." for a in associations],
+            "story": " ".join(f"{a['character']} appears." for a in associations),
+            "associations": associations,
+            "visualPrompt": f"A busy cartoon scene about {topic} with " + ", ".join(a["character"] for a in associations),
+        }
+
+    def _quiz(self, text: str, rng: random.Random) -> dict:
+        indices = [int(i) for i in re.findall(r"^\s*(\d+)\. Character:", text, re.MULTILINE)] or [0]
+        questions = []
+        for index in indices:
+            questions.append({
+                "associationIndex": index,
+                "question": f"Which concept does association {index} stand for?",
+                "options": [f"Option {index}-{k}" for k in range(4)],
+                "correctOptionIndex": rng.randrange(4),
+                "explanation": "Generated by the offline stub provider.",
+            })
+        return {"questions": questions}
+
+    def _boxes(self, text: str, rng: random.Random) -> list:
+        boxes = []
+        for name in re.findall(r'Target Character: "([^"]+)"', text):
+            y, x = rng.randrange(0, 70), rng.randrange(0, 70)
+            boxes.append({"character": name, "box_2d": [y, x, y + rng.randrange(10, 30), x + rng.randrange(10, 30)]})
+        return boxes
+
+def create_provider(name: str) -> AIProvider:
+    if name in ("stub", "fake"):
+        return StubProvider()
+    if name == "gemini":
+        return GeminiProvider()
+    raise ValueError(f"Unknown AI_PROVIDER: {name}")
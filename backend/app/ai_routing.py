@@ -0,0 +1,111 @@
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+from fastapi import Header, Response
+from dotenv import load_dotenv
+from . import prompt as prompts
+from .ai_providers import genai_types as types
+
+load_dotenv()
+
+AI_SLO_WINDOW = int(os.getenv("AI_SLO_WINDOW", "20"))  # Recent calls considered per task
+AI_SLO_MIN_SAMPLES = int(os.getenv("AI_SLO_MIN_SAMPLES", "5"))
+AI_SLO_COOLDOWN_SECONDS = float(os.getenv("AI_SLO_COOLDOWN_SECONDS", "120"))
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    thinking_level: Optional[str] = None   # Gemini 3 models ("low" / "high")
+    thinking_budget: Optional[int] = None  # Gemini 2.5 models (tokens, 0 = off)
+
+    def thinking_config(self) -> "Optional[types.ThinkingConfig]":
+        if self.thinking_level is not None:
+            return types.ThinkingConfig(thinking_level=self.thinking_level)
+        if self.thinking_budget is not None:
+            return types.ThinkingConfig(thinking_budget=self.thinking_budget)
+        return None
+
+    def describe(self) -> str:
+        if self.thinking_level is not None:
+            return self.thinking_level
+        if self.thinking_budget is not None:
+            return f"budget={self.thinking_budget}"
+        return "none"
+
+@dataclass(frozen=True)
+class TaskRoutes:
+    default: Route
+    fast: Route
+    fallback: Route
+    slo_seconds: float  # p90 above this switches the task to `fallback` for a cooldown
+
+def _route_from_env(task: str, default: Route) -> Route:
+    # AI_ROUTE_MNEMONIC="gemini-3-flash-preview:low"
+    raw = os.getenv(f"AI_ROUTE_{task.upper()}")
+    if not raw:
+        return default
+    model, _, thinking = raw.partition(":")
+    if thinking.isdigit():
+        return Route(model, thinking_budget=int(thinking))
+    return Route(model, thinking_level=thinking or None)
+
+_LITE = Route(prompts.MODEL_FLASH_LITE, thinking_budget=0)
+
+ROUTES: Dict[str, TaskRoutes] = {
+    # Creative generation is where deep thinking pays off
+    "mnemonic": TaskRoutes(Route(prompts.MODEL_FLASH, "high"), Route(prompts.MODEL_FLASH, "low"), _LITE, slo_seconds=45),
+    "story": TaskRoutes(Route(prompts.MODEL_FLASH, "high"), Route(prompts.MODEL_FLASH, "low"), _LITE, slo_seconds=45),
+    "quiz": TaskRoutes(Route(prompts.MODEL_FLASH, "high"), Route(prompts.MODEL_FLASH, "low"), _LITE, slo_seconds=30),
+    # Rewording and box lookup don't need high thinking
+    "visual_prompt": TaskRoutes(Route(prompts.MODEL_VISUAL_PROMPT, "low"), _LITE, _LITE, slo_seconds=15),
+    "bbox": TaskRoutes(Route(prompts.MODEL_FLASH, "low"), Route(prompts.MODEL_FLASH, "low"), Route(prompts.MODEL_FLASH, "low"), slo_seconds=30),
+    # Single-model tasks: nothing cheaper to fall back to
+    "image": TaskRoutes(Route(prompts.MODEL_IMAGE_GEN), Route(prompts.MODEL_IMAGE_GEN), Route(prompts.MODEL_IMAGE_GEN), slo_seconds=90),
+    "speech": TaskRoutes(Route(prompts.MODEL_TTS), Route(prompts.MODEL_TTS), Route(prompts.MODEL_TTS), slo_seconds=30),
+}
+ROUTES = {
+    task: TaskRoutes(_route_from_env(task, r.default), _route_from_env(f"{task}_fast", r.fast), r.fallback, r.slo_seconds)
+    for task, r in ROUTES.items()
+}
+
+class AIRouter:
+    def __init__(self, routes: Dict[str, TaskRoutes], clock=time.monotonic):
+        self.routes = routes
+        self.clock = clock
+        self.latencies: Dict[str, Deque[float]] = {task: deque(maxlen=AI_SLO_WINDOW) for task in routes}
+        self.degraded_until: Dict[str, float] = {}
+
+    def choose(self, task: str, mode: str = "default") -> tuple:
+        """Returns (route, route name) for a task."""
+        routes = self.routes[task]
+        if mode == "fast":
+            return routes.fast, "fast"
+        if self.clock() < self.degraded_until.get(task, 0.0):
+            return routes.fallback, "fallback"
+        return routes.default, "default"
+
+    def record(self, task: str, route_name: str, seconds: float):
+        # Only the default route's latency decides whether we degrade
+        if route_name != "default":
+            return
+        window = self.latencies[task]
+        window.append(seconds)
+        if len(window) < AI_SLO_MIN_SAMPLES:
+            return
+        p90 = sorted(window)[int(0.9 * (len(window) - 1))]
+        if p90 > self.routes[task].slo_seconds:
+            print(f"AI SLO breached for {task} (p90={p90:.1f}s), using fallback for {AI_SLO_COOLDOWN_SECONDS:.0f}s")
+            self.degraded_until[task] = self.clock() + AI_SLO_COOLDOWN_SECONDS
+            window.clear()
+
+router = AIRouter(ROUTES)
+
+def get_ai_mode(x_ai_mode: Optional[str] = Header(None)) -> str:
+    return "fast" if (x_ai_mode or "").lower() == "fast" else "default"
+
+def set_route_headers(response: Response, task: str, route: Route, route_name: str):
+    response.headers["X-AI-Route"] = f"{task}:{route_name}"
+    response.headers["X-AI-Model"] = route.model
+    response.headers["X-AI-Thinking"] = route.describe()
@@ -0,0 +1,84 @@
+import os
+from typing import Any, List, Optional
+from sqlalchemy import JSON, Text, bindparam, cast, literal_column, select, update
+from sqlalchemy.types import TypeDecorator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# saved_stories.associations is stored with one-letter keys and the SRS state packed into an
+# array, e.g. {"t": "Bradycardia", "c": "Slow clock", "e": "...", "r": [2, 2.6, 6, 1700..., 1700...]}
+# instead of repeating "medicalTerm", "explanation", "lastReview", ... in every entry of every
+# row. That shrinks the column every review rewrites. It stays JSON, so the FTS5 triggers and
+# the Postgres tsvector in search.py keep working. The ORM and the API only ever see the full
+# form. Rows written before this (full keys) are read as they are and compacted by the
+# schema-v2 migration or their next write.
+COMPACT_ASSOCIATIONS_ENABLED = os.getenv("COMPACT_ASSOCIATIONS_ENABLED", "1") != "0"
+
+FIELDS = (("medicalTerm", "t"), ("character", "c"), ("explanation", "e"), ("boundingBox", "b"), ("shape", "h"))
+SRS_FIELDS = ("n", "ef", "i", "lastReview", "nextReview")
+FSRS_FIELDS = ("s", "d")  # Optional FSRS memory state, packed after SRS_FIELDS when present
+_REQUIRED = {"medicalTerm", "character", "explanation"}
+_KNOWN = {full for full, _ in FIELDS} | {"srs"}
+
+def compact(association: Any) -> Any:
+    """One association in storage form. Anything unexpected is stored as it is."""
+    if hasattr(association, "model_dump"):
+        association = association.model_dump()
+    if not isinstance(association, dict) or not _REQUIRED <= association.keys() <= _KNOWN:
+        return association
+    if not all(isinstance(association[k], str) for k in _REQUIRED):
+        return association
+    out = {short: association[full] for full, short in FIELDS if association.get(full) is not None}
+    srs = association.get("srs")
+    if srs is not None:
+        if not isinstance(srs, dict) or not set(SRS_FIELDS) <= srs.keys() <= set(SRS_FIELDS + FSRS_FIELDS):
+            return association
+        fsrs = [srs.get(k) for k in FSRS_FIELDS]
+        out["r"] = [srs[k] for k in SRS_FIELDS] + (fsrs if any(v is not None for v in fsrs) else [])
+    return out
+
+def expand(stored: Any) -> Any:
+    """Full (API) form of one stored association, compact or legacy."""
+    if not isinstance(stored, dict) or "t" not in stored or "medicalTerm" in stored:
+        return stored
+    association = {full: stored.get(short) for full, short in FIELDS}
+    packed = stored.get("r")
+    association["srs"] = dict(zip(SRS_FIELDS + FSRS_FIELDS, packed)) if packed is not None else None
+    return association
+
+class CompactAssociations(TypeDecorator):
+    impl = JSON
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[List[Any]], dialect):
+        if value is None or not COMPACT_ASSOCIATIONS_ENABLED:
+            return value
+        return [compact(a) for a in value]
+
+    def process_result_value(self, value: Optional[List[Any]], dialect):
+        if value is None:
+            return value
+        return [expand(a) for a in value]
+
+async def compact_existing(conn, batch_size: int = 500) -> int:
+    """Rewrites rows still stored with full keys (including soft-deleted ones). Returns rows rewritten."""
+    from .sql_models import SavedStory
+
+    table = SavedStory.__table__
+    legacy = cast(literal_column("saved_stories.associations"), Text).like('%"medicalTerm"%')
+    stmt = update(table).where(table.c.id == bindparam("story_id")).values(associations=bindparam("compacted"))
+    rewritten, after = 0, ""
+    while True:
+        rows = (await conn.execute(
+            select(table.c.id, table.c.associations)
+            .where(table.c.id > after, legacy)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            return rewritten
+        # Reading expands, writing compacts
+        await conn.execute(stmt, [{"story_id": r.id, "compacted": r.associations} for r in rows])
+        rewritten += len(rows)
+        after = rows[-1].id
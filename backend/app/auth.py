@@ -15,6 +15,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 43200
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -61,3 +62,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSe
     # Let's return the object, and fix the routers. It's safer.
     return user
 
+
+def get_optional_username(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[str]:
+    # Cheap identity for anonymous-friendly routes (e.g. AI rate limiting):
+    # decodes the token without a DB lookup and never raises.
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
@@ -0,0 +1,135 @@
+import io
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from .blob_store import blob_store, content_key
+from . import prompt as prompts
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it images are sent as uploaded
+    Image = None
+
+load_dotenv()
+
+# Boxes come back on a 0-100 scale, so the model never needs the full 4K render
+BBOX_MAX_IMAGE_PX = int(os.getenv("BBOX_MAX_IMAGE_PX", "1024"))
+BBOX_MIN_MATCH_SCORE = float(os.getenv("BBOX_MIN_MATCH_SCORE", "0.5"))
+
+_STOPWORDS = {"the", "a", "an", "of", "el", "la", "los", "las", "un", "una", "de", "del"}
+
+def sniff_mime(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+def downscale(data: bytes, max_px: Optional[int] = None) -> Tuple[bytes, str]:
+    """Shrinks the longest side to max_px and re-encodes as JPEG. Returns (bytes, mime type)."""
+    max_px = max_px or BBOX_MAX_IMAGE_PX
+    if Image is None:
+        return data, sniff_mime(data)
+    try:
+        image = Image.open(io.BytesIO(data))
+        if max(image.size) <= max_px:
+            return data, sniff_mime(data)
+        image.thumbnail((max_px, max_px))
+        out = io.BytesIO()
+        image.convert("RGB").save(out, format="JPEG", quality=85)
+        return out.getvalue(), "image/jpeg"
+    except Exception as e:
+        print(f"Bbox downscale skipped: {e}")
+        return data, sniff_mime(data)
+
+def cache_key(image: bytes, targets_desc: str) -> str:
+    # The template key changes with the prompt, so boxes from an older prompt aren't reused
+    return content_key("bbox", prompts.TEMPLATES["bbox"].key, hashlib.sha256(image).hexdigest(), targets_desc)
+
+async def get_cached(key: str) -> Optional[list]:
+    data = await blob_store.aget(key)
+    return json.loads(data) if data is not None else None
+
+async def put_cached(key: str, boxes: list):
+    await blob_store.aput(key, json.dumps(boxes).encode("utf-8"))
+
+def normalize_name(name: str) -> List[str]:
+    # "El Gato-Bot!" and "gato bot" normalize to the same tokens
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return [t for t in re.findall(r"[a-z0-9]+", ascii_name.lower()) if t not in _STOPWORDS]
+
+def name_similarity(a: str, b: str) -> float:
+    ta, tb = normalize_name(a), normalize_name(b)
+    if not ta or not tb:
+        return 0.0
+    if ta == tb:
+        return 1.0
+    sa, sb = set(ta), set(tb)
+    if sa <= sb or sb <= sa:
+        return 0.9
+    jaccard = len(sa & sb) / len(sa | sb)
+    return max(jaccard, SequenceMatcher(None, " ".join(ta), " ".join(tb)).ratio())
+
+def hungarian(cost: List[List[float]]) -> List[int]:
+    """Minimum-cost one-to-one assignment for a square matrix; returns the column for each row."""
+    n = len(cost)
+    inf = float("inf")
+    u, v = [0.0] * (n + 1), [0.0] * (n + 1)
+    p, way = [0] * (n + 1), [0] * (n + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (n + 1)
+        used = [False] * (n + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], inf, 0
+            for j in range(1, n + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(n + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assignment = [0] * n
+    for j in range(1, n + 1):
+        assignment[p[j] - 1] = j - 1
+    return assignment
+
+def match_boxes(characters: List[str], boxes: list) -> List[Optional[List[float]]]:
+    """Assigns each character at most one box (and each box at most one character),
+    maximizing total name similarity. Unmatched characters get None."""
+    boxes = [
+        b for b in boxes
+        if isinstance(b, dict) and isinstance(b.get("box_2d"), list) and len(b["box_2d"]) == 4 and any(b["box_2d"])
+    ]
+    if not characters or not boxes:
+        return [None] * len(characters)
+    scores = [[name_similarity(c, str(b.get("character", ""))) for b in boxes] for c in characters]
+    # Pad to a square matrix; dummy rows/columns cost the same as a non-match
+    size = max(len(characters), len(boxes))
+    cost = [[1.0 - scores[i][j] if i < len(characters) and j < len(boxes) else 1.0 for j in range(size)] for i in range(size)]
+    assignment = hungarian(cost)
+    matches = []
+    for i in range(len(characters)):
+        j = assignment[i]
+        matches.append(boxes[j]["box_2d"] if j < len(boxes) and scores[i][j] >= BBOX_MIN_MATCH_SCORE else None)
+    return matches
@@ -0,0 +1,64 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Content-addressed file store for large generated artifacts (audio, analysis results).
+# On Modal point this at the mounted volume, e.g. BLOB_STORE_DIR=/data/blobs.
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./blobs")
+
+def content_key(namespace: str, *parts: str) -> str:
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"{namespace}/{digest}"
+
+class LocalBlobStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        namespace, _, name = key.rpartition("/")
+        if not name or ".." in key:
+            raise ValueError(f"Invalid blob key: {key}")
+        # Shard by hash prefix so no directory grows unbounded
+        return os.path.join(self.root, namespace, name[:2], name)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, data: bytes):
+        await asyncio.to_thread(self.put, key, data)
+
+    async def adelete(self, key: str) -> bool:
+        return await asyncio.to_thread(self.delete, key)
+
+blob_store = LocalBlobStore(BLOB_STORE_DIR)
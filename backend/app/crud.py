@@ -1,11 +1,13 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import update, delete, select, and_
+from sqlalchemy import update, delete, select, and_, or_, func, bindparam, literal
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from . import sql_models, models
+from typing import List, Optional, Tuple
+from . import sql_models, models, search, serialization
+from .tracing import traced
 import time
 
-async def create_user(session: AsyncSession, user_data: dict) -> sql_models.User:
+@traced
+async def create_user(session: AsyncSession, user_data: dict, commit: bool = True) -> sql_models.User:
     # Check if user exists (username)
     existing_user = await get_user_by_username(session, user_data['username'])
     if existing_user:
@@ -18,23 +20,47 @@ async def create_user(session: AsyncSession, user_data: dict) -> sql_models.User
 
     new_user = sql_models.User(**user_data)
     session.add(new_user)
+    if not commit:
+        # Part of a write_queue batch, which commits
+        await session.flush()
+        return new_user
     await session.commit()
     await session.refresh(new_user)
     return new_user
 
+@traced
 async def get_user_by_username(session: AsyncSession, username: str) -> Optional[sql_models.User]:
     result = await session.execute(select(sql_models.User).where(sql_models.User.username == username))
     return result.scalars().first()
 
+@traced
 async def get_user_by_email(session: AsyncSession, email: str) -> Optional[sql_models.User]:
     result = await session.execute(select(sql_models.User).where(sql_models.User.email == email))
     return result.scalars().first()
 
+@traced
 async def get_stories(session: AsyncSession, user_id: str) -> List[sql_models.SavedStory]:
     result = await session.execute(select(sql_models.SavedStory).where(sql_models.SavedStory.user_id == user_id))
     return list(result.scalars().all())
 
-async def create_story(session: AsyncSession, user_id: str, story_data: models.SavedStory) -> sql_models.SavedStory:
+@traced
+async def get_story_rows(session: AsyncSession, user_id: str) -> List[dict]:
+    """Same stories as get_stories, as plain column mappings (no ORM objects) for serialization.py."""
+    columns = [getattr(sql_models.SavedStory, field) for field in serialization.STORY_FIELDS]
+    result = await session.execute(
+        select(*columns).where(
+            sql_models.SavedStory.user_id == user_id,
+            sql_models.SavedStory.deletedAt.is_(None)
+        )
+    )
+    return list(result.mappings().all())
+
+@traced
+async def search_stories(session: AsyncSession, user_id: str, query: str, limit: int = 20, offset: int = 0):
+    return await search.search_stories(session, user_id, query, limit, offset)
+
+@traced
+async def create_story(session: AsyncSession, user_id: str, story_data: models.SavedStory, commit: bool = True) -> sql_models.SavedStory:
     # Convert Pydantic model to dict, exclude 'id' to let DB/Model generate it or use provided one?
     # The Pydantic model "SavedStory" has an ID.
     # If the user provides an ID, we use it. If not, we generate.
@@ -53,118 +79,377 @@ async def create_story(session: AsyncSession, user_id: str, story_data: models.S
     
     db_story = sql_models.SavedStory(**story_dict, user_id=user_id)
     session.add(db_story)
+    if not commit:
+        await session.flush()
+        return db_story
     await session.commit()
     await session.refresh(db_story)
     return db_story
 
-async def get_story(session: AsyncSession, user_id: str, story_id: str) -> Optional[sql_models.SavedStory]:
-    result = await session.execute(
-        select(sql_models.SavedStory).where(
-            sql_models.SavedStory.user_id == user_id,
-            sql_models.SavedStory.id == story_id
-        )
+@traced
+async def get_story(session: AsyncSession, user_id: str, story_id: str, for_update: bool = False) -> Optional[sql_models.SavedStory]:
+    stmt = select(sql_models.SavedStory).where(
+        sql_models.SavedStory.user_id == user_id,
+        sql_models.SavedStory.id == story_id
     )
+    if for_update:
+        # Row lock on Postgres for read-modify-write; SQLite ignores it (writes go through write_queue)
+        stmt = stmt.with_for_update()
+    result = await session.execute(stmt)
     return result.scalars().first()
 
-async def update_story(session: AsyncSession, user_id: str, story_id: str, updated_story: models.SavedStory) -> Optional[sql_models.SavedStory]:
-    # Check existence
-    db_story = await get_story(session, user_id, story_id)
+@traced
+async def update_story(session: AsyncSession, user_id: str, story_id: str, updated_story: models.SavedStory, commit: bool = True) -> Optional[sql_models.SavedStory]:
+    # Read-modify-write: locks the row on Postgres; on SQLite the caller runs this in the write queue
+    db_story = await get_story(session, user_id, story_id, for_update=True)
     if not db_story:
         return None
     
     # Update fields
     story_data = updated_story.model_dump()
-    # Exclude id and user_id from update if necessary, but here we just overwrite
+    # SRS state belongs to the review endpoint: a client saving an edit may hold an older copy,
+    # so each association keeps the stored srs while it is still the same term at the same place
+    stored = db_story.associations or []
+    for index, association in enumerate(story_data.get("associations") or []):
+        if index < len(stored) and stored[index].get("medicalTerm") == association.get("medicalTerm"):
+            association["srs"] = stored[index].get("srs")
     
     for key, value in story_data.items():
         if key != "id" and key != "user_id":
              setattr(db_story, key, value)
     
     session.add(db_story)
+    if not commit:
+        await session.flush()
+        return db_story
     await session.commit()
     await session.refresh(db_story)
     return db_story
 
-async def delete_story(session: AsyncSession, user_id: str, story_id: str) -> bool:
-    db_story = await get_story(session, user_id, story_id)
-    if not db_story:
-        return False
-    
-    session.delete(db_story)
-    await session.commit()
-    return True
+@traced
+async def delete_story(session: AsyncSession, user_id: str, story_id: str, commit: bool = True) -> bool:
+    # Soft delete: a single-row UPDATE, however many artifacts the story has. reaper.py purges it later.
+    result = await session.execute(
+        update(sql_models.SavedStory)
+        .where(
+            sql_models.SavedStory.user_id == user_id,
+            sql_models.SavedStory.id == story_id,
+            sql_models.SavedStory.deletedAt.is_(None)
+        )
+        .values(deletedAt=int(time.time() * 1000))
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        await session.commit()
+    return result.rowcount > 0
 
-# --- Playlist CRUD ---
+# --- Story Artifact CRUD ---
 
-async def get_playlists(session: AsyncSession, user_id: str) -> List[sql_models.Playlist]:
+@traced
+async def get_story_artifacts(session: AsyncSession, story_id: str) -> List[sql_models.StoryArtifact]:
     result = await session.execute(
-        select(sql_models.Playlist)
-        .where(sql_models.Playlist.user_id == user_id)
-        .options(selectinload(sql_models.Playlist.stories))
+        select(sql_models.StoryArtifact)
+        .where(sql_models.StoryArtifact.story_id == story_id)
+        # Background jobs update artifacts from other sessions; don't serve stale identity-map copies
+        .execution_options(populate_existing=True)
     )
     return list(result.scalars().all())
 
-async def get_playlist(session: AsyncSession, user_id: str, playlist_id: str) -> Optional[sql_models.Playlist]:
+@traced
+async def upsert_story_artifact(session: AsyncSession, story_id: str, kind: str, status: str, data=None, error: Optional[str] = None, commit: bool = True) -> sql_models.StoryArtifact:
     result = await session.execute(
-        select(sql_models.Playlist)
-        .where(
-            sql_models.Playlist.id == playlist_id,
-            sql_models.Playlist.user_id == user_id
+        select(sql_models.StoryArtifact).where(
+            sql_models.StoryArtifact.story_id == story_id,
+            sql_models.StoryArtifact.kind == kind
         )
-        .options(selectinload(sql_models.Playlist.stories))
     )
-    return result.scalars().first()
+    artifact = result.scalars().first()
+    if not artifact:
+        artifact = sql_models.StoryArtifact(story_id=story_id, kind=kind)
+        session.add(artifact)
+    artifact.status = status
+    artifact.data = data
+    artifact.error = error
+    artifact.updatedAt = int(time.time() * 1000)
+    if not commit:
+        await session.flush()
+        return artifact
+    await session.commit()
+    return artifact
+
+# --- Quiz Bank CRUD ---
+
+@traced
+async def get_quiz_questions(session: AsyncSession, story_id: str, language: str) -> List[sql_models.QuizQuestion]:
+    result = await session.execute(
+        select(sql_models.QuizQuestion).where(
+            sql_models.QuizQuestion.story_id == story_id,
+            sql_models.QuizQuestion.language == language
+        )
+    )
+    return list(result.scalars().all())
+
+@traced
+async def add_quiz_questions(session: AsyncSession, story_id: str, language: str, questions: List[dict], commit: bool = True):
+    now_ms = int(time.time() * 1000)
+    session.add_all([
+        sql_models.QuizQuestion(story_id=story_id, language=language, createdAt=now_ms, **q)
+        for q in questions
+    ])
+    if not commit:
+        await session.flush()
+        return
+    await session.commit()
+
+@traced
+async def mark_quiz_questions_served(session: AsyncSession, question_ids: List[str], commit: bool = True):
+    if not question_ids:
+        return
+    await session.execute(
+        update(sql_models.QuizQuestion)
+        .where(sql_models.QuizQuestion.id.in_(question_ids))
+        .values(timesServed=sql_models.QuizQuestion.timesServed + 1)
+    )
+    if commit:
+        await session.commit()
+
+@traced
+async def delete_stale_quiz_questions(session: AsyncSession, story_id: str, current_keys: List[str], commit: bool = True):
+    await session.execute(
+        delete(sql_models.QuizQuestion).where(
+            sql_models.QuizQuestion.story_id == story_id,
+            sql_models.QuizQuestion.associationKey.not_in(current_keys)
+        )
+    )
+    if commit:
+        await session.commit()
 
-async def create_playlist(session: AsyncSession, user_id: str, playlist_in: models.PlaylistCreate) -> sql_models.Playlist:
+# --- Playlist CRUD ---
+
+_ID_SEP = "\x1f"  # Story ids may contain commas
+
+def _playlist_summaries_stmt(session: AsyncSession, user_id: str):
+    # One aggregate over playlist_stories: ordered story ids and a count per playlist.
+    # Only the link table and story ids/tombstones are read, never story bodies or images.
+    ps = sql_models.playlist_stories
+    live = and_(sql_models.SavedStory.id == ps.c.story_id, sql_models.SavedStory.deletedAt.is_(None))
+    owned = and_(sql_models.Playlist.id == ps.c.playlist_id, sql_models.Playlist.user_id == user_id)
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import aggregate_order_by
+        agg = (
+            select(
+                ps.c.playlist_id,
+                func.count().label("story_count"),
+                func.string_agg(ps.c.story_id, aggregate_order_by(literal(_ID_SEP), ps.c.position, ps.c.story_id)).label("story_ids"),
+            )
+            .join(sql_models.SavedStory, live).join(sql_models.Playlist, owned)
+            .group_by(ps.c.playlist_id)
+        )
+    else:
+        # SQLite's group_concat keeps the order of an ordered subquery
+        links = (
+            select(ps.c.playlist_id, ps.c.story_id)
+            .join(sql_models.SavedStory, live).join(sql_models.Playlist, owned)
+            .order_by(ps.c.playlist_id, ps.c.position, ps.c.story_id)
+            .subquery()
+        )
+        agg = select(
+            links.c.playlist_id,
+            func.count().label("story_count"),
+            func.group_concat(links.c.story_id, _ID_SEP).label("story_ids"),
+        ).group_by(links.c.playlist_id)
+    agg = agg.subquery()
+    return (
+        select(sql_models.Playlist, agg.c.story_count, agg.c.story_ids)
+        .outerjoin(agg, agg.c.playlist_id == sql_models.Playlist.id)
+        .where(sql_models.Playlist.user_id == user_id)
+        .order_by(sql_models.Playlist.createdAt)
+    )
+
+def _playlist_summary(playlist: sql_models.Playlist, story_count: Optional[int], story_ids: Optional[str]) -> dict:
+    return {
+        "id": playlist.id,
+        "user_id": playlist.user_id,
+        "name": playlist.name,
+        "description": playlist.description,
+        "createdAt": playlist.createdAt,
+        "story_ids": story_ids.split(_ID_SEP) if story_ids else [],
+        "story_count": story_count or 0,
+    }
+
+@traced
+async def get_playlists(session: AsyncSession, user_id: str) -> List[dict]:
+    result = await session.execute(_playlist_summaries_stmt(session, user_id))
+    return [_playlist_summary(*row) for row in result.all()]
+
+@traced
+async def get_playlist(session: AsyncSession, user_id: str, playlist_id: str) -> Optional[dict]:
+    result = await session.execute(
+        _playlist_summaries_stmt(session, user_id).where(sql_models.Playlist.id == playlist_id)
+    )
+    row = result.first()
+    return _playlist_summary(*row) if row else None
+
+@traced
+async def get_playlist_stories_page(session: AsyncSession, playlist_id: str, after: Optional[Tuple[int, str]], limit: int) -> List[Tuple[sql_models.SavedStory, int]]:
+    """Next page of a playlist's stories in order, as (story, position), keyset-paginated after (position, story_id)."""
+    ps = sql_models.playlist_stories
+    stmt = (
+        select(sql_models.SavedStory, ps.c.position)
+        .join(ps, ps.c.story_id == sql_models.SavedStory.id)
+        .where(ps.c.playlist_id == playlist_id)
+        .order_by(ps.c.position, ps.c.story_id)
+        .limit(limit)
+    )
+    if after is not None:
+        position, story_id = after
+        stmt = stmt.where(or_(ps.c.position > position, and_(ps.c.position == position, ps.c.story_id > story_id)))
+    result = await session.execute(stmt)
+    return [(story, position) for story, position in result.all()]
+
+@traced
+async def create_playlist(session: AsyncSession, user_id: str, playlist_in: models.PlaylistCreate, commit: bool = True) -> sql_models.Playlist:
     db_playlist = sql_models.Playlist(
         **playlist_in.model_dump(),
         user_id=user_id,
         createdAt=int(time.time() * 1000)
     )
     session.add(db_playlist)
+    if not commit:
+        await session.flush()
+        return db_playlist
     await session.commit()
     await session.refresh(db_playlist)
     return db_playlist
 
-async def delete_playlist(session: AsyncSession, user_id: str, playlist_id: str) -> bool:
-    db_playlist = await get_playlist(session, user_id, playlist_id)
-    if not db_playlist:
+@traced
+async def delete_playlist(session: AsyncSession, user_id: str, playlist_id: str, commit: bool = True) -> bool:
+    if not await _owns_playlist(session, user_id, playlist_id):
         return False
-    
-    await session.delete(db_playlist)
-    await session.commit()
+    await session.execute(delete(sql_models.playlist_stories).where(sql_models.playlist_stories.c.playlist_id == playlist_id))
+    await session.execute(delete(sql_models.Playlist).where(sql_models.Playlist.id == playlist_id))
+    if commit:
+        await session.commit()
     return True
 
-async def add_story_to_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_id: str) -> bool:
-    playlist = await get_playlist(session, user_id, playlist_id)
-    if not playlist:
-        return False
-    
-    story = await get_story(session, user_id, story_id)
-    if not story:
-        return False
-    
-    if story not in playlist.stories:
-        playlist.stories.append(story)
+async def _owns_playlist(session: AsyncSession, user_id: str, playlist_id: str) -> bool:
+    result = await session.execute(
+        select(sql_models.Playlist.id).where(
+            sql_models.Playlist.id == playlist_id,
+            sql_models.Playlist.user_id == user_id
+        )
+    )
+    return result.scalar() is not None
+
+def _insert_ignore(session: AsyncSession, table):
+    # INSERT ... ON CONFLICT DO NOTHING (INSERT OR IGNORE on SQLite)
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
+
+@traced
+async def get_playlist_story_ids(session: AsyncSession, playlist_id: str) -> List[str]:
+    # Ids only, in playlist order; soft-deleted stories are skipped
+    result = await session.execute(
+        select(sql_models.playlist_stories.c.story_id)
+        .join(sql_models.SavedStory, sql_models.SavedStory.id == sql_models.playlist_stories.c.story_id)
+        .where(sql_models.playlist_stories.c.playlist_id == playlist_id)
+        .order_by(sql_models.playlist_stories.c.position, sql_models.playlist_stories.c.story_id)
+    )
+    return list(result.scalars().all())
+
+@traced
+async def add_stories_to_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_ids: List[str], commit: bool = True) -> Optional[int]:
+    """Appends the user's stories (in the given order) to the playlist, skipping ones already in it.
+    Returns how many were added, or None if the playlist doesn't exist."""
+    if not await _owns_playlist(session, user_id, playlist_id):
+        return None
+    requested = list(dict.fromkeys(story_ids))
+    owned = set((await session.execute(
+        select(sql_models.SavedStory.id).where(
+            sql_models.SavedStory.user_id == user_id,
+            sql_models.SavedStory.id.in_(requested)
+        )
+    )).scalars().all())
+    rows = [sid for sid in requested if sid in owned]
+    if not rows:
+        return 0
+    ps = sql_models.playlist_stories
+    next_position = (await session.execute(
+        select(func.coalesce(func.max(ps.c.position), -1) + 1).where(ps.c.playlist_id == playlist_id)
+    )).scalar_one()
+    result = await session.execute(
+        _insert_ignore(session, ps),
+        [{"playlist_id": playlist_id, "story_id": sid, "position": next_position + i} for i, sid in enumerate(rows)]
+    )
+    if commit:
         await session.commit()
-    return True
+    return result.rowcount
+
+@traced
+async def remove_stories_from_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_ids: List[str], commit: bool = True) -> Optional[int]:
+    if not await _owns_playlist(session, user_id, playlist_id):
+        return None
+    result = await session.execute(
+        delete(sql_models.playlist_stories).where(
+            sql_models.playlist_stories.c.playlist_id == playlist_id,
+            sql_models.playlist_stories.c.story_id.in_(story_ids)
+        )
+    )
+    if commit:
+        await session.commit()
+    return result.rowcount
 
-async def remove_story_from_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_id: str) -> bool:
-    playlist = await get_playlist(session, user_id, playlist_id)
-    if not playlist:
+@traced
+async def reorder_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_ids: List[str], commit: bool = True) -> Optional[List[str]]:
+    """Moves the given stories to the front in the given order; the rest keep their relative order.
+    Returns the new order, or None if the playlist doesn't exist."""
+    if not await _owns_playlist(session, user_id, playlist_id):
+        return None
+    ps = sql_models.playlist_stories
+    rows = (await session.execute(
+        select(ps.c.story_id, ps.c.position).where(ps.c.playlist_id == playlist_id).order_by(ps.c.position, ps.c.story_id)
+    )).all()
+    current = [sid for sid, _ in rows]
+    members = set(current)
+    front = [sid for sid in dict.fromkeys(story_ids) if sid in members]
+    placed = set(front)
+    order = front + [sid for sid in current if sid not in placed]
+    if order != current:
+        # Only the moved rows are rewritten: they go below the current first position, the rest keep theirs
+        start = rows[0].position - len(front)
+        await session.execute(
+            update(ps)
+            .where(ps.c.playlist_id == bindparam("pid"), ps.c.story_id == bindparam("sid"))
+            .values(position=bindparam("pos")),
+            [{"pid": playlist_id, "sid": sid, "pos": start + i} for i, sid in enumerate(front)]
+        )
+        if commit:
+            await session.commit()
+    return order
+
+@traced
+async def add_story_to_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_id: str, commit: bool = True) -> bool:
+    added = await add_stories_to_playlist(session, user_id, playlist_id, [story_id], commit)
+    if added is None:
         return False
-    
-    # Filter out the story
-    playlist.stories = [s for s in playlist.stories if s.id != story_id]
-    await session.commit()
-    return True
+    # Already in the playlist is fine; a missing story is not
+    return added > 0 or story_id in await get_playlist_story_ids(session, playlist_id)
+
+@traced
+async def remove_story_from_playlist(session: AsyncSession, user_id: str, playlist_id: str, story_id: str, commit: bool = True) -> bool:
+    return await remove_stories_from_playlist(session, user_id, playlist_id, [story_id], commit) is not None
 
 # --- Topic and Concept CRUD ---
 
+@traced
 async def get_topics(session: AsyncSession) -> List[sql_models.Topic]:
     result = await session.execute(select(sql_models.Topic).order_by(sql_models.Topic.order))
     return list(result.scalars().all())
 
+@traced
 async def get_topic(session: AsyncSession, topic_id: str) -> Optional[sql_models.Topic]:
     result = await session.execute(
         select(sql_models.Topic)
@@ -173,6 +458,7 @@ async def get_topic(session: AsyncSession, topic_id: str) -> Optional[sql_models
     )
     return result.scalars().first()
 
+@traced
 async def create_topic(session: AsyncSession, topic_in: models.TopicCreate) -> sql_models.Topic:
     db_topic = sql_models.Topic(**topic_in.model_dump())
     session.add(db_topic)
@@ -180,6 +466,7 @@ async def create_topic(session: AsyncSession, topic_in: models.TopicCreate) -> s
     await session.refresh(db_topic)
     return db_topic
 
+@traced
 async def update_topic(session: AsyncSession, topic_id: str, topic_in: models.TopicBase) -> Optional[sql_models.Topic]:
     db_topic = await get_topic(session, topic_id)
     if not db_topic:
@@ -190,6 +477,7 @@ async def update_topic(session: AsyncSession, topic_id: str, topic_in: models.To
     await session.refresh(db_topic)
     return db_topic
 
+@traced
 async def delete_topic(session: AsyncSession, topic_id: str) -> bool:
     db_topic = await get_topic(session, topic_id)
     if not db_topic:
@@ -198,6 +486,7 @@ async def delete_topic(session: AsyncSession, topic_id: str) -> bool:
     await session.commit()
     return True
 
+@traced
 async def get_concepts(session: AsyncSession, topic_id: str) -> List[sql_models.Concept]:
     result = await session.execute(
         select(sql_models.Concept)
@@ -206,6 +495,7 @@ async def get_concepts(session: AsyncSession, topic_id: str) -> List[sql_models.
     )
     return list(result.scalars().all())
 
+@traced
 async def get_concept(session: AsyncSession, concept_id: str) -> Optional[sql_models.Concept]:
     result = await session.execute(
         select(sql_models.Concept)
@@ -214,6 +504,7 @@ async def get_concept(session: AsyncSession, concept_id: str) -> Optional[sql_mo
     )
     return result.scalars().first()
 
+@traced
 async def create_concept(session: AsyncSession, concept_in: models.ConceptCreate) -> sql_models.Concept:
     db_concept = sql_models.Concept(**concept_in.model_dump())
     session.add(db_concept)
@@ -221,6 +512,7 @@ async def create_concept(session: AsyncSession, concept_in: models.ConceptCreate
     await session.refresh(db_concept)
     return db_concept
 
+@traced
 async def update_concept(session: AsyncSession, concept_id: str, concept_in: models.ConceptBase) -> Optional[sql_models.Concept]:
     db_concept = await get_concept(session, concept_id)
     if not db_concept:
@@ -231,6 +523,7 @@ async def update_concept(session: AsyncSession, concept_id: str, concept_in: mod
     await session.refresh(db_concept)
     return db_concept
 
+@traced
 async def delete_concept(session: AsyncSession, concept_id: str) -> bool:
     db_concept = await get_concept(session, concept_id)
     if not db_concept:
@@ -241,6 +534,7 @@ async def delete_concept(session: AsyncSession, concept_id: str) -> bool:
 
 # --- User Progress CRUD ---
 
+@traced
 async def get_user_progress(session: AsyncSession, user_id: str, concept_id: str) -> Optional[sql_models.UserProgress]:
     result = await session.execute(
         select(sql_models.UserProgress)
@@ -251,6 +545,7 @@ async def get_user_progress(session: AsyncSession, user_id: str, concept_id: str
     )
     return result.scalars().first()
 
+@traced
 async def update_user_progress(session: AsyncSession, user_id: str, progress_in: models.UserProgressBase) -> sql_models.UserProgress:
     db_progress = await get_user_progress(session, user_id, progress_in.concept_id)
     if not db_progress:
@@ -267,8 +562,31 @@ async def update_user_progress(session: AsyncSession, user_id: str, progress_in:
     await session.refresh(db_progress)
     return db_progress
 
+@traced
 async def get_all_user_progress(session: AsyncSession, user_id: str) -> List[sql_models.UserProgress]:
     result = await session.execute(
         select(sql_models.UserProgress).where(sql_models.UserProgress.user_id == user_id)
     )
     return list(result.scalars().all())
+
+# --- Scheduler Weights CRUD ---
+
+@traced
+async def get_scheduler_weights(session: AsyncSession, user_id: str) -> Optional[List[float]]:
+    result = await session.execute(
+        select(sql_models.SchedulerWeights.weights).where(sql_models.SchedulerWeights.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+@traced
+async def save_scheduler_weights(session: AsyncSession, user_id: str, weights: List[float], reviews: int, loss: float) -> sql_models.SchedulerWeights:
+    db_weights = await session.get(sql_models.SchedulerWeights, user_id)
+    if not db_weights:
+        db_weights = sql_models.SchedulerWeights(user_id=user_id)
+        session.add(db_weights)
+    db_weights.weights = weights
+    db_weights.reviews = reviews
+    db_weights.loss = loss
+    db_weights.updatedAt = int(time.time() * 1000)
+    await session.commit()
+    return db_weights
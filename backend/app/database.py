@@ -1,21 +1,37 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from fastapi import Depends, Request
 from typing import AsyncGenerator
 import os
+import json
 from dotenv import load_dotenv
+from . import read_routing
 
 load_dotenv()
 
 # Default to SQLite for now if not specified, or construction path for postgres
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./medmnemonic.db")
 
+# Optional read replica for GET endpoints (see get_read_db); unset means reads use the primary
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+
 # If using postgres, ensure the URL starts with postgresql+asyncpg
 if DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+if READ_DATABASE_URL.startswith("postgresql://"):
+    READ_DATABASE_URL = READ_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Statement logging is expensive (it dominates latency under load); opt in with SQL_ECHO=1
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+
+def _json_dumps(value) -> str:
+    # JSON columns without the default ", " / ": " padding or \u escapes
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
 
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True, # Enable echo for debugging purposes
+    echo=SQL_ECHO,
+    json_serializer=_json_dumps,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
@@ -26,9 +42,48 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+if READ_DATABASE_URL:
+    read_engine = create_async_engine(
+        READ_DATABASE_URL,
+        echo=SQL_ECHO,
+        json_serializer=_json_dumps,
+        connect_args={"check_same_thread": False} if "sqlite" in READ_DATABASE_URL else {}
+    )
+    if read_engine.dialect.name == "postgresql":
+        # A write routed here by mistake fails loudly instead of erroring on the standby later
+        read_engine = read_engine.execution_options(postgresql_readonly=True)
+    ReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+else:
+    read_engine = engine
+    ReadSessionLocal = AsyncSessionLocal
+
 class Base(DeclarativeBase):
     pass
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+def get_session_factory() -> async_sessionmaker:
+    # For work that outlives the request (background jobs need their own session)
+    return AsyncSessionLocal
+
+def has_read_replica() -> bool:
+    return read_engine is not engine
+
+async def get_read_db(request: Request, session: AsyncSession = Depends(get_db)) -> AsyncGenerator[AsyncSession, None]:
+    """Session for GET endpoints: the replica, unless this client wrote recently.
+
+    The primary session is the one get_db hands to the rest of the request, so a request that
+    also writes reads its own writes. It only connects if used, so it costs nothing otherwise."""
+    if not has_read_replica() or read_routing.prefers_primary(request):
+        yield session
+        return
+    async with ReadSessionLocal() as replica:
+        yield replica
+
+def get_read_session_factory(request: Request, session_factory: async_sessionmaker = Depends(get_session_factory)) -> async_sessionmaker:
+    # For streamed reads that open their own sessions
+    if not has_read_replica() or read_routing.prefers_primary(request):
+        return session_factory
+    return ReadSessionLocal
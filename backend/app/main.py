@@ -1,44 +1,150 @@
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_STARTED = time.perf_counter()  # Before the imports below, so their cost shows up in the startup report
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 from .routers import auth, stories, ai, playlists, curriculum
-from .database import engine, Base
+from .database import engine, Base, AsyncSessionLocal
+from . import database
 from . import sql_models # Register models
+from . import metrics, tracing, search, reaper, compression, association_codec, static_files, startup, write_queue, read_routing, review_log
+import asyncio
 import os
 
+# Schema setup for new and old databases. Bump startup.SCHEMA_VERSION when adding a migration,
+# otherwise databases already at the current version will skip it.
 @asynccontextmanager
-async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        # Enable WAL mode for better concurrency with SQLite
-        if "sqlite" in str(engine.url):
-            from sqlalchemy import text
-            await conn.execute(text("PRAGMA journal_mode=WAL;"))
-            
-        await conn.run_sync(Base.metadata.create_all)
+async def migration(conn, name: str, idempotent: bool = False):
+    """Runs one migration step in its own savepoint. A step that fails (usually because it was
+    already applied) is rolled back alone: on Postgres a failed statement aborts the whole
+    transaction, which would otherwise silently skip every step after it. Idempotent steps
+    shouldn't fail at all, so their failures are reported as errors."""
+    print(f"DEBUG: Attempting schema migration for {name}...")
+    try:
+        async with conn.begin_nested():
+            yield
+        print(f"DEBUG: Migration SUCCESS: {name}.")
+    except Exception as e:
+        if idempotent:
+            print(f"ERROR: Migration FAILED ({name}): {e}")
+        else:
+            # Column likely already exists
+            print(f"DEBUG: Migration NOTE ({name}): {e}")
+
+async def run_migrations(conn):
+    from sqlalchemy import text
+
+    # Also adds tables introduced since (schema v3: scheduler_weights, v4: review_events)
+    await conn.run_sync(Base.metadata.create_all)
+    
+    # Migration: Add is_admin column if it doesn't exist
+    async with migration(conn, "users.is_admin"):
+        await conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT FALSE"))
         
-        # Migration: Add is_admin column if it doesn't exist
-        print("DEBUG: Attempting schema migration for is_admin...")
+    # Migration: Add concept_id to saved_stories
+    async with migration(conn, "saved_stories.concept_id"):
+        await conn.execute(text("ALTER TABLE saved_stories ADD COLUMN concept_id VARCHAR"))
+
+    # Migration: Add deletedAt (soft-delete tombstone) to saved_stories. Every story query filters
+    # on it (sql_models._hide_deleted_stories), so its index is created even if the column exists
+    async with migration(conn, "saved_stories.deletedAt"):
+        await conn.execute(text('ALTER TABLE saved_stories ADD COLUMN "deletedAt" BIGINT'))
+    async with migration(conn, "ix_saved_stories_deletedAt"):
+        await conn.execute(text('CREATE INDEX IF NOT EXISTS "ix_saved_stories_deletedAt" ON saved_stories ("deletedAt")'))
+
+    # Migration: Add position to playlist_stories, numbering existing links in insertion order
+    async with migration(conn, "playlist_stories.position"):
+        await conn.execute(text("ALTER TABLE playlist_stories ADD COLUMN position INTEGER NOT NULL DEFAULT 0"))
+        if conn.dialect.name == "sqlite":
+            await conn.execute(text(
+                "UPDATE playlist_stories SET position = (SELECT count(*) FROM playlist_stories p2 "
+                "WHERE p2.playlist_id = playlist_stories.playlist_id AND p2.rowid < playlist_stories.rowid)"
+            ))
+        elif conn.dialect.name == "postgresql":
+            # Physical order is the closest thing to insertion order the old rows have
+            await conn.execute(text(
+                "UPDATE playlist_stories SET position = numbered.position FROM ("
+                "SELECT playlist_id, story_id, row_number() OVER (PARTITION BY playlist_id ORDER BY ctid) - 1 AS position "
+                "FROM playlist_stories) numbered "
+                "WHERE playlist_stories.playlist_id = numbered.playlist_id AND playlist_stories.story_id = numbered.story_id"
+            ))
+    async with migration(conn, "ix_playlist_stories_playlist_position"):
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_playlist_stories_playlist_position ON playlist_stories (playlist_id, position)"))
+
+    # Full-text search index for databases created before it existed (also backfills)
+    async with migration(conn, "search index", idempotent=True):
+        await search.ensure_installed(conn)
+
+    # Schema v2: compact associations storage (legacy rows stay readable if this is skipped)
+    if association_codec.COMPACT_ASSOCIATIONS_ENABLED:
+        async with migration(conn, "compact associations"):
+            rewritten = await association_codec.compact_existing(conn)
+            print(f"DEBUG: Compacted associations of {rewritten} stories.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timer = startup.StartupTimer(IMPORT_STARTED)
+    timer.record("import", IMPORT_FINISHED - IMPORT_STARTED)
+    with timer.phase("schema"):
+        async with engine.begin() as conn:
+            # Enable WAL mode for better concurrency with SQLite
+            if "sqlite" in str(engine.url):
+                from sqlalchemy import text
+                await conn.execute(text("PRAGMA journal_mode=WAL;"))
+            schema_current = await startup.schema_is_current(conn)
+            if schema_current:
+                timer.note("schema", f"v{startup.SCHEMA_VERSION} current, skipped")
+            else:
+                await run_migrations(conn)
+                await startup.set_schema_version(conn)
+
+    if not schema_current:
+        # Lets the reaper hand freed pages back to the filesystem without full VACUUMs
+        with timer.phase("vacuum"):
+            try:
+                await reaper.enable_incremental_vacuum(engine)
+            except Exception as e:
+                print(f"DEBUG: Incremental vacuum NOTE: {e}")
+
+    writer_task = None
+    if write_queue.WRITE_QUEUE_ENABLED and engine.dialect.name == "sqlite":
+        write_queue.writer = write_queue.WriteQueue(AsyncSessionLocal)
+        writer_task = asyncio.create_task(write_queue.writer.run())
+
+    review_log_task = None
+    if review_log.REVIEW_LOG_ENABLED:
+        review_log.log = review_log.ReviewLog(AsyncSessionLocal)
+        review_log_task = asyncio.create_task(review_log.log.run())
+
+    reaper_task = None
+    if reaper.REAPER_ENABLED:
+        reaper.reaper = reaper.Reaper(AsyncSessionLocal)
+        reaper_task = asyncio.create_task(reaper.reaper.run())
+        reaper.reaper.wake()  # Finish purges interrupted by the last shutdown
+    timer.report()
+    yield
+    if review_log_task is not None:
+        # Before the writer stops: the last events go through it
+        review_log.log.stop()
+        await review_log_task
+        review_log.log = None
+    if reaper_task is not None:
+        reaper_task.cancel()
         try:
-            from sqlalchemy import text
-            await conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT 0"))
-            print("DEBUG: Migration SUCCESS: Added is_admin column.")
-        except Exception as e:
-            # Column likely already exists
-            print(f"DEBUG: Migration NOTE: {e}")
+            await reaper_task
+        except asyncio.CancelledError:
             pass
-            
-        # Migration: Add concept_id to saved_stories
-        print("DEBUG: Attempting schema migration for saved_stories.concept_id...")
+        reaper.reaper = None
+    if writer_task is not None:
+        # Acknowledge everything already queued before exiting
+        await write_queue.writer.drain()
+        writer_task.cancel()
         try:
-            from sqlalchemy import text
-            await conn.execute(text("ALTER TABLE saved_stories ADD COLUMN concept_id VARCHAR"))
-            print("DEBUG: Migration SUCCESS: Added concept_id column.")
-        except Exception as e:
-             print(f"DEBUG: Migration NOTE: {e}")
-             pass
-    yield
+            await writer_task
+        except asyncio.CancelledError:
+            pass
+        write_queue.writer = None
 
 app = FastAPI(
     title="MedMnemonic API",
@@ -54,8 +160,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-AI-Route", "X-AI-Model", "X-AI-Thinking", "X-Mnemonic-Reused", "Retry-After"],
 )
 
+# Only acts when READ_DATABASE_URL is set: pins recent writers' reads to the primary
+app.add_middleware(read_routing.ReadYourWritesMiddleware, enabled=database.has_read_replica)
+
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+if tracing.TRACING_ENABLED:
+    tracing.setup_tracing()
+    app.add_middleware(tracing.TracingMiddleware)
+
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    if database.has_read_replica():
+        metrics.instrument_engine(database.read_engine)
+    app.include_router(metrics.router)
+
 # API Routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(stories.router, prefix="/api")
@@ -67,18 +191,6 @@ app.include_router(curriculum.router, prefix="/api")
 static_path = os.path.join(os.path.dirname(__file__), "static")
 
 if os.path.isdir(static_path):
-    # Mount assets (Vite specific)
-    assets_path = os.path.join(static_path, "assets")
-    if os.path.isdir(assets_path):
-        app.mount("/assets", StaticFiles(directory=assets_path), name="assets")
-
-    @app.get("/{full_path:path}")
-    async def serve_react_app(full_path: str):
-        if full_path.startswith("api"):
-            raise HTTPException(status_code=404, detail="Not Found")
-            
-        file_path = os.path.join(static_path, full_path)
-        if os.path.isfile(file_path):
-            return FileResponse(file_path)
-            
-        return FileResponse(os.path.join(static_path, "index.html"))
+    static_files.mount_spa(app, static_path)
+
+IMPORT_FINISHED = time.perf_counter()
@@ -0,0 +1,215 @@
+import os
+import time
+import secrets
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+# Minimal Prometheus text-format registry. Recording is a dict lookup plus a couple of
+# integer increments; all formatting work happens only when /metrics is scraped.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# /metrics sits on the public app, so scraping needs "Authorization: Bearer <METRICS_TOKEN>".
+# Without a token configured the endpoint answers 404; recording still happens.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"'.replace("\n", " ") for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- HTTP ---
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]))
+http_requests_in_flight = {"value": 0}
+
+# --- AI (one series per prompt.MODEL_* model name) ---
+ai_call_duration = registry.register(Histogram(
+    "ai_call_duration_seconds", "Gemini call latency including retries", ["model", "outcome"]))
+ai_tokens = registry.register(Histogram(
+    "ai_tokens", "Tokens per Gemini call", ["model", "kind"], buckets=TOKEN_BUCKETS))
+ai_tokens_total = registry.register(Counter(
+    "ai_tokens_total", "Total tokens used", ["model", "kind"]))
+ai_failures_total = registry.register(Counter(
+    "ai_failures_total", "Failed Gemini calls", ["model", "reason"]))
+
+# --- Prompts (estimated locally before the call, see app/prompt_templates.py) ---
+prompt_tokens = registry.register(Histogram(
+    "prompt_tokens_estimated", "Estimated prompt tokens per render", ["template", "version"], buckets=TOKEN_BUCKETS))
+prompt_renders_total = registry.register(Counter(
+    "prompt_renders_total", "Prompt renders by outcome (ok, truncated, rejected)", ["template", "outcome"]))
+
+# --- DB ---
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement type", ["statement"]))
+db_errors_total = registry.register(Counter(
+    "db_errors_total", "Failed SQL statements", ["statement"]))
+
+def record_ai_call(model: str, duration: float, outcome: str, response=None):
+    if not METRICS_ENABLED:
+        return
+    ai_call_duration.observe(duration, model, outcome)
+    if outcome != "ok":
+        ai_failures_total.inc(model, outcome)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, attr in (("input", "prompt_token_count"), ("output", "candidates_token_count"), ("thinking", "thoughts_token_count")):
+        count = getattr(usage, attr, None)
+        if count:
+            ai_tokens.observe(count, model, kind)
+            ai_tokens_total.inc(model, kind, amount=count)
+
+def record_prompt(template: str, version: int, tokens: int, outcome: str):
+    if not METRICS_ENABLED:
+        return
+    prompt_tokens.observe(tokens, template, str(version))
+    prompt_renders_total.inc(template, outcome)
+
+def statement_type(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    verb = head[0].upper() if head else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "CREATE", "ALTER") else "OTHER"
+
+def instrument_engine(engine):
+    """Times every statement on an (async) engine, grouped by statement type."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        db_query_duration.observe(time.perf_counter() - start, statement_type(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        db_errors_total.inc(statement_type(context.statement or ""))
+
+def route_template(scope) -> str:
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    # Depending on the FastAPI version, routes of an included router report their path
+    # without the include prefix (/stories/{id} instead of /api/stories/{id}); take the
+    # missing leading segments from the concrete path.
+    path = scope["path"]
+    missing = path.count("/") - template.count("/")
+    if missing <= 0 or ":path}" in template:
+        return template
+    return "/".join(path.split("/")[:missing + 1]) + template
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task overhead) timing each request
+    under its route template, e.g. /api/stories/{id}, so ids don't explode cardinality."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder: Dict[str, Optional[int]] = {"status": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_requests_in_flight["value"] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight["value"] -= 1
+            status = status_holder["status"] or 500
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route_template(scope), str(status))
+
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    body = registry.render() + (
+        "# HELP http_requests_in_flight Requests currently being served\n"
+        "# TYPE http_requests_in_flight gauge\n"
+        f"http_requests_in_flight {http_requests_in_flight['value']}\n"
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -1,5 +1,5 @@
-from typing import List, Optional, Literal
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from typing import Any, List, Optional, Literal
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_serializer
 
 # --- Auth Models ---
 class UserRegister(BaseModel):
@@ -66,6 +66,18 @@ class SRSMetadata(BaseModel):
     i: int = Field(description="Interval in days")
     lastReview: int = Field(description="Timestamp of last review")
     nextReview: int = Field(description="Timestamp of next review")
+    # FSRS memory state, only present on cards scheduled by FSRS
+    s: Optional[float] = Field(default=None, description="Stability in days (FSRS)")
+    d: Optional[float] = Field(default=None, description="Difficulty, 1-10 (FSRS)")
+
+    @model_serializer(mode="wrap")
+    def _omit_missing_fsrs_state(self, handler):
+        # SM-2 cards keep their original shape (stored and in responses) instead of gaining nulls
+        data = handler(self)
+        for key in ("s", "d"):
+            if data.get(key) is None:
+                data.pop(key, None)
+        return data
 
 class MnemonicAssociation(BaseModel):
     medicalTerm: str
@@ -90,6 +102,19 @@ class SavedStory(MnemonicResponse):
     createdAt: int
     imageData: Optional[str] = None
 
+class StorySearchHit(BaseModel):
+    id: str
+    topic: str
+    snippet: str  # Matched text with terms wrapped in <mark></mark>
+    score: float
+
+class StorySearchResults(BaseModel):
+    query: str
+    total: int
+    limit: int
+    offset: int
+    hits: List[StorySearchHit]
+
 class QuizQuestion(BaseModel):
     associationIndex: int
     question: str
@@ -105,12 +130,27 @@ class GenerateMnemonicRequest(BaseModel):
     text: str
     pdfBase64: Optional[str] = None
     language: Literal['en', 'es'] = 'en'
+    # Opt-in: return a near-identical public mnemonic (flagged with X-Mnemonic-Reused) instead of generating
+    allowReuse: bool = False
 
 class RegenerateStoryRequest(BaseModel):
     topic: str
     facts: List[str]
     language: Literal['en', 'es'] = 'en'
 
+class SimilarityQuery(BaseModel):
+    text: Optional[str] = None
+    facts: List[str] = []
+    language: Optional[Literal['en', 'es']] = None
+    limit: int = Field(5, ge=1, le=20)
+
+class SimilarMnemonic(BaseModel):
+    kind: Literal['story', 'concept']
+    id: str
+    topic: str
+    score: float
+    conceptId: Optional[str] = None
+
 class RegenerateStoryResponse(BaseModel):
     story: str
     associations: List[MnemonicAssociation]
@@ -142,9 +182,31 @@ class GenerateQuizRequest(BaseModel):
 class GenerateSpeechRequest(BaseModel):
     text: str
     language: Literal['en', 'es'] = 'en'
+    voice: str = 'Puck'
 
 class GenerateSpeechResponse(BaseModel):
     audioData: str
+    audioKey: Optional[str] = None  # Cached audio, playable from GET /api/ai/speech/{audioKey}
+
+class PrepareStoryRequest(BaseModel):
+    language: Literal['en', 'es'] = 'en'
+    kinds: List[Literal['quiz', 'speech', 'image']] = ['quiz', 'speech', 'image']
+    force: bool = False
+
+class StoryArtifact(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    kind: str
+    status: str
+    data: Optional[Any] = None
+    error: Optional[str] = None
+    updatedAt: int
+
+class ModelBudgetUsage(BaseModel):
+    model: str
+    user_remaining: float
+    user_capacity: float
+    global_remaining: float
+    global_capacity: float
 
 class ReviewRequest(BaseModel):
     associationIndex: int
@@ -164,6 +226,10 @@ class Playlist(PlaylistBase):
     user_id: str
     createdAt: int
     story_ids: List[str] = []
+    story_count: int = 0
+
+class PlaylistStoryIds(BaseModel):
+    storyIds: List[str] = Field(..., max_length=1000)
 
 
 # --- Admin Models ---
@@ -0,0 +1,85 @@
+import time
+import asyncio
+from typing import List
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from . import crud, quiz_bank, write_queue
+from .models import MnemonicResponse, GenerateQuizRequest, GenerateImageRequest, GenerateSpeechRequest
+from .routers import ai
+from .tracing import span
+
+# Artifacts still "pending" after this long are assumed lost (e.g. the container was recycled)
+STALE_PENDING_MS = 10 * 60 * 1000
+
+def kinds_to_run(requested: List[str], existing: dict, force: bool) -> List[str]:
+    now_ms = int(time.time() * 1000)
+    kinds = []
+    for kind in requested:
+        artifact = existing.get(kind)
+        if force or artifact is None or artifact.status == "failed":
+            kinds.append(kind)
+        elif artifact.status == "pending" and now_ms - artifact.updatedAt > STALE_PENDING_MS:
+            kinds.append(kind)
+    return kinds
+
+async def _generate_artifact(kind: str, mnemonic: MnemonicResponse, language: str, identity: str):
+    # Calls the AI endpoint functions directly, so routing, rate limits, retries and the breaker still apply
+    if kind == "quiz":
+        questions = await ai.generate_quiz(GenerateQuizRequest(mnemonicData=mnemonic, language=language), Response(), "default", identity)
+        return [q.model_dump() for q in questions]
+    if kind == "image":
+        result = await ai.generate_image(GenerateImageRequest(visualPrompt=mnemonic.visualPrompt), Response(), "default", identity)
+        return result.imageData
+    if kind == "speech":
+        # Store only the blob key; the audio itself lives in the blob store (GET /api/ai/speech/{key})
+        result = await ai.generate_speech(GenerateSpeechRequest(text=mnemonic.story, language=language), Response(), "default", identity)
+        return {"audioKey": result.audioKey}
+    raise ValueError(f"Unknown artifact kind: {kind}")
+
+async def _run_one(session_factory: async_sessionmaker, user_id: str, story_id: str, kind: str, mnemonic: MnemonicResponse, language: str, identity: str, force: bool = False):
+    writer = write_queue.writer_for(session_factory)
+    with span("pipeline.artifact", kind=kind, story_id=story_id):
+        try:
+            result = await _generate_artifact(kind, mnemonic, language, identity)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            print(f"Pipeline {kind} failed for story {story_id}: {detail}")
+            await writer.submit(lambda s: crud.upsert_story_artifact(s, story_id, kind, "failed", error=str(detail), commit=False))
+            return
+
+        # Persist each artifact as soon as it is ready instead of waiting for the slowest one
+        async def save(session):
+            data = result
+            if kind == "image":
+                story = await crud.get_story(session, user_id, story_id, for_update=True)
+                # A forced run replaces the image; otherwise one saved meanwhile (e.g. by the client) wins
+                if story is not None and (force or not story.imageData):
+                    story.imageData = result
+                # The image lives on the story itself; the artifact only tracks status
+                data = None
+            if kind == "quiz":
+                # Seed the quiz bank so the first quiz is already a DB read
+                rows = quiz_bank.to_rows(result, [a.model_dump() for a in mnemonic.associations])
+                await crud.add_quiz_questions(session, story_id, language, rows, commit=False)
+            await crud.upsert_story_artifact(session, story_id, kind, "ready", data=data, commit=False)
+
+        await writer.submit(save)
+
+async def prepare_story_artifacts(session_factory: async_sessionmaker, user_id: str, story_id: str, kinds: List[str], language: str, identity: str, force: bool = False):
+    """Generates quiz, image and speech for a saved story concurrently, so the total
+    wait is the slowest job instead of the sum of three sequential round trips."""
+    async with session_factory() as session:
+        story = await crud.get_story(session, user_id, story_id)
+        if story is None:
+            return
+        mnemonic = MnemonicResponse(
+            topic=story.topic,
+            facts=story.facts,
+            story=story.story,
+            associations=story.associations,
+            visualPrompt=story.visualPrompt,
+        )
+
+    await asyncio.gather(*(
+        _run_one(session_factory, user_id, story_id, kind, mnemonic, language, identity, force) for kind in kinds
+    ))
@@ -1,19 +1,23 @@
 from typing import List, Dict, Any
+import os
 import json
+import textwrap
+from .prompt_templates import registry as TEMPLATES
 
 # --- Model Constants ---
 MODEL_FLASH = "gemini-3-flash-preview"
 MODEL_VISUAL_PROMPT = "gemini-3-flash-preview"
 MODEL_IMAGE_GEN = "gemini-3-pro-image-preview"
 MODEL_TTS = "gemini-2.5-flash-preview-tts"
+MODEL_FLASH_LITE = "gemini-2.5-flash-lite" # Cheap fallback when latency SLOs are breached
 
 # --- Language Instructions ---
-LANGUAGE_INSTRUCTION_ES = """
+LANGUAGE_INSTRUCTION_ES = textwrap.dedent("""
         IMPORTANT: OUTPUT MUST BE IN SPANISH (ESPAÑOL).
         - The internal JSON keys (like 'story', 'medicalTerm') MUST remain in English.
         - ALL values, text, descriptions, story content, explanations, and terms MUST be in Spanish.
         - The characters should have Spanish names or names that make sense in a Spanish pun context.
-        """
+        """).strip()
 LANGUAGE_INSTRUCTION_EN = "Provide all output in English."
 
 def get_language_instruction(lang: str) -> str:
@@ -21,12 +25,18 @@ def get_language_instruction(lang: str) -> str:
         return LANGUAGE_INSTRUCTION_ES
     return LANGUAGE_INSTRUCTION_EN
 
-# --- Prompts ---
+# --- Input Budgets (estimated tokens, see prompt_templates.estimate_tokens) ---
+# Pasted notes beyond this are truncated rather than sent; PDFs are attached separately.
+MNEMONIC_MAX_INPUT_TOKENS = int(os.getenv("MNEMONIC_MAX_INPUT_TOKENS", "30000"))
+CONTEXT_MAX_TOKENS = 8000
 
-def get_mnemonic_prompt(language: str) -> str:
-    return f"""
+# --- Templates ---
+# Bump a template's version when its wording changes meaningfully; the version (and a hash of
+# the text) is part of `TEMPLATES[name].key`, which cache keys include.
+
+TEMPLATES.register("mnemonic", 1, """
     Act as an expert medical educator (like Picmonic or SketchyMedical).
-    {get_language_instruction(language)}
+    {language_instruction}
     
     1. Analyze the input to extract high-yield medical facts, dosages, symptoms, and treatments.
     2. Create a wacky, memorable mnemonic story to explain these facts. 
@@ -37,15 +47,15 @@ def get_mnemonic_prompt(language: str) -> str:
     4. Create a visual prompt for an illustration of this story.
 
     Output a single JSON object.
-    """
+    """)
 
-def get_regenerate_story_prompt(topic: str, facts: List[str], language: str) -> str:
-    facts_str = "\n".join([f"- {f}" for f in facts])
-    return f"""
-    {get_language_instruction(language)}
+TEMPLATES.register("mnemonic_input", 1, "{text}", max_tokens=MNEMONIC_MAX_INPUT_TOKENS, truncate="text")
+
+TEMPLATES.register("regenerate_story", 1, """
+    {language_instruction}
     Topic: {topic}
     Facts:
-    {facts_str}
+    {facts}
 
     Based on these SPECIFIC facts, generate:
     1. A wacky mnemonic story.
@@ -53,57 +63,52 @@ def get_regenerate_story_prompt(topic: str, facts: List[str], language: str) ->
     3. A visual prompt for the image.
     
     Maintain the humorous, mnemonic style.
-    """
-
-def get_regenerate_visual_prompt_prompt(topic: str, story: str, associations: List[Any]) -> str:
-    # associations should be a list of dicts or objects with .dict()
-    # We'll assume the caller passes the list of dicts or handles serialization before calling if complex
-    # But for type safety let's assume it's data we can serialize
-    
-    # If associations are pydantic models, caller should dump them. 
-    # Or we can handle it if we type hint Any.
-    
-    # Let's assume serialization happens outside or we just json.dumps it here if it's a list.
-    assoc_str = json.dumps(associations) if isinstance(associations, list) else str(associations)
+    """, max_tokens=CONTEXT_MAX_TOKENS, truncate="facts")
 
-    return f"""
+TEMPLATES.register("visual_prompt", 1, """
     Topic: {topic}
     Story: {story}
-    Associations: {assoc_str}
+    Associations: {associations}
 
     Create a highly detailed visual description (visual prompt) for an image generator to illustrate this story in a cartoon/mnemonic style. 
     Focus on visual clarity of the characters.
-    """
+    """, max_tokens=CONTEXT_MAX_TOKENS, truncate="story")
 
-def get_image_generation_prompt(visual_prompt: str) -> str:
-    return f"""A vivid, cartoon-style educational illustration. 
+TEMPLATES.register("image", 1, """
+    A vivid, cartoon-style educational illustration. 
     Subject: {visual_prompt}. 
     Style: Hand-drawn animation style, bright colors, bold outlines, caricature-like characters, humorous, clear visual metaphors. 
-    Composition: A single cohesive scene. High quality, detailed."""
+    Composition: A single cohesive scene. High quality, detailed.
+    """, max_tokens=4000, truncate="visual_prompt")
 
-def get_bbox_analysis_prompt(targets_desc: str) -> str:
-    return f"""
-        You are an expert visual analyzer for medical mnemonic illustrations.
-        
-        Task: Identify the 2D bounding box for the specific characters listed below in the provided image.
-        
-        List of Targets:
-        {targets_desc}
-
-        Instructions:
-        1. Analyze the image to locate the character described. Use the "Visual Description/Context" to disambiguate if necessary.
-        2. Return the bounding box [ymin, xmin, ymax, xmax] (scale 0-100) for each character found.
-        3. If a character is not found, omit it from the list or return 0,0,0,0.
-        
-        Output Format:
-        Return a JSON array of objects. Each object must have:
-        - 'character': The exact "Target Character" name.
-        - 'box_2d': [ymin, xmin, ymax, xmax].
-        """
+TEMPLATES.register("bbox", 1, """
+    You are an expert visual analyzer for medical mnemonic illustrations.
+    
+    Task: Identify the 2D bounding box for the specific characters listed below in the provided image.
+    
+    List of Targets:
+    {targets_desc}
 
-def get_quiz_prompt(context: str, language: str) -> str:
-    return f"""
-    {get_language_instruction(language)}
+    Instructions:
+    1. Analyze the image to locate the character described. Use the "Visual Description/Context" to disambiguate if necessary.
+    2. Return the bounding box [ymin, xmin, ymax, xmax] (scale 0-100) for each character found.
+    3. If a character is not found, omit it from the list or return 0,0,0,0.
+    
+    Output Format:
+    Return a JSON array of objects. Each object must have:
+    - 'character': The exact "Target Character" name.
+    - 'box_2d': [ymin, xmin, ymax, xmax].
+    """, max_tokens=CONTEXT_MAX_TOKENS)
+
+TEMPLATES.register("quiz_context", 1, """
+    Topic: {topic}
+    Key Facts: {facts}
+    Associations:
+    {associations}
+    """, max_tokens=CONTEXT_MAX_TOKENS, truncate="facts")
+
+TEMPLATES.register("quiz", 1, """
+    {language_instruction}
     Generate a challenging multiple-choice quiz based on the provided associations for a medical student audience.
     
     For each association listed above:
@@ -118,8 +123,44 @@ def get_quiz_prompt(context: str, language: str) -> str:
     4. Provide a brief explanation.
 
     Generate questions for ALL associations.
-    """
+    """)
+
+# Narration is chunked by sentence before it gets here (app/tts.py), so chunks are small
+TEMPLATES.register("speech", 1, "Read the following aloud in a warm, friendly and engaging tone ({language_name}): {text}", max_tokens=2000)
+
+# --- Prompts ---
+
+def get_mnemonic_prompt(language: str) -> str:
+    return TEMPLATES.render("mnemonic", language_instruction=get_language_instruction(language)).text
+
+def get_mnemonic_input(text: str) -> str:
+    return TEMPLATES.render("mnemonic_input", text=text).text
+
+def get_regenerate_story_prompt(topic: str, facts: List[str], language: str) -> str:
+    facts_str = "\n".join([f"- {f}" for f in facts])
+    return TEMPLATES.render(
+        "regenerate_story", language_instruction=get_language_instruction(language), topic=topic, facts=facts_str
+    ).text
+
+def get_regenerate_visual_prompt_prompt(topic: str, story: str, associations: List[Any]) -> str:
+    # associations should be a list of dicts (pydantic models dumped by the caller).
+    # Compact separators and raw unicode keep the token count down.
+    assoc_str = json.dumps(associations, separators=(",", ":"), ensure_ascii=False) if isinstance(associations, list) else str(associations)
+    return TEMPLATES.render("visual_prompt", topic=topic, story=story, associations=assoc_str).text
+
+def get_image_generation_prompt(visual_prompt: str) -> str:
+    return TEMPLATES.render("image", visual_prompt=visual_prompt).text
+
+def get_bbox_analysis_prompt(targets_desc: str) -> str:
+    return TEMPLATES.render("bbox", targets_desc=targets_desc).text
+
+def get_quiz_context(topic: str, facts: List[str], associations_str: str) -> str:
+    return TEMPLATES.render("quiz_context", topic=topic, facts="; ".join(facts), associations=associations_str).text
+
+def get_quiz_prompt(context: str, language: str) -> str:
+    # `context` is sent as its own part (see get_quiz_context)
+    return TEMPLATES.render("quiz", language_instruction=get_language_instruction(language)).text
 
 def get_speech_prompt(text: str, language: str) -> str:
     lang_name = 'Spanish' if language == 'es' else 'English'
-    return f"Read the following aloud in a warm, friendly and engaging tone ({lang_name}): {text}"
+    return TEMPLATES.render("speech", language_name=lang_name, text=text).text
@@ -0,0 +1,136 @@
+import re
+import math
+import hashlib
+import textwrap
+from dataclasses import dataclass, field
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from . import metrics
+
+# Local token estimate: ~4 characters per token for words, one per punctuation mark.
+# Within ~15% of Gemini's counts for English/Spanish prose, which is enough for budgeting.
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    return sum(math.ceil(len(p) / 4) if p[0].isalnum() or p[0] == "_" else 1 for p in _PIECES.findall(text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text at a word boundary so its estimate fits max_tokens."""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Start from a proportional guess, then trim word by word
+    cut = text[:int(len(text) * max_tokens / max(estimate_tokens(text), 1))]
+    while cut and estimate_tokens(cut) > max_tokens:
+        cut = cut[:cut.rfind(" ")] if " " in cut else cut[:-1]
+    return cut.rstrip()
+
+class PromptTooLarge(HTTPException):
+    def __init__(self, name: str, tokens: int, limit: int):
+        super().__init__(status_code=413, detail=f"Input too large for '{name}': ~{tokens} tokens (limit {limit})")
+
+@dataclass
+class TemplateStats:
+    calls: int = 0
+    tokens_total: int = 0
+    tokens_max: int = 0
+    truncated: int = 0
+    rejected: int = 0
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    text: str
+    template: str
+    version: int
+    tokens: int
+
+@dataclass
+class PromptTemplate:
+    name: str
+    version: int
+    source: str
+    max_tokens: Optional[int] = None  # Estimated input budget for the rendered prompt
+    truncate: Optional[str] = None    # Field shortened to fit max_tokens; without it oversize input is rejected
+    stats: TemplateStats = field(default_factory=TemplateStats)
+
+    def __post_init__(self):
+        # Compiled once: dedented literal/field segments, so rendering is a join
+        self.source = textwrap.dedent(self.source).strip()
+        self._segments: List[Tuple[str, Optional[str]]] = [
+            (literal, field_name) for literal, field_name, _, _ in Formatter().parse(self.source)
+        ]
+        self.fields = [f for _, f in self._segments if f is not None]
+
+    @property
+    def key(self) -> str:
+        """Stable identifier for cache keys; changes whenever the wording or version changes."""
+        digest = hashlib.sha256(self.source.encode("utf-8")).hexdigest()[:8]
+        return f"{self.name}@v{self.version}:{digest}"
+
+    def _join(self, values: Dict[str, str]) -> str:
+        return "".join(literal + (values[f] if f is not None else "") for literal, f in self._segments)
+
+    def render(self, **values) -> RenderedPrompt:
+        values = {k: str(v) for k, v in values.items()}
+        text = self._join(values)
+        tokens = estimate_tokens(text)
+        self.stats.calls += 1
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            if self.truncate is None or self.truncate not in values:
+                self.stats.rejected += 1
+                metrics.record_prompt(self.name, self.version, tokens, "rejected")
+                raise PromptTooLarge(self.name, tokens, self.max_tokens)
+            others = tokens - estimate_tokens(values[self.truncate])
+            values[self.truncate] = truncate_to_tokens(values[self.truncate], self.max_tokens - others)
+            text = self._join(values)
+            tokens = estimate_tokens(text)
+            if tokens > self.max_tokens:
+                # The fixed part of the prompt alone is over budget
+                self.stats.rejected += 1
+                metrics.record_prompt(self.name, self.version, tokens, "rejected")
+                raise PromptTooLarge(self.name, tokens, self.max_tokens)
+            self.stats.truncated += 1
+            outcome = "truncated"
+        else:
+            outcome = "ok"
+        self.stats.tokens_total += tokens
+        self.stats.tokens_max = max(self.stats.tokens_max, tokens)
+        metrics.record_prompt(self.name, self.version, tokens, outcome)
+        return RenderedPrompt(text, self.name, self.version, tokens)
+
+class TemplateRegistry:
+    def __init__(self):
+        self.templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, version: int, source: str, **kwargs) -> PromptTemplate:
+        if name in self.templates:
+            raise ValueError(f"Prompt template '{name}' already registered")
+        template = PromptTemplate(name, version, source, **kwargs)
+        self.templates[name] = template
+        return template
+
+    def __getitem__(self, name: str) -> PromptTemplate:
+        return self.templates[name]
+
+    def render(self, name: str, **values) -> RenderedPrompt:
+        return self.templates[name].render(**values)
+
+    def describe(self) -> List[dict]:
+        return [
+            {
+                "name": t.name,
+                "version": t.version,
+                "key": t.key,
+                "maxTokens": t.max_tokens,
+                "calls": t.stats.calls,
+                "avgTokens": round(t.stats.tokens_total / t.stats.calls, 1) if t.stats.calls else 0,
+                "maxTokensSeen": t.stats.tokens_max,
+                "truncated": t.stats.truncated,
+                "rejected": t.stats.rejected,
+            }
+            for t in self.templates.values()
+        ]
+
+registry = TemplateRegistry()
@@ -0,0 +1,108 @@
+import os
+import random
+import hashlib
+from typing import List, Tuple
+from fastapi import Response
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from dotenv import load_dotenv
+from . import crud, sql_models, write_queue
+from .models import MnemonicResponse, GenerateQuizRequest, QuizQuestion
+from .routers import ai
+
+load_dotenv()
+
+# Distinct questions kept per association; below this a background job generates another round
+QUIZ_BANK_TARGET = int(os.getenv("QUIZ_BANK_TARGET", "3"))
+
+# (story_id, language) pairs with a top-up in flight, so repeated quizzes don't stack LLM calls
+_filling = set()
+
+def association_key(association: dict) -> str:
+    raw = f"{association.get('character', '')}\x1f{association.get('medicalTerm', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+def shuffle_options(question: QuizQuestion) -> QuizQuestion:
+    options = list(question.options)
+    correct_val = options[question.correctOptionIndex]
+    random.shuffle(options)
+    return question.model_copy(update={"options": options, "correctOptionIndex": options.index(correct_val)})
+
+def to_rows(questions: List[dict], associations: List[dict]) -> List[dict]:
+    """Bank rows for freshly generated questions, tagged with the association they test."""
+    rows = []
+    for q in questions:
+        index = q["associationIndex"]
+        if not 0 <= index < len(associations):
+            continue
+        rows.append(dict(q, associationKey=association_key(associations[index])))
+    return rows
+
+async def _generate(story: sql_models.SavedStory, language: str, identity: str) -> List[dict]:
+    mnemonic = MnemonicResponse(
+        topic=story.topic,
+        facts=story.facts,
+        story=story.story,
+        associations=story.associations,
+        visualPrompt=story.visualPrompt,
+    )
+    questions = await ai.generate_quiz(GenerateQuizRequest(mnemonicData=mnemonic, language=language), Response(), "default", identity)
+    return to_rows([q.model_dump() for q in questions], story.associations)
+
+async def _replace_stale(session: AsyncSession, story_id: str, language: str, rows: List[dict], keys: List[str]):
+    await crud.add_quiz_questions(session, story_id, language, rows, commit=False)
+    await crud.delete_stale_quiz_questions(session, story_id, keys, commit=False)
+    return await crud.get_quiz_questions(session, story_id, language)
+
+async def sample_quiz(session: AsyncSession, writer, story: sql_models.SavedStory, language: str, identity: str) -> Tuple[List[QuizQuestion], bool]:
+    """Serves one question per association from the bank, generating only when an
+    association has none. Returns (questions, whether the bank is running low)."""
+    keys = [association_key(a) for a in story.associations]
+    bank = await crud.get_quiz_questions(session, story.id, language)
+    if any(not any(q.associationKey == key for q in bank) for key in keys):
+        rows = await _generate(story, language, identity)
+        bank = await writer.submit(lambda s: _replace_stale(s, story.id, language, rows, keys))
+
+    by_key = {}
+    for q in bank:
+        by_key.setdefault(q.associationKey, []).append(q)
+
+    served, questions = [], []
+    for index, key in enumerate(keys):
+        candidates = by_key.get(key)
+        if not candidates:
+            continue  # The model skipped this association
+        # Rotate through the bank: least-served first, random among ties
+        least = min(c.timesServed for c in candidates)
+        pick = random.choice([c for c in candidates if c.timesServed == least])
+        served.append(pick.id)
+        # Index comes from the story, so reordered associations keep their questions
+        questions.append(shuffle_options(QuizQuestion(
+            associationIndex=index,
+            question=pick.question,
+            options=pick.options,
+            correctOptionIndex=pick.correctOptionIndex,
+            explanation=pick.explanation,
+        )))
+    if served:
+        await writer.submit(lambda s: crud.mark_quiz_questions_served(s, served, commit=False))
+
+    low = any(len(by_key.get(key, [])) < QUIZ_BANK_TARGET for key in keys)
+    return questions, low
+
+async def top_up(session_factory: async_sessionmaker, user_id: str, story_id: str, language: str, identity: str):
+    """Background job adding another round of questions and dropping ones for edited associations."""
+    if (story_id, language) in _filling:
+        return
+    _filling.add((story_id, language))
+    try:
+        async with session_factory() as session:
+            story = await crud.get_story(session, user_id, story_id)
+            if story is None:
+                return
+        rows = await _generate(story, language, identity)
+        keys = [association_key(a) for a in story.associations]
+        await write_queue.writer_for(session_factory).submit(lambda s: _replace_stale(s, story_id, language, rows, keys))
+    except Exception as e:
+        print(f"Quiz bank top-up failed for story {story_id}: {getattr(e, 'detail', e)}")
+    finally:
+        _filling.discard((story_id, language))
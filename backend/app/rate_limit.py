@@ -0,0 +1,234 @@
+import os
+import math
+import asyncio
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from dotenv import load_dotenv
+from . import prompt as prompts
+from .auth import get_optional_username
+
+load_dotenv()
+
+# Backend selection: "memory" (per process) or "sqlite" (shared between processes on one host/volume)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "./rate_limits.db")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+# Proxies in front of the app that append to X-Forwarded-For (Modal/Render: one). Anonymous
+# callers are keyed by the address the outermost trusted proxy saw; 0 ignores the header.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+@dataclass(frozen=True)
+class Budget:
+    capacity: float  # Max burst, in request units
+    refill_per_sec: float
+
+    @classmethod
+    def per(cls, amount: float, seconds: float) -> "Budget":
+        return cls(capacity=amount, refill_per_sec=amount / seconds)
+
+@dataclass(frozen=True)
+class ModelBudget:
+    per_user: Budget
+    global_: Budget
+
+def _budget_from_env(name: str, default: ModelBudget) -> ModelBudget:
+    # RATE_LIMIT_MODEL_FLASH="20/60,300/60" -> 20 req/min per user, 300 req/min globally
+    raw = os.getenv(f"RATE_LIMIT_{name}")
+    if not raw:
+        return default
+    user_part, global_part = raw.split(",")
+    user_amount, user_seconds = (float(x) for x in user_part.split("/"))
+    global_amount, global_seconds = (float(x) for x in global_part.split("/"))
+    return ModelBudget(Budget.per(user_amount, user_seconds), Budget.per(global_amount, global_seconds))
+
+# One budget per model constant in prompt.py. Constants that point at the same
+# model name (MODEL_FLASH / MODEL_VISUAL_PROMPT) share a bucket, since they share
+# the same upstream quota. Calls are charged to the model they are routed to (see
+# ai_routing), so a fallback to MODEL_FLASH_LITE spends the lite budget. TTS is charged
+# per sentence chunk synthesized, not per request.
+MODEL_BUDGETS: Dict[str, ModelBudget] = {}
+for _const, _default in [
+    ("MODEL_FLASH", ModelBudget(Budget.per(20, 60), Budget.per(300, 60))),
+    ("MODEL_VISUAL_PROMPT", ModelBudget(Budget.per(20, 60), Budget.per(300, 60))),
+    ("MODEL_IMAGE_GEN", ModelBudget(Budget.per(5, 300), Budget.per(30, 60))),
+    ("MODEL_FLASH_LITE", ModelBudget(Budget.per(30, 60), Budget.per(600, 60))),
+    ("MODEL_TTS", ModelBudget(Budget.per(30, 60), Budget.per(100, 60))),
+]:
+    MODEL_BUDGETS.setdefault(getattr(prompts, _const), _budget_from_env(_const, _default))
+
+# --- Backends ---
+# Both backends implement the same atomic "take from all buckets or none" operation,
+# so a request rejected by the global bucket does not burn the user's tokens.
+
+def _refill(tokens: float, updated: float, budget: Budget, now: float) -> float:
+    return min(budget.capacity, tokens + max(0.0, now - updated) * budget.refill_per_sec)
+
+def _wait_time(tokens: float, budget: Budget, cost: float) -> float:
+    if cost > budget.capacity:
+        return math.inf
+    return max(0.0, (cost - tokens) / budget.refill_per_sec)
+
+class InMemoryBackend:
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, entries: List[Tuple[str, Budget]], cost: float, now: float) -> float:
+        """Returns 0 if tokens were taken, otherwise the seconds to wait."""
+        with self._lock:
+            levels = []
+            for key, budget in entries:
+                tokens, updated = self._buckets.get(key, (budget.capacity, now))
+                levels.append(_refill(tokens, updated, budget, now))
+            wait = max(_wait_time(tokens, budget, cost) for tokens, (_, budget) in zip(levels, entries))
+            if wait > 0:
+                return wait
+            for tokens, (key, _) in zip(levels, entries):
+                self._buckets[key] = (tokens - cost, now)
+            return 0.0
+
+    def peek(self, key: str, budget: Budget, now: float) -> float:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (budget.capacity, now))
+            return _refill(tokens, updated, budget, now)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: we manage transactions explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def acquire(self, entries: List[Tuple[str, Budget]], cost: float, now: float) -> float:
+        conn = self._connect()
+        try:
+            # Take the write lock up front so concurrent processes serialize on the read-modify-write
+            conn.execute("BEGIN IMMEDIATE")
+            levels = []
+            for key, budget in entries:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row else (budget.capacity, now)
+                levels.append(_refill(tokens, updated, budget, now))
+            wait = max(_wait_time(tokens, budget, cost) for tokens, (_, budget) in zip(levels, entries))
+            if wait > 0:
+                conn.execute("ROLLBACK")
+                return wait
+            conn.executemany(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                [(key, tokens - cost, now) for tokens, (key, _) in zip(levels, entries)],
+            )
+            conn.execute("COMMIT")
+            return 0.0
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def peek(self, key: str, budget: Budget, now: float) -> float:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return budget.capacity
+        return _refill(row[0], row[1], budget, now)
+
+    def reset(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM rate_limit_buckets")
+        finally:
+            conn.close()
+
+# --- Limiter ---
+
+class RateLimiter:
+    def __init__(self, backend, budgets: Dict[str, ModelBudget]):
+        self.backend = backend
+        self.budgets = budgets
+
+    def check(self, model: str, identity: str, cost: float = 1.0) -> None:
+        budget = self.budgets.get(model)
+        if budget is None:
+            return
+        entries = [
+            (f"user:{identity}:{model}", budget.per_user),
+            (f"global:{model}", budget.global_),
+        ]
+        # A cost no bucket can ever hold would be a 429 that no amount of waiting fixes
+        limit = min(b.capacity for _, b in entries)
+        if cost > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Request needs {math.ceil(cost)} units of the {model} budget, which allows at most {limit:g} per window.",
+            )
+        wait = self.backend.acquire(entries, cost, time.time())
+        if wait > 0:
+            retry_after = "3600" if math.isinf(wait) else str(max(1, math.ceil(wait)))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for {model}. Try again later.",
+                headers={"Retry-After": retry_after},
+            )
+
+    def usage(self, identity: str) -> List[dict]:
+        now = time.time()
+        report = []
+        for model, budget in self.budgets.items():
+            report.append({
+                "model": model,
+                "user_remaining": round(self.backend.peek(f"user:{identity}:{model}", budget.per_user, now), 2),
+                "user_capacity": budget.per_user.capacity,
+                "global_remaining": round(self.backend.peek(f"global:{model}", budget.global_, now), 2),
+                "global_capacity": budget.global_.capacity,
+            })
+        return report
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_DB)
+    return InMemoryBackend()
+
+limiter = RateLimiter(_make_backend(), MODEL_BUDGETS)
+
+def client_identity(request: Request, username: Optional[str] = Depends(get_optional_username)) -> str:
+    if username:
+        return f"u:{username}"
+    # Hops to the left of the ones our proxies appended are whatever the client sent, so
+    # they can't key a bucket (a new value per request would mean a fresh budget each time)
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if TRUSTED_PROXY_HOPS > 0 and len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return f"ip:{forwarded[-TRUSTED_PROXY_HOPS]}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+async def charge(model: str, identity: str, cost: float = 1.0):
+    """Takes `cost` units of the model's budgets or raises 429. Runs in a thread, so the
+    SQLite backend never blocks the event loop."""
+    if RATE_LIMIT_ENABLED and cost > 0:
+        await asyncio.to_thread(limiter.check, model, identity, cost)
@@ -0,0 +1,82 @@
+import os
+import time
+from http.cookies import SimpleCookie
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+load_dotenv()
+
+# A replica trails the primary by some lag. After a client writes, its reads go to the
+# primary for READ_YOUR_WRITES_SECONDS so it never sees its own change disappear. The client
+# is remembered in-process by its Authorization header, and in a short-lived cookie so other
+# containers honour it too.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+WROTE_COOKIE = "mm_wrote"
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class RecentWriters:
+    def __init__(self, window: float, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._expiry: Dict[str, float] = {}
+
+    def mark(self, key: str):
+        now = time.monotonic()
+        if len(self._expiry) >= self.max_entries:
+            self._expiry = {k: t for k, t in self._expiry.items() if t > now}
+        self._expiry[key] = now + self.window
+
+    def recent(self, key: str) -> bool:
+        expiry = self._expiry.get(key)
+        return expiry is not None and expiry > time.monotonic()
+
+    def clear(self):
+        self._expiry.clear()
+
+recent_writers = RecentWriters(READ_YOUR_WRITES_SECONDS)
+
+def writer_key(headers: Headers) -> Optional[str]:
+    return headers.get("authorization") or None
+
+def prefers_primary(connection: HTTPConnection) -> bool:
+    wrote_at = connection.cookies.get(WROTE_COOKIE)
+    if wrote_at:
+        try:
+            if time.time() - float(wrote_at) < READ_YOUR_WRITES_SECONDS:
+                return True
+        except ValueError:
+            pass
+    key = writer_key(connection.headers)
+    return key is not None and recent_writers.recent(key)
+
+class ReadYourWritesMiddleware:
+    """Marks clients whose non-GET requests succeeded, for prefers_primary."""
+
+    def __init__(self, app: ASGIApp, enabled: Callable[[], bool] = lambda: True):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in _SAFE_METHODS or not self.enabled():
+            await self.app(scope, receive, send)
+            return
+        key = writer_key(Headers(scope=scope))
+
+        async def send_marking(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                if key is not None:
+                    recent_writers.mark(key)
+                cookie = SimpleCookie()
+                cookie[WROTE_COOKIE] = f"{time.time():.3f}"
+                cookie[WROTE_COOKIE]["max-age"] = str(int(READ_YOUR_WRITES_SECONDS) + 1)
+                cookie[WROTE_COOKIE]["path"] = "/"
+                cookie[WROTE_COOKIE]["httponly"] = True
+                cookie[WROTE_COOKIE]["samesite"] = "Lax"
+                MutableHeaders(scope=message).append("set-cookie", cookie.output(header="").strip())
+            await send(message)
+
+        await self.app(scope, receive, send_marking)
@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from dotenv import load_dotenv
+from . import sql_models, write_queue
+from .blob_store import blob_store
+
+load_dotenv()
+
+# Background purge of soft-deleted stories: playlist links, quiz bank, artifacts, cached
+# narration audio and the row itself (with its inline image), a batch per transaction.
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "1") != "0"
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "300"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "100"))
+# Free pages handed back to the filesystem per batch (SQLite, auto_vacuum=INCREMENTAL)
+REAPER_VACUUM_PAGES = int(os.getenv("REAPER_VACUUM_PAGES", "500"))
+
+def _audio_key(artifact: sql_models.StoryArtifact) -> Optional[str]:
+    return artifact.data.get("audioKey") if artifact.kind == "speech" and isinstance(artifact.data, dict) else None
+
+async def _delete_rows(session, batch_size: int) -> Tuple[List[str], Set[str]]:
+    ids: List[str] = list((await session.execute(
+        select(sql_models.SavedStory.id)
+        .where(sql_models.SavedStory.deletedAt.is_not(None))
+        .order_by(sql_models.SavedStory.deletedAt)
+        .limit(batch_size)
+        .execution_options(include_deleted=True)
+    )).scalars().all())
+    if not ids:
+        return ids, set()
+    artifacts = (await session.execute(
+        select(sql_models.StoryArtifact).where(sql_models.StoryArtifact.story_id.in_(ids))
+    )).scalars().all()
+    audio_keys = {key for key in map(_audio_key, artifacts) if key}
+
+    # Explicit deletes: SQLite doesn't enforce ON DELETE CASCADE unless foreign_keys is on
+    await session.execute(delete(sql_models.playlist_stories).where(sql_models.playlist_stories.c.story_id.in_(ids)))
+    await session.execute(delete(sql_models.QuizQuestion).where(sql_models.QuizQuestion.story_id.in_(ids)))
+    await session.execute(delete(sql_models.StoryArtifact).where(sql_models.StoryArtifact.story_id.in_(ids)))
+    await session.execute(
+        delete(sql_models.SavedStory)
+        .where(sql_models.SavedStory.id.in_(ids), sql_models.SavedStory.deletedAt.is_not(None))
+        .execution_options(synchronize_session=False)
+    )
+
+    if audio_keys:
+        # Audio is content-addressed: identical narration for a live story shares the blob
+        still_used = {key for key in map(_audio_key, (await session.execute(
+            select(sql_models.StoryArtifact).where(
+                sql_models.StoryArtifact.kind == "speech",
+                sql_models.StoryArtifact.data["audioKey"].as_string().in_(list(audio_keys))
+            )
+        )).scalars().all()) if key}
+        audio_keys -= still_used
+    return ids, audio_keys
+
+async def _incremental_vacuum(session):
+    if session.bind.dialect.name == "sqlite" and REAPER_VACUUM_PAGES > 0:
+        await session.execute(text(f"PRAGMA incremental_vacuum({REAPER_VACUUM_PAGES})"))
+
+async def purge_batch(session_factory: async_sessionmaker, batch_size: Optional[int] = None) -> int:
+    """Purges up to batch_size soft-deleted stories in one transaction. Returns how many were purged."""
+    batch_size = batch_size or REAPER_BATCH_SIZE
+    # Through the write queue like every other write, so a purge never holds the SQLite lock against it
+    writer = write_queue.writer_for(session_factory)
+    ids, audio_keys = await writer.submit(lambda s: _delete_rows(s, batch_size))
+    if not ids:
+        return 0
+
+    # Blobs go only after the rows are gone, so a crash leaves at worst an orphaned file
+    for key in audio_keys:
+        try:
+            await blob_store.adelete(key)
+        except ValueError as e:
+            print(f"Reaper: skipping blob {key}: {e}")
+
+    await writer.submit(_incremental_vacuum)
+    return len(ids)
+
+async def purge_deleted(session_factory: async_sessionmaker, batch_size: Optional[int] = None) -> int:
+    """Purges every soft-deleted story, batch by batch, yielding to other work in between."""
+    total = 0
+    while True:
+        purged = await purge_batch(session_factory, batch_size)
+        total += purged
+        if purged < (batch_size or REAPER_BATCH_SIZE):
+            return total
+        await asyncio.sleep(0)
+
+async def enable_incremental_vacuum(engine):
+    """One-time switch of an existing SQLite file to auto_vacuum=INCREMENTAL (needs a full VACUUM)."""
+    if engine.dialect.name != "sqlite":
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+        if mode == 2:
+            return
+        started = time.perf_counter()
+        await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        await conn.execute(text("VACUUM"))
+        print(f"Reaper: enabled incremental vacuum in {time.perf_counter() - started:.2f}s")
+
+class Reaper:
+    def __init__(self, session_factory: async_sessionmaker, interval: Optional[float] = None):
+        self.session_factory = session_factory
+        self.interval = interval or REAPER_INTERVAL_SECONDS
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Asks for a purge now instead of at the next interval (called after deletes)."""
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                purged = await purge_deleted(self.session_factory)
+                if purged:
+                    print(f"Reaper: purged {purged} deleted stories")
+            except Exception as e:
+                # Tombstoned rows stay hidden; the next pass retries
+                print(f"Reaper: purge failed: {e}")
+
+reaper: Optional[Reaper] = None
+
+def wake():
+    if reaper is not None:
+        reaper.wake()
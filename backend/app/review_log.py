@@ -0,0 +1,261 @@
+import os
+import sys
+import asyncio
+import argparse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import Depends
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from dotenv import load_dotenv
+from . import scheduler, write_queue
+from .database import get_session_factory
+
+load_dotenv()
+
+# Append-only log of every SRS review (review_events). Associations only keep their latest
+# `srs`; the log keeps each grade and when it happened, for retention analytics, for fitting
+# FSRS weights (fit) and for recomputing every card's state with another scheduler (replay).
+# Events are buffered and written in batches, one multi-row INSERT per flush, after the
+# review itself has committed. A crash loses at most the last REVIEW_LOG_FLUSH_MS of events.
+REVIEW_LOG_ENABLED = os.getenv("REVIEW_LOG_ENABLED", "1") != "0"
+REVIEW_LOG_MAX_BATCH = int(os.getenv("REVIEW_LOG_MAX_BATCH", "500"))
+REVIEW_LOG_FLUSH_MS = float(os.getenv("REVIEW_LOG_FLUSH_MS", "1000"))
+REVIEW_LOG_MAX_BUFFER = int(os.getenv("REVIEW_LOG_MAX_BUFFER", "50000"))  # Oldest events are dropped past this while the DB is failing
+# Users with fewer logged reviews keep the default FSRS weights when fitting
+REVIEW_LOG_MIN_FIT_REVIEWS = int(os.getenv("REVIEW_LOG_MIN_FIT_REVIEWS", "400"))
+
+def complete(events: List[Any]) -> bool:
+    # False for cards already reviewed before the log existed: their history can't be replayed
+    return events[0].previousReview is None
+
+def _table():
+    from .sql_models import ReviewEvent
+    return ReviewEvent.__table__
+
+async def insert_events(session_factory: async_sessionmaker, events: List[dict]):
+    async def job(session):
+        await session.execute(insert(_table()), events)
+
+    # On SQLite the write queue owns the lock; the batch rides along with queued writes
+    await write_queue.writer_for(session_factory).submit(job)
+
+class DirectReviewLog:
+    """Writes each event as it comes (the buffered log isn't running, e.g. in tests)."""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def record(self, event: dict):
+        await insert_events(self.session_factory, [event])
+
+class ReviewLog:
+    def __init__(self, session_factory: async_sessionmaker, max_batch: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.session_factory = session_factory
+        self.max_batch = max_batch or REVIEW_LOG_MAX_BATCH
+        self.flush_interval = REVIEW_LOG_FLUSH_MS / 1000 if flush_interval is None else flush_interval
+        self._buffer: List[dict] = []
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+
+    async def record(self, event: dict):
+        self._buffer.append(event)
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        written = 0
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+            try:
+                await insert_events(self.session_factory, batch)
+            except Exception:
+                # Keep them for the next flush, within bounds
+                self._buffer = batch + self._buffer
+                overflow = len(self._buffer) - REVIEW_LOG_MAX_BUFFER
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+                raise
+            written += len(batch)
+        self.written += written
+        return written
+
+    def stop(self):
+        """Makes run() flush what is buffered and return (not cancelled: a batch may be in flight)."""
+        self._stopping = True
+        self._wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"ReviewLog: flush failed, {len(self._buffer)} events pending: {e}")
+            if self._stopping:
+                return
+
+log: Optional[ReviewLog] = None
+
+def get_review_log(session_factory: async_sessionmaker = Depends(get_session_factory)):
+    if log is not None:
+        return log
+    return DirectReviewLog(session_factory)
+
+# --- Replay ---
+
+Card = Tuple[str, str, int]  # (user_id, story_id, associationIndex)
+
+async def card_histories(engine: AsyncEngine, user_id: Optional[str] = None, batch_size: int = 1000) -> AsyncIterator[Tuple[Card, List[Any]]]:
+    """Every card's events in review order, one card at a time. A single streamed query in
+    index order (ix_review_events_user_card), so memory holds one fetch batch plus one card."""
+    table = _table()
+    stmt = select(table.c.user_id, table.c.story_id, table.c.associationIndex, table.c.quality, table.c.reviewedAt, table.c.previousReview)
+    if user_id is not None:
+        stmt = stmt.where(table.c.user_id == user_id)
+    stmt = stmt.order_by(table.c.user_id, table.c.story_id, table.c.associationIndex, table.c.reviewedAt, table.c.id)
+    card, events = None, []
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=batch_size))
+        async for row in result:
+            key = (row.user_id, row.story_id, row.associationIndex)
+            if key != card:
+                if events:
+                    yield card, events
+                card, events = key, []
+            events.append(row)
+    if events:
+        yield card, events
+
+async def _apply_states(conn, states: Dict[str, Dict[int, dict]]) -> int:
+    from .sql_models import SavedStory
+
+    table = SavedStory.__table__
+    rows = (await conn.execute(select(table.c.id, table.c.associations).where(table.c.id.in_(list(states))))).all()
+    updates = []
+    for row in rows:
+        associations = list(row.associations or [])
+        for index, srs in states[row.id].items():
+            if index < len(associations) and isinstance(associations[index], dict):
+                associations[index] = {**associations[index], "srs": srs}
+        updates.append({"story_id": row.id, "replayed": associations})
+    if updates:
+        stmt = update(table).where(table.c.id == bindparam("story_id")).values(associations=bindparam("replayed"))
+        await conn.execute(stmt, updates)
+    return len(updates)
+
+async def replay(engine: AsyncEngine, scheduler_name: Optional[str] = None, user_id: Optional[str] = None,
+                 batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """Recomputes the SRS state of every logged card from its events with the given scheduler
+    (each user's fitted weights for FSRS) and writes it back, batch_size stories per transaction.
+    Cards whose history started before the log are left as they are (counted as skipped). Run it
+    with the app stopped: a review landing mid-replay can be overwritten."""
+    from . import crud
+
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+    stats = {"events": 0, "cards": 0, "stories": 0, "skipped": 0}
+    pending: Dict[str, Dict[int, dict]] = {}
+    current_user, srs_scheduler = None, None
+
+    async def write_pending():
+        if pending and not dry_run:
+            async with engine.begin() as conn:
+                stats["stories"] += await _apply_states(conn, pending)
+        pending.clear()
+
+    async for (user, story_id, index), events in card_histories(engine, user_id, batch_size):
+        if user != current_user:
+            current_user, weights = user, None
+            if (scheduler_name or scheduler.SRS_SCHEDULER) == "fsrs":
+                async with sessions() as session:
+                    weights = await crud.get_scheduler_weights(session, user)
+            srs_scheduler = scheduler.get_scheduler(scheduler_name, weights)
+        if not complete(events):
+            stats["skipped"] += 1
+            continue
+        srs = None
+        for event in events:
+            srs = srs_scheduler.review(srs, event.quality, event.reviewedAt)
+        if story_id not in pending and len(pending) >= batch_size:
+            await write_pending()
+        pending.setdefault(story_id, {})[index] = srs
+        stats["events"] += len(events)
+        stats["cards"] += 1
+    await write_pending()
+    return stats
+
+async def fit(engine: AsyncEngine, user_id: Optional[str] = None, min_reviews: Optional[int] = None,
+              batch_size: int = 1000, **fit_options) -> Dict[str, scheduler.FitResult]:
+    """Fits and saves FSRS weights for every user with enough logged reviews. Holds one user's
+    histories at a time (a few numbers per review)."""
+    from . import crud
+
+    min_reviews = REVIEW_LOG_MIN_FIT_REVIEWS if min_reviews is None else min_reviews
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+    results: Dict[str, scheduler.FitResult] = {}
+    current_user, cards = None, []
+
+    async def fit_current():
+        reviews = sum(len(c) - 1 for c in cards)
+        if current_user is None or reviews < min_reviews:
+            return
+        result = scheduler.fit_weights(cards, **fit_options)
+        async with sessions() as session:
+            await crud.save_scheduler_weights(session, current_user, result.weights, result.reviews, result.loss)
+        results[current_user] = result
+
+    async for (user, _, _), events in card_histories(engine, user_id, batch_size):
+        if user != current_user:
+            await fit_current()
+            current_user, cards = user, []
+        if not complete(events):
+            continue
+        history, previous = [], None
+        for event in events:
+            elapsed = 0.0 if previous is None else (event.reviewedAt - previous) / scheduler.DAY_MS
+            history.append((elapsed, scheduler.rating(event.quality)))
+            previous = event.reviewedAt
+        cards.append(history)
+    await fit_current()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the review log or fit FSRS weights from it")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="Recompute every logged card's SRS state")
+    replay_parser.add_argument("--scheduler", choices=sorted(scheduler.SCHEDULERS), help="Defaults to SRS_SCHEDULER")
+    replay_parser.add_argument("--dry-run", action="store_true", help="Compute without writing")
+    fit_parser = commands.add_parser("fit", help="Fit and save per-user FSRS weights")
+    fit_parser.add_argument("--min-reviews", type=int, default=None)
+    for sub in (replay_parser, fit_parser):
+        sub.add_argument("--user", help="Only this user id")
+        sub.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    from .database import engine
+
+    async def run():
+        try:
+            if args.command == "replay":
+                stats = await replay(engine, args.scheduler, args.user, args.batch_size, args.dry_run)
+                print(f"Replayed {stats['events']} events into {stats['cards']} cards, updated {stats['stories']} stories, "
+                      f"skipped {stats['skipped']} cards with history from before the log"
+                      + (" (dry run)" if args.dry_run else ""))
+            else:
+                results = await fit(engine, args.user, args.min_reviews, args.batch_size)
+                for user, result in results.items():
+                    print(f"{user}: {result.reviews} reviews, log loss {result.default_loss:.4f} -> {result.loss:.4f}")
+                print(f"Fitted weights for {len(results)} users")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
 import os
 import json
+import time
 import base64
+import asyncio
 import random
-from typing import List
-from fastapi import APIRouter, HTTPException
-from google import genai
-from google.genai import types
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import (
     GenerateMnemonicRequest, MnemonicResponse, 
     RegenerateStoryRequest, RegenerateStoryResponse,
@@ -13,7 +15,8 @@ from ..models import (
     GenerateImageRequest, GenerateImageResponse,
     AnalyzeImageRequest, MnemonicAssociation,
     GenerateQuizRequest, QuizQuestion, QuizList,
-    GenerateSpeechRequest, GenerateSpeechResponse
+    GenerateSpeechRequest, GenerateSpeechResponse,
+    ModelBudgetUsage, SimilarityQuery, SimilarMnemonic
 )
 
 router = APIRouter(prefix="/ai", tags=["AI"])
@@ -23,13 +26,77 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from .. import prompt as prompts
+from .. import rate_limit, ai_routing, bbox, similarity, tts
+from ..database import get_db
+from ..tracing import span
+from ..ai_client import create_client
+from ..ai_providers import genai_types as types
 
-# Initialize client
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+# Initialize client (async, with deadlines, retries and a circuit breaker per model).
+# The Gemini SDK client itself is only built on the first call.
+client = create_client()
+
+async def _generate(task: str, mode: str, http_response: Response, identity: Optional[str], contents, config: "types.GenerateContentConfig"):
+    # Model and thinking budget come from the task's route (see ai_routing.ROUTES),
+    # reported back to the client in X-AI-* headers. The call is charged to the routed
+    # model; identity is None when the caller has charged for it already.
+    route, route_name = ai_routing.router.choose(task, mode)
+    if identity is not None:
+        await rate_limit.charge(route.model, identity)
+    ai_routing.set_route_headers(http_response, task, route, route_name)
+    thinking = route.thinking_config()
+    if thinking is not None:
+        config.thinking_config = thinking
+    start = time.monotonic()
+    try:
+        return await client.models.generate_content(model=route.model, contents=contents, config=config)
+    finally:
+        ai_routing.router.record(task, route_name, time.monotonic() - start)
+
+@router.get("/prompts")
+async def get_prompt_stats():
+    """Prompt template versions and estimated token statistics since startup."""
+    return prompts.TEMPLATES.describe()
+
+async def _reusable_mnemonic(session: AsyncSession, http_response: Response, text: str, language: str):
+    # A near-identical public mnemonic costs a DB read instead of a full generation
+    try:
+        story = await similarity.find_reusable(session, text, language)
+    except Exception as e:
+        print(f"Similarity lookup failed: {e}")
+        return None
+    if story is not None:
+        http_response.headers["X-Mnemonic-Reused"] = story.id
+    return story
+
+def _reused_associations(story) -> list:
+    # The public story's review state and boxes (drawn on its own image) don't carry over
+    return [{k: v for k, v in a.items() if k not in ("srs", "boundingBox", "shape")} for a in story.associations]
+
+@router.post("/similar", response_model=List[SimilarMnemonic])
+async def find_similar(query: SimilarityQuery, session: AsyncSession = Depends(get_db)):
+    """Public mnemonics and curriculum concepts close to the given notes or facts."""
+    await similarity.index.ensure_fresh(session)
+    text = " ".join([query.text or "", *query.facts])
+    matches = similarity.index.search(
+        text, limit=query.limit, language=query.language, min_score=similarity.SIMILARITY_SUGGEST_THRESHOLD
+    )
+    return [SimilarMnemonic(**vars(m)) for m in matches]
+
+@router.get("/budget", response_model=List[ModelBudgetUsage])
+async def get_budget(identity: str = Depends(rate_limit.client_identity)):
+    return rate_limit.limiter.usage(identity)
 
 @router.post("/generate/mnemonic", response_model=MnemonicResponse)
-async def generate_mnemonic(request: GenerateMnemonicRequest):
+async def generate_mnemonic(request: GenerateMnemonicRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), session: AsyncSession = Depends(get_db), identity: str = Depends(rate_limit.client_identity)):
+    if request.allowReuse and not request.pdfBase64:
+        story = await _reusable_mnemonic(session, http_response, request.text, request.language)
+        if story is not None:
+            return MnemonicResponse(
+                topic=story.topic, facts=story.facts, story=story.story,
+                associations=_reused_associations(story), visualPrompt=story.visualPrompt,
+            )
+
     parts = []
     if request.pdfBase64:
         # Decode base64 to bytes if needed, or pass as part.
@@ -48,34 +115,37 @@ async def generate_mnemonic(request: GenerateMnemonicRequest):
         ))
         parts.append(types.Part.from_text(text="Analyze this PDF content."))
     else:
-        parts.append(types.Part.from_text(text=request.text))
+        # Oversize notes are truncated to the template's token budget before they reach Gemini
+        parts.append(types.Part.from_text(text=prompts.get_mnemonic_input(request.text)))
 
     prompt_text = prompts.get_mnemonic_prompt(request.language)
     parts.append(types.Part.from_text(text=prompt_text))
 
     try:
-        response = client.models.generate_content(
-            model=prompts.MODEL_FLASH,
+        response = await _generate(
+            "mnemonic", mode, http_response, identity,
             contents=[types.Content(parts=parts)],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
-                response_schema=MnemonicResponse,
-                thinking_config=types.ThinkingConfig(thinking_level="high")
+                response_schema=MnemonicResponse
             )
         )
         
         if not response.text:
              raise HTTPException(status_code=500, detail="No response text from AI")
              
-        data = json.loads(response.text)
-        return MnemonicResponse(**data)
+        with span("mnemonic.parse", response_chars=len(response.text)):
+            data = json.loads(response.text)
+            return MnemonicResponse(**data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error generating mnemonic: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate/story")
-async def regenerate_story(request: RegenerateStoryRequest):
+async def regenerate_story(request: RegenerateStoryRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
     prompt_text = prompts.get_regenerate_story_prompt(request.topic, request.facts, request.language)
     
     try:
@@ -106,43 +176,45 @@ async def regenerate_story(request: RegenerateStoryRequest):
             "required": ["story", "associations", "visualPrompt"]
         }
 
-        response = client.models.generate_content(
-            model=prompts.MODEL_FLASH,
-            contents=[types.Content(parts=[types.Part.from_text(text=prompt)])],
+        response = await _generate(
+            "story", mode, http_response, identity,
+            contents=[types.Content(parts=[types.Part.from_text(text=prompt_text)])],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
-                response_schema=schema,
-                thinking_config=types.ThinkingConfig(thinking_level="high")
+                response_schema=schema
             )
         )
         
         return json.loads(response.text)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error regenerating story: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate/visual-prompt", response_model=RegenerateVisualPromptResponse)
-async def regenerate_visual_prompt(request: RegenerateVisualPromptRequest):
+async def regenerate_visual_prompt(request: RegenerateVisualPromptRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
     # This one expects text output
     # Convert associations to list of dicts if they are objects
     associations_dicts = [a.dict() for a in request.associations]
     prompt_text = prompts.get_regenerate_visual_prompt_prompt(request.topic, request.story, associations_dicts)
     
     try:
-        response = client.models.generate_content(
-            model=prompts.MODEL_VISUAL_PROMPT,
+        response = await _generate(
+            "visual_prompt", mode, http_response, identity,
             contents=[types.Content(parts=[types.Part.from_text(text=prompt_text)])],
             config=types.GenerateContentConfig(
-                response_mime_type="text/plain",
-                thinking_config=types.ThinkingConfig(thinking_level="high")
+                response_mime_type="text/plain"
             )
         )
         return RegenerateVisualPromptResponse(visualPrompt=response.text)
+    except HTTPException:
+        raise
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/generate/image", response_model=GenerateImageResponse)
-async def generate_image(request: GenerateImageRequest):
+async def generate_image(request: GenerateImageRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
     # If visualPrompt is in Spanish (which it likely is now), prompt the image gen to handle it
     # or translate it. Modern models handle Spanish prompts well.
     # We add a style instruction.
@@ -161,8 +233,8 @@ async def generate_image(request: GenerateImageRequest):
         # Let's check imports. `from google import genai`
         # client.models.generate_images(...)
         
-        response = client.models.generate_content(
-            model=prompts.MODEL_IMAGE_GEN,
+        response = await _generate(
+            "image", mode, http_response, identity,
             contents=enhanced_prompt,
             config=types.GenerateContentConfig(
                 image_config=types.ImageConfig(
@@ -182,6 +254,8 @@ async def generate_image(request: GenerateImageRequest):
             
         raise Exception("No image generated")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Image Gen Error: {e}")
         # Fallback to demo image if generation fails (common in test envs)
@@ -189,80 +263,80 @@ async def generate_image(request: GenerateImageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/analyze/bounding-boxes", response_model=List[MnemonicAssociation])
-async def analyze_bounding_boxes(request: AnalyzeImageRequest):
+async def analyze_bounding_boxes(request: AnalyzeImageRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
     try:
         clean_base64 = request.imageBase64
         if "base64," in clean_base64:
             clean_base64 = clean_base64.split("base64,")[1]
-            
-        targets_desc = "\n\n".join([
+        image_bytes = base64.b64decode(clean_base64)
+
+        # Sorted so the same association set hits the same cache entry regardless of order
+        targets_desc = "\n\n".join(sorted({
             f"- Target Character: \"{a.character}\"\n  Medical Concept: \"{a.medicalTerm}\"\n  Visual Description/Context: {a.explanation}"
             for a in request.associations
-        ])
-        
-        prompt_text = prompts.get_bbox_analysis_prompt(targets_desc)
-        
-        response = client.models.generate_content(
-            model=prompts.MODEL_FLASH,
-            contents=[
-                types.Content(parts=[
-                    types.Part(
-                        inline_data=types.Blob(
-                             data=base64.b64decode(clean_base64), 
-                             mime_type="image/png"
+        }))
+
+        key = bbox.cache_key(image_bytes, targets_desc)
+        box_data = await bbox.get_cached(key)
+        if box_data is None:
+            prompt_text = prompts.get_bbox_analysis_prompt(targets_desc)
+            image_data, mime_type = await asyncio.to_thread(bbox.downscale, image_bytes)
+
+            response = await _generate(
+                "bbox", mode, http_response, identity,
+                contents=[
+                    types.Content(parts=[
+                        types.Part(
+                            inline_data=types.Blob(
+                                 data=image_data,
+                                 mime_type=mime_type
+                            ),
+                            media_resolution=types.PartMediaResolution(level="media_resolution_medium")
                         ),
-                        media_resolution=types.MediaResolution(level="media_resolution_high")
-                    ),
-                    types.Part.from_text(text=prompt_text)
-                ])
-            ],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                thinking_config=types.ThinkingConfig(thinking_level="high")
+                        types.Part.from_text(text=prompt_text)
+                    ])
+                ],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json"
+                )
             )
-        )
-        
-        box_data = json.loads(response.text)
-        
+
+            box_data = json.loads(response.text)
+            await bbox.put_cached(key, box_data)
+
+        matches = bbox.match_boxes([a.character for a in request.associations], box_data)
         updated = []
-        for assoc in request.associations:
-            match = next((b for b in box_data if b.get('character', '').lower() in assoc.character.lower() or assoc.character.lower() in b.get('character', '').lower()), None)
-            if match and 'box_2d' in match:
-                assoc.boundingBox = match['box_2d']
-                # Pydantic model might need assignment
+        for assoc, box in zip(request.associations, matches):
+            if box is not None:
+                assoc.boundingBox = box
                 assoc.shape = 'rect'
             updated.append(assoc)
         return updated
-        
+
     except Exception as e:
         print(f"Bbox analysis error: {e}")
         return request.associations
 
 @router.post("/generate/quiz", response_model=List[QuizQuestion])
-async def generate_quiz(request: GenerateQuizRequest):
+async def generate_quiz(request: GenerateQuizRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
     data = request.mnemonicData
     associations_str = "\n".join([f"{i}. Character: {a.character} -> Medical Concept: {a.medicalTerm}" for i, a in enumerate(data.associations)])
-    context = f"""
-    Topic: {data.topic}
-    Key Facts: {"; ".join(data.facts)}
-    Associations:
-    {associations_str}
-    """
+    context = prompts.get_quiz_context(data.topic, data.facts, associations_str)
     
     prompt_text = prompts.get_quiz_prompt(context, request.language)
     
     try:
-        response = client.models.generate_content(
-            model=prompts.MODEL_FLASH,
+        response = await _generate(
+            "quiz", mode, http_response, identity,
             contents=[types.Content(parts=[types.Part.from_text(text=context), types.Part.from_text(text=prompt_text)])],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
-                response_schema=QuizList,
-                thinking_config=types.ThinkingConfig(thinking_level="high")
+                response_schema=QuizList
             )
         )
         
-        result_data = json.loads(response.text)
+        with span("quiz.parse", response_chars=len(response.text or "")):
+            result_data = json.loads(response.text)
         # Check if it was parsed as dict matching QuizList or just list if backend allows fuzzy match
         # But we asked for QuizList schema so it should be dict with "questions" key
         if isinstance(result_data, list):
@@ -280,32 +354,17 @@ async def generate_quiz(request: GenerateQuizRequest):
             
         return [QuizQuestion(**q) for q in questions] # Validate
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Quiz gen error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/generate/speech", response_model=GenerateSpeechResponse)
-async def generate_speech(request: GenerateSpeechRequest):
-    # This might require a specific model or permission
-    # 'Puck' is a good default, but maybe 'Fenrir' or others are better for deep voices, 
-    # 'Aoede' for female. Let's stick to Puck or maybe 'Kore' if neutral.
-    # Actually, for Spanish, we rely on the model detecting language or the text being Spanish.
-    voice_name = 'Puck' # Default
-    if request.language == 'es':
-         # Attempt to pick a voice that might sound better if available, 
-         # but standard voices often handle accents well.
-         pass
-    
-    # Note: TTS via API might assume specific models/endpoints
-    # "gemini-2.5-flash-exp" sometimes supports audio out?
-    # Or separate TTS endpoint?
-    # The frontend code used: model: "gemini-2.5-flash-preview-tts"
-    # We will try to map this.
-    
-    try:
-        text_to_read = prompts.get_speech_prompt(request.text, request.language)
-        response = client.models.generate_content(
-            model=prompts.MODEL_TTS, # Experimental often has modalities
+def _speech_synthesizer(http_response: Response, mode: str) -> tts.Synthesizer:
+    async def synthesize_chunk(text: str, voice: str, language: str) -> bytes:
+        text_to_read = prompts.get_speech_prompt(text, language)
+        response = await _generate(
+            "speech", mode, http_response, None,  # Charged per chunk up front (_charge_speech)
             contents=[types.Content(parts=[
                 types.Part.from_text(text=text_to_read)
             ])],
@@ -313,7 +372,7 @@ async def generate_speech(request: GenerateSpeechRequest):
                 response_modalities=["AUDIO"],
                 speech_config=types.SpeechConfig(
                     voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice_name)
+                        prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice)
                     )
                 )
             )
@@ -323,11 +382,61 @@ async def generate_speech(request: GenerateSpeechRequest):
         if response.candidates and response.candidates[0].content.parts:
              for part in response.candidates[0].content.parts:
                  if part.inline_data:
-                     b64 = base64.b64encode(part.inline_data.data).decode('utf-8')
-                     return GenerateSpeechResponse(audioData=b64)
-                     
+                     return part.inline_data.data
         raise Exception("No audio content generated")
-        
+
+    return tts.Synthesizer(synthesize_chunk)
+
+async def _charge_speech(synthesizer: tts.Synthesizer, request: GenerateSpeechRequest, mode: str, identity: str, full: bool = True):
+    # One TTS call per uncached sentence chunk, charged before any is made so a long story
+    # can't overdraw the budget or get cut off halfway through a stream
+    route, _ = ai_routing.router.choose("speech", mode)
+    await rate_limit.charge(route.model, identity, await synthesizer.missing_chunks(request.text, request.voice, request.language, full))
+
+@router.post("/generate/speech", response_model=GenerateSpeechResponse)
+async def generate_speech(request: GenerateSpeechRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
+    # 'Puck' is a good default; voices handle Spanish text well, so the voice isn't tied to the language.
+    # Audio is cached per sentence chunk, so replays and regenerated stories only pay for new sentences.
+    try:
+        synthesizer = _speech_synthesizer(http_response, mode)
+        await _charge_speech(synthesizer, request, mode, identity)
+        key, pcm = await synthesizer.synthesize(request.text, request.voice, request.language)
+        http_response.headers["X-Audio-Key"] = key
+        return GenerateSpeechResponse(audioData=base64.b64encode(pcm).decode('utf-8'), audioKey=key)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Speech Gen Error: {e}")
         raise HTTPException(status_code=500, detail="Speech generation not supported or failed")
+
+@router.post("/generate/speech/stream")
+async def stream_speech(request: GenerateSpeechRequest, http_response: Response, mode: str = Depends(ai_routing.get_ai_mode), identity: str = Depends(rate_limit.client_identity)):
+    """Streams a WAV as sentences are synthesized, so playback starts after the first chunk."""
+    try:
+        synthesizer = _speech_synthesizer(http_response, mode)
+        await _charge_speech(synthesizer, request, mode, identity, full=False)
+        body = await synthesizer.stream(request.text, request.voice, request.language)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Speech Gen Error: {e}")
+        raise HTTPException(status_code=500, detail="Speech generation not supported or failed")
+    headers = {k: v for k, v in http_response.headers.items() if k.lower().startswith("x-ai-")}
+    return StreamingResponse(body, media_type="audio/wav", headers=headers)
+
+@router.get("/speech/{namespace}/{digest}")
+async def get_cached_speech(namespace: str, digest: str):
+    """Serves previously synthesized audio; keys are content hashes, so it never changes."""
+    if namespace not in ("tts", "tts-full"):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    try:
+        pcm = await tts.blob_store.aget(f"{namespace}/{digest}")
+    except ValueError:
+        pcm = None
+    if pcm is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return Response(
+        content=tts.wav_header(len(pcm)) + pcm,
+        media_type="audio/wav",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
@@ -5,20 +5,20 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import UserRegister, User, Token
 from ..database import get_db
-from .. import crud
+from .. import crud, write_queue
 from ..auth import create_access_token, get_current_user, get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
-async def register(user_in: UserRegister, session: AsyncSession = Depends(get_db)):
+async def register(user_in: UserRegister, writer = Depends(write_queue.get_writer)):
     try:
         hashed_password = get_password_hash(user_in.password)
         user_data = user_in.model_dump()
         user_data['hashed_password'] = hashed_password
         del user_data['password']
         
-        user = await crud.create_user(session, user_data)
+        user = await writer.submit(lambda s: crud.create_user(s, user_data, commit=False))
         return user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -44,7 +44,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/guest", response_model=Token)
-async def guest_login(session: AsyncSession = Depends(get_db)):
+async def guest_login(writer = Depends(write_queue.get_writer)):
     guest_id = str(uuid.uuid4())
     username = f"guest_{guest_id[:8]}"
     email = f"{username}@medmnemonic.guest"
@@ -59,7 +59,7 @@ async def guest_login(session: AsyncSession = Depends(get_db)):
     }
     
     try:
-        user = await crud.create_user(session, user_data)
+        user = await writer.submit(lambda s: crud.create_user(s, user_data, commit=False))
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
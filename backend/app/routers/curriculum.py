@@ -2,30 +2,30 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import crud, models, sql_models, auth
-from ..database import get_db
+from ..database import get_db, get_read_db
 
 router = APIRouter(prefix="/curriculum", tags=["Curriculum"])
 
 @router.get("/topics", response_model=List[models.Topic])
-async def get_topics(db: AsyncSession = Depends(get_db)):
+async def get_topics(db: AsyncSession = Depends(get_read_db)):
     return await crud.get_topics(db)
 
 @router.get("/topics/{topic_id}", response_model=models.Topic)
-async def get_topic(topic_id: str, db: AsyncSession = Depends(get_db)):
+async def get_topic(topic_id: str, db: AsyncSession = Depends(get_read_db)):
     db_topic = await crud.get_topic(db, topic_id)
     if not db_topic:
         raise HTTPException(status_code=404, detail="Topic not found")
     return db_topic
 
 @router.get("/concepts/{concept_id}", response_model=models.Concept)
-async def get_concept(concept_id: str, db: AsyncSession = Depends(get_db)):
+async def get_concept(concept_id: str, db: AsyncSession = Depends(get_read_db)):
     db_concept = await crud.get_concept(db, concept_id)
     if not db_concept:
         raise HTTPException(status_code=404, detail="Concept not found")
     return db_concept
 
 @router.get("/concepts/{concept_id}/public_mnemonic", response_model=models.SavedStory)
-async def get_public_mnemonic(concept_id: str, db: AsyncSession = Depends(get_db)):
+async def get_public_mnemonic(concept_id: str, db: AsyncSession = Depends(get_read_db)):
     # Fetch a story linked to this concept and created by an admin
     # We first find admins then search
     # Or cleaner: join User table
@@ -53,5 +53,5 @@ async def update_progress(progress: models.UserProgressBase, db: AsyncSession =
     return await crud.update_user_progress(db, user.id, progress)
 
 @router.get("/progress", response_model=List[models.UserProgress])
-async def get_all_progress(db: AsyncSession = Depends(get_db), user: sql_models.User = Depends(auth.get_current_user)):
+async def get_all_progress(db: AsyncSession = Depends(get_read_db), user: sql_models.User = Depends(auth.get_current_user)):
     return await crud.get_all_user_progress(db, user.id)
@@ -1,56 +1,132 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import Playlist, PlaylistCreate, User
-from ..database import get_db
-from .. import crud
+import os
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from ..models import Playlist, PlaylistCreate, PlaylistStoryIds, SavedStory, User
+from ..database import get_read_db, get_read_session_factory
+from .. import crud, write_queue
 from ..auth import get_current_user
 
 router = APIRouter(prefix="/playlists", tags=["Playlists"])
 
+PLAYLIST_STUDY_PAGE_SIZE = int(os.getenv("PLAYLIST_STUDY_PAGE_SIZE", "10"))
+
 @router.get("", response_model=List[Playlist])
-async def list_playlists(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    db_playlists = await crud.get_playlists(session, current_user.id)
-    results = []
-    for p in db_playlists:
-        res = Playlist.model_validate(p)
-        res.story_ids = [s.id for s in p.stories]
-        results.append(res)
-    return results
+async def list_playlists(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_read_db)):
+    # Ids and counts come from one aggregate query; story rows are never loaded
+    return await crud.get_playlists(session, current_user.id)
 
 @router.post("", response_model=Playlist)
-async def create_playlist(playlist_in: PlaylistCreate, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    p = await crud.create_playlist(session, current_user.id, playlist_in)
+async def create_playlist(playlist_in: PlaylistCreate, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    p = await writer.submit(lambda s: crud.create_playlist(s, current_user.id, playlist_in, commit=False))
     res = Playlist.model_validate(p)
     res.story_ids = []
     return res
 
 @router.get("/{id}", response_model=Playlist)
-async def get_playlist(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+async def get_playlist(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_read_db)):
     p = await crud.get_playlist(session, current_user.id, id)
     if not p:
         raise HTTPException(status_code=404, detail="Playlist not found")
-    res = Playlist.model_validate(p)
-    res.story_ids = [s.id for s in p.stories]
-    return res
+    return p
+
+def _parse_cursor(cursor: Optional[str]):
+    # "<position>:<story id>" of the last story already received
+    if cursor is None:
+        return None
+    position, sep, story_id = cursor.partition(":")
+    if not sep or not position.lstrip("-").isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return int(position), story_id
+
+@router.get("/{id}/study")
+async def study_playlist(
+    id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    pageSize: int = Query(PLAYLIST_STUDY_PAGE_SIZE, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_db),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory)
+):
+    """Streams the playlist's full stories in order as NDJSON, one page per line:
+    {"stories": [...], "nextCursor": "..."}. Pass nextCursor back as `cursor` to resume."""
+    if not await crud.get_playlist(session, current_user.id, id):
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    after = _parse_cursor(cursor)
+
+    async def pages():
+        nonlocal after
+        remaining = limit
+        # Own session: the stream outlives the request's dependencies
+        async with session_factory() as page_session:
+            while remaining is None or remaining > 0:
+                size = pageSize if remaining is None else min(pageSize, remaining)
+                # One row past the page tells whether another page follows, so the last page says so
+                rows = await crud.get_playlist_stories_page(page_session, id, after, size + 1)
+                more, rows = len(rows) > size, rows[:size]
+                if not rows:
+                    break
+                story, position = rows[-1]
+                after = (position, story.id)
+                done = not more or (remaining is not None and remaining - len(rows) <= 0)
+                page = {
+                    "stories": [SavedStory.model_validate(s).model_dump(mode="json") for s, _ in rows],
+                    "nextCursor": None if done else f"{position}:{story.id}",
+                }
+                # Only one page of rows is held at a time
+                page_session.expunge_all()
+                yield json.dumps(page) + "\n"
+                if done:
+                    break
+                if remaining is not None:
+                    remaining -= len(rows)
+
+    return StreamingResponse(pages(), media_type="application/x-ndjson")
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_playlist(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    success = await crud.delete_playlist(session, current_user.id, id)
+async def delete_playlist(id: str, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    success = await writer.submit(lambda s: crud.delete_playlist(s, current_user.id, id, commit=False))
     if not success:
         raise HTTPException(status_code=404, detail="Playlist not found")
     return
 
+@router.post("/{id}/stories", status_code=status.HTTP_200_OK)
+async def add_many_to_playlist(id: str, body: PlaylistStoryIds, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    # Unknown ids and stories already in the playlist are skipped
+    added = await writer.submit(lambda s: crud.add_stories_to_playlist(s, current_user.id, id, body.storyIds, commit=False))
+    if added is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return {"status": "success", "added": added}
+
+@router.delete("/{id}/stories", status_code=status.HTTP_200_OK)
+async def remove_many_from_playlist(id: str, body: PlaylistStoryIds, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    removed = await writer.submit(lambda s: crud.remove_stories_from_playlist(s, current_user.id, id, body.storyIds, commit=False))
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return {"status": "success", "removed": removed}
+
+@router.put("/{id}/order", status_code=status.HTTP_200_OK)
+async def reorder_playlist(id: str, body: PlaylistStoryIds, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    # The listed stories move to the front in that order; the others follow in their current order.
+    # In the writer, so two reorders can't both compute positions from the same starting order.
+    order = await writer.submit(lambda s: crud.reorder_playlist(s, current_user.id, id, body.storyIds, commit=False))
+    if order is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return {"status": "success", "story_ids": order}
+
 @router.post("/{id}/stories/{story_id}", status_code=status.HTTP_200_OK)
-async def add_to_playlist(id: str, story_id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    success = await crud.add_story_to_playlist(session, current_user.id, id, story_id)
+async def add_to_playlist(id: str, story_id: str, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    success = await writer.submit(lambda s: crud.add_story_to_playlist(s, current_user.id, id, story_id, commit=False))
     if not success:
         raise HTTPException(status_code=404, detail="Playlist or Story not found")
     return {"status": "success"}
 
 @router.delete("/{id}/stories/{story_id}", status_code=status.HTTP_200_OK)
-async def remove_from_playlist(id: str, story_id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    success = await crud.remove_story_from_playlist(session, current_user.id, id, story_id)
+async def remove_from_playlist(id: str, story_id: str, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    success = await writer.submit(lambda s: crud.remove_story_from_playlist(s, current_user.id, id, story_id, commit=False))
     if not success:
         raise HTTPException(status_code=404, detail="Playlist not found")
     return {"status": "success"}
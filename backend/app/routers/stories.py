@@ -1,112 +1,208 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from ..models import SavedStory, ReviewRequest, MnemonicAssociation, SRSMetadata, User
-from ..database import get_db
-from .. import crud
+from typing import List, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from ..models import SavedStory, ReviewRequest, MnemonicAssociation, SRSMetadata, User, PrepareStoryRequest, StoryArtifact, QuizQuestion, StorySearchResults
+from ..database import get_db, get_read_db, get_session_factory
+from .. import crud, pipeline, quiz_bank, reaper, review_log, scheduler, serialization, similarity, write_queue
 from ..auth import get_current_user
+from ..rate_limit import client_identity
 import time
 
 router = APIRouter(prefix="/stories", tags=["Stories"])
 
 @router.get("", response_model=List[SavedStory])
-async def get_stories(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+async def get_stories(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_read_db)):
+    if serialization.FAST_JSON_ENABLED:
+        # Plain column rows straight to JSON: no ORM identity map, no response_model validation
+        return serialization.stories_response(await crud.get_story_rows(session, current_user.id))
     return await crud.get_stories(session, current_user.id)
 
+@router.get("/search", response_model=StorySearchResults)
+async def search_stories(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_db)
+):
+    # Declared before /{id} so "search" isn't taken for a story id
+    total, hits = await crud.search_stories(session, current_user.id, q, limit, offset)
+    return {"query": q, "total": total, "limit": limit, "offset": offset, "hits": hits}
+
 @router.post("", response_model=SavedStory, status_code=status.HTTP_201_CREATED)
-async def create_story(story: SavedStory, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    return await crud.create_story(session, current_user.id, story)
+async def create_story(
+    story: SavedStory,
+    background_tasks: BackgroundTasks,
+    prepare: bool = False,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    identity: str = Depends(client_identity),
+    writer = Depends(write_queue.get_writer)
+):
+    db_story = await writer.submit(lambda s: crud.create_story(s, current_user.id, story, commit=False))
+    _sync_public_index(current_user, db_story)
+    if prepare:
+        # Start quiz/image/speech generation right away instead of waiting for the client to ask
+        await _schedule_prepare(db_story, PrepareStoryRequest(), current_user, session, writer, session_factory, background_tasks, identity)
+    return db_story
+
+def _sync_public_index(current_user, db_story=None, deleted_id: Optional[str] = None):
+    # Admin stories are the public mnemonics offered for reuse; keep the similarity index current
+    if not getattr(current_user, "is_admin", False) or similarity.index.built_at is None:
+        return
+    if deleted_id is not None:
+        similarity.index.remove(f"story:{deleted_id}")
+    elif db_story is not None:
+        similarity.index.add_story(db_story)
+
+async def _schedule_prepare(db_story, prepare: PrepareStoryRequest, current_user, session, writer, session_factory, background_tasks: BackgroundTasks, identity: str):
+    existing = {a.kind: a for a in await crud.get_story_artifacts(session, db_story.id)}
+    kinds = pipeline.kinds_to_run(prepare.kinds, existing, prepare.force)
+    image_ready = "image" in kinds and bool(db_story.imageData) and not prepare.force
+    if image_ready:
+        kinds.remove("image")
+
+    async def mark(s: AsyncSession):
+        if image_ready:
+            await crud.upsert_story_artifact(s, db_story.id, "image", "ready", commit=False)
+        for kind in kinds:
+            await crud.upsert_story_artifact(s, db_story.id, kind, "pending", commit=False)
+
+    if image_ready or kinds:
+        await writer.submit(mark)
+    if kinds:
+        background_tasks.add_task(
+            pipeline.prepare_story_artifacts, session_factory, current_user.id, db_story.id, kinds, prepare.language, identity, prepare.force
+        )
 
 @router.get("/{id}", response_model=SavedStory)
-async def get_story(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+async def get_story(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_read_db)):
     story = await crud.get_story(session, current_user.id, id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
+    if serialization.FAST_JSON_ENABLED:
+        return serialization.story_response(story)
     return story
 
 @router.put("/{id}", response_model=SavedStory)
-async def update_story(id: str, story: SavedStory, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
+async def update_story(id: str, story: SavedStory, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
     if story.id != id:
         raise HTTPException(status_code=400, detail="ID mismatch")
     
-    updated = await crud.update_story(session, current_user.id, id, story)
+    # In the writer, so a save can't interleave with (and undo) a review of the same story
+    updated = await writer.submit(lambda s: crud.update_story(s, current_user.id, id, story, commit=False))
     if not updated:
         raise HTTPException(status_code=404, detail="Story not found")
+    _sync_public_index(current_user, updated)
     return updated
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_story(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_db)):
-    success = await crud.delete_story(session, current_user.id, id)
+async def delete_story(id: str, current_user: User = Depends(get_current_user), writer = Depends(write_queue.get_writer)):
+    success = await writer.submit(lambda s: crud.delete_story(s, current_user.id, id, commit=False))
     if not success:
         raise HTTPException(status_code=404, detail="Story not found")
+    _sync_public_index(current_user, deleted_id=id)
+    # The story is already hidden; links, artifacts, audio and the row are purged in the background
+    reaper.wake()
     return
 
+@router.post("/{id}/prepare", response_model=List[StoryArtifact], status_code=status.HTTP_202_ACCEPTED)
+async def prepare_story(
+    id: str,
+    background_tasks: BackgroundTasks,
+    prepare: Optional[PrepareStoryRequest] = None,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    identity: str = Depends(client_identity),
+    writer = Depends(write_queue.get_writer)
+):
+    db_story = await crud.get_story(session, current_user.id, id)
+    if not db_story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    await _schedule_prepare(db_story, prepare or PrepareStoryRequest(), current_user, session, writer, session_factory, background_tasks, identity)
+    return await crud.get_story_artifacts(session, id)
+
+@router.get("/{id}/artifacts", response_model=List[StoryArtifact])
+async def get_story_artifacts(id: str, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_read_db)):
+    db_story = await crud.get_story(session, current_user.id, id)
+    if not db_story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return await crud.get_story_artifacts(session, id)
+
+@router.get("/{id}/quiz", response_model=List[QuizQuestion])
+async def get_story_quiz(
+    id: str,
+    background_tasks: BackgroundTasks,
+    language: Literal['en', 'es'] = 'en',
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    identity: str = Depends(client_identity),
+    writer = Depends(write_queue.get_writer)
+):
+    # Repeat quizzes are a bank read; the LLM is only called when an association has no questions yet.
+    # Stays on the primary: a lagging replica would miss fresh questions and trigger a needless top-up.
+    db_story = await crud.get_story(session, current_user.id, id)
+    if not db_story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    questions, low = await quiz_bank.sample_quiz(session, writer, db_story, language, identity)
+    if low:
+        background_tasks.add_task(quiz_bank.top_up, session_factory, current_user.id, id, language, identity)
+    return questions
+
 @router.post("/{id}/review", response_model=SavedStory)
 async def review_story_association(
     id: str, 
     review: ReviewRequest, 
     current_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_db)
+    writer = Depends(write_queue.get_writer),
+    events = Depends(review_log.get_review_log)
 ):
-    db_story = await crud.get_story(session, current_user.id, id)
-    if not db_story:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    # Parse associations from JSON (dict) to Pydantic models for manipulation
-    try:
-        # db_story.associations is a list of dicts
-        associations_objs = [MnemonicAssociation(**a) for a in db_story.associations]
-        association = associations_objs[review.associationIndex]
-    except (IndexError, TypeError):
-        raise HTTPException(status_code=400, detail="Association index out of bounds or invalid data")
-
-    # Initial state or existing
-    if association.srs is None:
-        n, ef, i = 0, 2.5, 0
-    else:
-        n, ef, i = association.srs.n, association.srs.ef, association.srs.i
-
-    quality = review.quality
-    
-    if quality >= 3:
-        if n == 0:
-            i = 1
-        elif n == 1:
-            i = 6
-        else:
-            i = int(round(i * ef))
-        n += 1
-    else:
-        n = 0
-        i = 1
-    
-    # Update EF
-    ef = ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-    if ef < 1.3:
-        ef = 1.3
-        
-    now_ms = int(time.time() * 1000)
-    # i is in days, convert to ms
-    next_review_ms = now_ms + (i * 24 * 60 * 60 * 1000)
-    
-    new_srs = {
-        "n": n,
-        "ef": ef,
-        "i": i,
-        "lastReview": now_ms,
-        "nextReview": next_review_ms
-    }
-    
-    # Update object
-    association.srs = SRSMetadata(**new_srs)
-    associations_objs[review.associationIndex] = association
-    
-    # Save back to DB (Convert back to dicts)
-    # IMPORTANT: We must re-assign the list to trigger mutation detection in SQLAlchemy or explicitly flag modified
-    db_story.associations = [a.model_dump() for a in associations_objs]
+    event = {}
+
+    async def apply_review(session: AsyncSession):
+        # Runs in the writer: the story is re-read there, so parallel reviews build on each other
+        db_story = await crud.get_story(session, current_user.id, id, for_update=True)
+        if not db_story:
+            raise HTTPException(status_code=404, detail="Story not found")
+
+        # Parse associations from JSON (dict) to Pydantic models for manipulation
+        try:
+            # db_story.associations is a list of dicts
+            associations_objs = [MnemonicAssociation(**a) for a in db_story.associations]
+            association = associations_objs[review.associationIndex]
+        except (IndexError, TypeError):
+            raise HTTPException(status_code=400, detail="Association index out of bounds or invalid data")
+
+        # FSRS uses the user's fitted weights when they have them; SM-2 has none
+        srs_scheduler = scheduler.get_scheduler()
+        if srs_scheduler.name == "fsrs":
+            srs_scheduler = scheduler.get_scheduler("fsrs", await crud.get_scheduler_weights(session, current_user.id))
+        current_srs = association.srs.model_dump() if association.srs else None
+        new_srs = srs_scheduler.review(current_srs, review.quality, int(time.time() * 1000))
+        event.update(
+            user_id=current_user.id, story_id=id, associationIndex=review.associationIndex, quality=review.quality,
+            reviewedAt=new_srs["lastReview"], previousReview=current_srs["lastReview"] if current_srs else None,
+            scheduler=srs_scheduler.name, interval=new_srs["i"],
+        )
+
+        # Update object
+        association.srs = SRSMetadata(**new_srs)
+        associations_objs[review.associationIndex] = association
     
-    session.add(db_story)
-    await session.commit()
-    await session.refresh(db_story)
+        # Save back to DB (Convert back to dicts)
+        # IMPORTANT: We must re-assign the list to trigger mutation detection in SQLAlchemy or explicitly flag modified
+        db_story.associations = [a.model_dump() for a in associations_objs]
     
+        await session.flush()
+        return db_story
+
+    db_story = await writer.submit(apply_review)
+    if review_log.REVIEW_LOG_ENABLED:
+        # Logged once the review has committed; a retried job overwrites the same dict
+        await events.record(event)
+    if serialization.FAST_JSON_ENABLED:
+        return serialization.story_response(db_story)
     return db_story
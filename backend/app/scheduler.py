@@ -0,0 +1,225 @@
+import os
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Spaced-repetition schedulers. A review takes the association's current `srs` dict (or None
+# for a new card), the 0-5 quality from the client and the time, and returns the next `srs`.
+# SM-2 is the original algorithm. FSRS models memory stability/difficulty and targets a
+# retention, so strong cards are spaced further apart; its 17 weights can be fitted per user
+# from their review history with fit_weights().
+SRS_SCHEDULER = os.getenv("SRS_SCHEDULER", "sm2")
+FSRS_DESIRED_RETENTION = float(os.getenv("FSRS_DESIRED_RETENTION", "0.9"))
+FSRS_MAXIMUM_INTERVAL = int(os.getenv("FSRS_MAXIMUM_INTERVAL", "3650"))  # days
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class Scheduler(ABC):
+    name = "base"
+
+    @abstractmethod
+    def review(self, srs: Optional[dict], quality: int, now_ms: int) -> dict:
+        ...
+
+class SM2Scheduler(Scheduler):
+    name = "sm2"
+
+    def review(self, srs: Optional[dict], quality: int, now_ms: int) -> dict:
+        if srs is None:
+            n, ef, i = 0, 2.5, 0
+        else:
+            n, ef, i = srs["n"], srs["ef"], srs["i"]
+
+        if quality >= 3:
+            if n == 0:
+                i = 1
+            elif n == 1:
+                i = 6
+            else:
+                i = int(round(i * ef))
+            n += 1
+        else:
+            n = 0
+            i = 1
+
+        ef = max(1.3, ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+        return {"n": n, "ef": ef, "i": i, "lastReview": now_ms, "nextReview": now_ms + i * DAY_MS}
+
+# --- FSRS (v4.5) ---
+
+DEFAULT_WEIGHTS = [
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+]
+# Bounds the optimizer keeps each weight within (from the reference implementation)
+WEIGHT_BOUNDS = [
+    (0.1, 100), (0.1, 100), (0.1, 100), (0.1, 100), (1, 10), (0.1, 5), (0.1, 5), (0, 0.75), (0, 4),
+    (0, 0.8), (0.01, 3), (0.5, 5), (0.01, 0.2), (0.01, 0.9), (0.01, 3), (0, 1), (1, 6),
+]
+DECAY = -0.5
+FACTOR = 0.9 ** (1 / DECAY) - 1  # So that retrievability is 90% when elapsed time equals stability
+
+def rating(quality: int) -> int:
+    """0-5 quality to FSRS rating: 1 again (0-2), 2 hard (3), 3 good (4), 4 easy (5)."""
+    return 1 if quality < 3 else quality - 1
+
+def retrievability(elapsed_days: float, stability: float) -> float:
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+class FSRSScheduler(Scheduler):
+    name = "fsrs"
+
+    def __init__(self, weights: Optional[Sequence[float]] = None, desired_retention: Optional[float] = None,
+                 maximum_interval: Optional[int] = None):
+        self.w = list(weights or DEFAULT_WEIGHTS)
+        self.desired_retention = desired_retention or FSRS_DESIRED_RETENTION
+        self.maximum_interval = maximum_interval or FSRS_MAXIMUM_INTERVAL
+
+    def init_difficulty(self, g: int) -> float:
+        return min(10.0, max(1.0, self.w[4] - (g - 3) * self.w[5]))
+
+    def next_difficulty(self, d: float, g: int) -> float:
+        # Step by rating, then revert toward the difficulty of a "good" first answer
+        d = d - self.w[6] * (g - 3)
+        return min(10.0, max(1.0, self.w[7] * self.init_difficulty(3) + (1 - self.w[7]) * d))
+
+    def next_stability(self, d: float, s: float, r: float, g: int) -> float:
+        w = self.w
+        if g == 1:
+            forget = w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1) * math.exp(w[14] * (1 - r))
+            return max(0.01, min(forget, s))
+        hard_penalty = w[15] if g == 2 else 1.0
+        easy_bonus = w[16] if g == 4 else 1.0
+        return s * (1 + math.exp(w[8]) * (11 - d) * s ** -w[9] * (math.exp(w[10] * (1 - r)) - 1) * hard_penalty * easy_bonus)
+
+    def interval(self, s: float) -> int:
+        days = s / FACTOR * (self.desired_retention ** (1 / DECAY) - 1)
+        return int(min(self.maximum_interval, max(1, round(days))))
+
+    def memory_state(self, srs: dict):
+        """(stability, difficulty) of an existing card. Cards scheduled by SM-2 so far are
+        seeded from it: the last interval as stability, the ease factor mapped onto 1-10."""
+        if srs.get("s") is not None and srs.get("d") is not None:
+            return srs["s"], srs["d"]
+        return max(0.1, float(srs["i"])), min(10.0, max(1.0, 10 - (srs["ef"] - 1.3) * 5))
+
+    def review(self, srs: Optional[dict], quality: int, now_ms: int) -> dict:
+        g = rating(quality)
+        if srs is None or (srs["n"] == 0 and srs.get("s") is None and not srs.get("lastReview")):
+            s, d = self.w[g - 1], self.init_difficulty(g)
+            n, ef = 0, 2.5 if srs is None else srs["ef"]
+        else:
+            s, d = self.memory_state(srs)
+            elapsed = max(0.0, (now_ms - srs["lastReview"]) / DAY_MS)
+            r = retrievability(elapsed, s)
+            s, d = self.next_stability(d, s, r, g), self.next_difficulty(d, g)
+            n, ef = srs["n"], srs["ef"]
+        i = self.interval(s)
+        return {
+            "n": n + 1 if g > 1 else 0, "ef": ef, "i": i, "lastReview": now_ms, "nextReview": now_ms + i * DAY_MS,
+            "s": round(s, 4), "d": round(d, 4),
+        }
+
+SCHEDULERS = {"sm2": SM2Scheduler, "fsrs": FSRSScheduler}
+
+def get_scheduler(name: Optional[str] = None, weights: Optional[Sequence[float]] = None) -> Scheduler:
+    name = name or SRS_SCHEDULER
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown SRS_SCHEDULER: {name}")
+    if name == "fsrs":
+        return FSRSScheduler(weights)
+    return SCHEDULERS[name]()
+
+# --- Optimizer ---
+
+@dataclass
+class FitResult:
+    weights: List[float]
+    loss: float          # Mean log loss on the user's reviews with fitted weights
+    default_loss: float  # ... and with DEFAULT_WEIGHTS, for comparison
+    reviews: int
+
+def _pad(cards: Sequence[Sequence[tuple]]):
+    """Review histories -> (elapsed days, ratings, mask) arrays of shape (cards, longest history)."""
+    import numpy as np
+
+    length = max(len(c) for c in cards)
+    elapsed = np.zeros((len(cards), length))
+    ratings = np.zeros((len(cards), length), dtype=np.int64)
+    for row, history in enumerate(cards):
+        for col, (days, g) in enumerate(history):
+            elapsed[row, col], ratings[row, col] = days, g
+    return elapsed, ratings, ratings > 0
+
+def _log_loss(w, elapsed, ratings, mask) -> float:
+    """Mean log loss of predicted recall on every review after a card's first, with every
+    card stepped in lockstep: one array operation per review position, not per review."""
+    import numpy as np
+
+    g = ratings[:, 0]
+    s = w[np.clip(g - 1, 0, 3)]
+    d = np.clip(w[4] - (g - 3) * w[5], 1, 10)
+    init_good = np.clip(w[4], 1, 10)
+    total, count = 0.0, 0
+    for k in range(1, ratings.shape[1]):
+        live = mask[:, k]
+        if not live.any():
+            break
+        g = ratings[:, k]
+        r = np.clip((1 + FACTOR * elapsed[:, k] / s) ** DECAY, 1e-6, 1 - 1e-6)
+        recalled = g > 1
+        total -= np.sum(np.where(live, np.where(recalled, np.log(r), np.log(1 - r)), 0.0))
+        count += int(live.sum())
+
+        grow = s * (1 + np.exp(w[8]) * (11 - d) * s ** -w[9] * (np.exp(w[10] * (1 - r)) - 1)
+                    * np.where(g == 2, w[15], 1.0) * np.where(g == 4, w[16], 1.0))
+        forget = np.minimum(w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1) * np.exp(w[14] * (1 - r)), s)
+        next_s = np.maximum(np.where(recalled, grow, forget), 0.01)
+        next_d = np.clip(w[7] * init_good + (1 - w[7]) * (d - w[6] * (g - 3)), 1, 10)
+        s, d = np.where(live, next_s, s), np.where(live, next_d, d)
+    return total / max(count, 1)
+
+def fit_weights(cards: Sequence[Sequence[tuple]], iterations: int = 200, learning_rate: float = 0.02,
+                prior: float = 0.05, initial: Optional[Sequence[float]] = None) -> FitResult:
+    """Fits FSRS weights to one user's history: `cards` holds, per card, its reviews in order as
+    (days since the previous review, rating 1-4); the first review's elapsed days are ignored.
+
+    Adam on central finite-difference gradients, each loss evaluation vectorized over all cards.
+    `prior` pulls weights toward the defaults (relative L2), so sparse histories don't overfit."""
+    # Imported here, not at the top: only offline fitting needs numpy, and it would add
+    # ~130ms to every cold start (app.main imports this module through the review endpoint)
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("numpy is required to fit scheduler weights (pip install numpy)")
+    cards = [c for c in cards if c]
+    if not cards:
+        return FitResult(list(DEFAULT_WEIGHTS), 0.0, 0.0, 0)
+    elapsed, ratings, mask = _pad(cards)
+    defaults = np.array(DEFAULT_WEIGHTS)
+    low, high = np.array(WEIGHT_BOUNDS).T
+    scale = np.maximum(np.abs(defaults), 0.1)
+
+    def objective(w):
+        return _log_loss(w, elapsed, ratings, mask) + prior * float(np.mean(((w - defaults) / scale) ** 2))
+
+    w = np.clip(np.array(initial if initial is not None else DEFAULT_WEIGHTS, dtype=float), low, high)
+    m, v = np.zeros_like(w), np.zeros_like(w)
+    steps = np.eye(len(w)) * (1e-4 * scale)
+    for t in range(1, iterations + 1):
+        grad = np.array([(objective(w + h) - objective(w - h)) / (2 * h[j]) for j, h in enumerate(steps)])
+        m = 0.9 * m + 0.1 * grad
+        v = 0.999 * v + 0.001 * grad ** 2
+        # Steps are relative to each weight's magnitude (they range from 0.03 to 14)
+        w = np.clip(w - learning_rate * scale * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8), low, high)
+
+    return FitResult(
+        weights=[round(float(x), 4) for x in w],
+        loss=_log_loss(w, elapsed, ratings, mask),
+        default_loss=_log_loss(defaults, elapsed, ratings, mask),
+        reviews=int(mask[:, 1:].sum()),
+    )
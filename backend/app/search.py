@@ -0,0 +1,92 @@
+import re
+from typing import List, Tuple
+from sqlalchemy import DDL, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import sql_models
+
+# Full-text search over a user's stories (topic, facts, story text, association terms).
+# SQLite: an FTS5 table kept in sync by triggers, keyed by saved_stories.rowid.
+# Postgres: a generated tsvector column with a GIN index.
+# Both are created with the table (create_all) and by ensure_installed() for existing databases.
+
+SNIPPET_START, SNIPPET_END = "<mark>", "</mark>"
+
+# Association terms as searchable text: "Bradycardia Slow clock Fatigue Sleepy Betty".
+# Compact rows use one-letter keys (association_codec); rows not yet migrated use the full ones.
+_TERMS_SQL = """(SELECT group_concat(coalesce(json_extract(value, '$.t'), json_extract(value, '$.medicalTerm'), '') || ' ' || coalesce(json_extract(value, '$.c'), json_extract(value, '$.character'), ''), ' ') FROM json_each({row}.associations))"""
+_FACTS_SQL = """(SELECT group_concat(value, ' ') FROM json_each({row}.facts))"""
+_INSERT_SQL = """INSERT INTO story_search(rowid, topic, facts, story, terms) VALUES ({row}.rowid, {row}.topic, """ + _FACTS_SQL + """, {row}.story, """ + _TERMS_SQL + """);"""
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS story_search USING fts5(topic, facts, story, terms, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS saved_stories_search_insert AFTER INSERT ON saved_stories BEGIN "
+    + _INSERT_SQL.format(row="NEW") + " END",
+    "CREATE TRIGGER IF NOT EXISTS saved_stories_search_delete AFTER DELETE ON saved_stories BEGIN "
+    "DELETE FROM story_search WHERE rowid = OLD.rowid; END",
+    # Reviews rewrite `associations` constantly; only reindex when searchable text actually changed
+    "CREATE TRIGGER IF NOT EXISTS saved_stories_search_update AFTER UPDATE OF topic, facts, story, associations ON saved_stories "
+    "WHEN OLD.topic IS NOT NEW.topic OR OLD.facts IS NOT NEW.facts OR OLD.story IS NOT NEW.story OR "
+    + _TERMS_SQL.format(row="OLD") + " IS NOT " + _TERMS_SQL.format(row="NEW") + " BEGIN "
+    "DELETE FROM story_search WHERE rowid = OLD.rowid; " + _INSERT_SQL.format(row="NEW") + " END",
+]
+SQLITE_BACKFILL = (
+    "INSERT INTO story_search(rowid, topic, facts, story, terms) SELECT s.rowid, s.topic, "
+    + _FACTS_SQL.format(row="s") + ", s.story, " + _TERMS_SQL.format(row="s")
+    + " FROM saved_stories s WHERE s.rowid NOT IN (SELECT rowid FROM story_search)"
+)
+
+POSTGRES_DDL = [
+    "ALTER TABLE saved_stories ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(topic, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(associations::text, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(facts::text, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(story, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_saved_stories_search_vector ON saved_stories USING GIN (search_vector)",
+]
+
+for statement in SQLITE_DDL:
+    event.listen(sql_models.SavedStory.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_DDL:
+    event.listen(sql_models.SavedStory.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(
+    sql_models.SavedStory.__table__, "after_drop", DDL("DROP TABLE IF EXISTS story_search").execute_if(dialect="sqlite")
+)
+
+async def ensure_installed(conn):
+    """Creates the search table/triggers (or column/index) on databases that predate them."""
+    if conn.dialect.name == "sqlite":
+        for statement in SQLITE_DDL:
+            await conn.execute(text(statement))
+        await conn.execute(text(SQLITE_BACKFILL))
+    elif conn.dialect.name == "postgresql":
+        for statement in POSTGRES_DDL:
+            await conn.execute(text(statement))
+
+def _terms(query: str) -> List[str]:
+    # Only word characters reach the query language, so user input can't produce syntax errors
+    return re.findall(r"\w+", query, re.UNICODE)[:16]
+
+async def search_stories(session: AsyncSession, user_id: str, query: str, limit: int, offset: int) -> Tuple[int, List[dict]]:
+    """Returns (total hits, page of {id, topic, snippet, score}) ranked best first."""
+    terms = _terms(query)
+    if not terms:
+        return 0, []
+    if session.bind.dialect.name == "postgresql":
+        params = {"q": " & ".join(f"{t}:*" for t in terms), "uid": user_id, "limit": limit, "offset": offset}
+        where = "FROM saved_stories s, to_tsquery('simple', :q) query WHERE s.user_id = :uid AND s.\"deletedAt\" IS NULL AND s.search_vector @@ query"
+        total = (await session.execute(text(f"SELECT count(*) {where}"), params)).scalar_one()
+        rows = (await session.execute(text(
+            "SELECT s.id, s.topic, ts_headline('simple', s.topic || ' ' || s.story, query, "
+            f"'StartSel={SNIPPET_START},StopSel={SNIPPET_END},MaxWords=24,MinWords=8') AS snippet, "
+            f"ts_rank_cd(s.search_vector, query) AS score {where} ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        ), params)).all()
+    else:
+        params = {"q": " ".join(f'"{t}"*' for t in terms), "uid": user_id, "limit": limit, "offset": offset}
+        where = "FROM story_search JOIN saved_stories s ON s.rowid = story_search.rowid WHERE story_search MATCH :q AND s.user_id = :uid AND s.\"deletedAt\" IS NULL"
+        total = (await session.execute(text(f"SELECT count(*) {where}"), params)).scalar_one()
+        # bm25 column weights: topic, facts, story, association terms (lower rank is better)
+        rows = (await session.execute(text(
+            f"SELECT s.id, s.topic, snippet(story_search, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS snippet, "
+            f"-bm25(story_search, 10.0, 4.0, 1.0, 6.0) AS score {where} ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        ), params)).all()
+    return total, [{"id": r.id, "topic": r.topic, "snippet": r.snippet, "score": round(float(r.score), 4)} for r in rows]
@@ -0,0 +1,43 @@
+import os
+import json
+from typing import Any, Iterable, Mapping
+from fastapi import Response
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same JSON, just slower
+    orjson = None
+
+load_dotenv()
+
+# Story reads skip Pydantic: rows were validated when they were written, so they're encoded
+# straight from the database columns. Set FAST_JSON_ENABLED=0 to go back through response_model.
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "1") != "0"
+
+# Output fields of models.SavedStory, in order
+STORY_FIELDS = ("topic", "facts", "story", "associations", "visualPrompt", "id", "createdAt", "imageData")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class TrustedJSONResponse(Response):
+    """JSON response for data that is already in its output shape; nothing is validated or converted."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def story_dict(story: Any) -> dict:
+    """Output dict for a SavedStory ORM object or a row mapping with the story columns."""
+    if isinstance(story, Mapping):
+        return {field: story[field] for field in STORY_FIELDS}
+    return {field: getattr(story, field) for field in STORY_FIELDS}
+
+def stories_response(stories: Iterable[Any]) -> TrustedJSONResponse:
+    return TrustedJSONResponse([story_dict(s) for s in stories])
+
+def story_response(story: Any, status_code: int = 200) -> TrustedJSONResponse:
+    return TrustedJSONResponse(story_dict(story), status_code=status_code)
@@ -0,0 +1,196 @@
+import os
+import re
+import math
+import time
+import asyncio
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from . import sql_models
+
+load_dotenv()
+
+# Local TF-IDF index over public mnemonics and curriculum concepts, so near-duplicate
+# requests can reuse an existing mnemonic instead of paying for a new generation.
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "1") != "0"
+SIMILARITY_REUSE_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.75"))
+SIMILARITY_SUGGEST_THRESHOLD = float(os.getenv("SIMILARITY_SUGGEST_THRESHOLD", "0.4"))
+SIMILARITY_REFRESH_SECONDS = float(os.getenv("SIMILARITY_REFRESH_SECONDS", "300"))
+
+_STOPWORDS = {
+    # English
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "in", "is", "it", "its", "of", "on",
+    "or", "that", "the", "to", "with", "which", "was", "were", "this", "these", "those", "may", "also",
+    # Spanish
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "y", "o", "de", "del", "en", "con", "por", "para",
+    "que", "se", "es", "son", "al", "lo", "su", "sus", "como", "puede", "pueden",
+}
+_SPANISH_HINTS = {"el", "la", "los", "las", "y", "de", "del", "que", "con", "por", "para", "es", "son", "una"}
+_ENGLISH_HINTS = {"the", "and", "of", "with", "is", "are", "to", "for", "that", "which"}
+
+def _words(text: str) -> List[str]:
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"[a-z0-9]+", ascii_text.lower())
+
+def _stem(word: str) -> str:
+    # Plural folding is enough to match "blockers"/"blocker", "betabloqueantes"/"betabloqueante"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Unigrams plus bigrams of normalized, stopword-free, plural-folded words."""
+    words = [_stem(w) for w in _words(text) if w not in _STOPWORDS and len(w) > 1]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+def guess_language(text: str) -> str:
+    words = _words(text)
+    es = sum(w in _SPANISH_HINTS for w in words)
+    en = sum(w in _ENGLISH_HINTS for w in words)
+    return "es" if es > en else "en"
+
+@dataclass
+class Document:
+    key: str                     # "story:<id>" or "concept:<id>"
+    kind: str                    # "story" | "concept"
+    ref_id: str
+    topic: str
+    language: str
+    tf: Dict[str, int]
+    concept_id: Optional[str] = None
+
+@dataclass
+class Match:
+    kind: str
+    id: str
+    topic: str
+    score: float
+    conceptId: Optional[str] = None
+
+class SimilarityIndex:
+    def __init__(self):
+        self.docs: Dict[str, Document] = {}
+        self.postings: Dict[str, Set[str]] = {}  # term -> doc keys
+        self.df: Counter = Counter()
+        self._norms: Dict[str, float] = {}
+        self.built_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self.docs)) / (1 + self.df[term])) + 1.0
+
+    def _norm(self, key: str) -> float:
+        # Cached per document and invalidated whenever the corpus (and so every idf) changes
+        norm = self._norms.get(key)
+        if norm is None:
+            tf = self.docs[key].tf
+            norm = math.sqrt(sum((count * self._idf(term)) ** 2 for term, count in tf.items())) or 1.0
+            self._norms[key] = norm
+        return norm
+
+    def add(self, doc: Document):
+        self.remove(doc.key)
+        self.docs[doc.key] = doc
+        for term in doc.tf:
+            self.postings.setdefault(term, set()).add(doc.key)
+            self.df[term] += 1
+        self._norms.clear()
+
+    def remove(self, key: str):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for term in doc.tf:
+            self.df[term] -= 1
+            self.postings[term].discard(doc.key)
+            if not self.postings[term]:
+                del self.postings[term]
+                del self.df[term]
+        self._norms.clear()
+
+    def add_story(self, story: Any, concept_facts: Optional[List[str]] = None):
+        # A SavedStory, or any row with its id, topic, facts, story and concept_id
+        text = " ".join([story.topic, *(story.facts or []), *(concept_facts or [])])
+        self.add(Document(
+            key=f"story:{story.id}", kind="story", ref_id=story.id, topic=story.topic,
+            language=guess_language(" ".join([story.story or "", *(story.facts or [])])),
+            tf=Counter(tokenize(text)), concept_id=story.concept_id,
+        ))
+
+    def add_concept(self, concept: sql_models.Concept):
+        text = " ".join([concept.name, *(concept.facts or [])])
+        self.add(Document(
+            key=f"concept:{concept.id}", kind="concept", ref_id=concept.id, topic=concept.name,
+            language=guess_language(" ".join(concept.facts or [])), tf=Counter(tokenize(text)), concept_id=concept.id,
+        ))
+
+    def search(self, text: str, limit: int = 5, kind: Optional[str] = None, language: Optional[str] = None,
+               min_score: float = 0.0) -> List[Match]:
+        """Cosine similarity over TF-IDF vectors; only documents sharing a term are scored."""
+        query_tf = Counter(t for t in tokenize(text) if t in self.df)
+        if not query_tf:
+            return []
+        query = {term: count * self._idf(term) for term, count in query_tf.items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        dots: Dict[str, float] = {}
+        for term, weight in query.items():
+            idf = self._idf(term)
+            for key in self.postings.get(term, ()):
+                dots[key] = dots.get(key, 0.0) + weight * self.docs[key].tf[term] * idf
+        matches = []
+        for key, dot in dots.items():
+            doc = self.docs[key]
+            if kind is not None and doc.kind != kind:
+                continue
+            if language is not None and doc.language != language:
+                continue
+            score = dot / (query_norm * self._norm(key))
+            if score >= min_score:
+                matches.append(Match(doc.kind, doc.ref_id, doc.topic, round(score, 4), doc.concept_id))
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:limit]
+
+    async def ensure_fresh(self, session: AsyncSession):
+        """(Re)builds from the database on first use and every SIMILARITY_REFRESH_SECONDS.
+        Admin story writes are applied immediately via add_story/remove."""
+        if self.built_at is not None and time.monotonic() - self.built_at < SIMILARITY_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if self.built_at is not None and time.monotonic() - self.built_at < SIMILARITY_REFRESH_SECONDS:
+                return
+            concepts = (await session.execute(select(sql_models.Concept))).scalars().all()
+            # Only admin-authored stories are public; users' own stories never leak into suggestions.
+            # Just the indexed columns: full rows would drag every story's base64 image along
+            story = sql_models.SavedStory
+            stories = (await session.execute(
+                select(story.id, story.topic, story.facts, story.story, story.concept_id)
+                .join(sql_models.User)
+                .where(sql_models.User.is_admin == True, story.deletedAt.is_(None))
+            )).all()
+            concept_facts = {c.id: c.facts for c in concepts}
+            fresh = SimilarityIndex()
+            for concept in concepts:
+                fresh.add_concept(concept)
+            for story in stories:
+                fresh.add_story(story, concept_facts.get(story.concept_id))
+            self.docs, self.postings, self.df, self._norms = fresh.docs, fresh.postings, fresh.df, {}
+            self.built_at = time.monotonic()
+
+index = SimilarityIndex()
+
+async def find_reusable(session: AsyncSession, text: str, language: str) -> Optional[sql_models.SavedStory]:
+    """Returns a public mnemonic close enough to reuse instead of generating, if any."""
+    if not SIMILARITY_ENABLED:
+        return None
+    await index.ensure_fresh(session)
+    matches = index.search(text, limit=1, kind="story", language=language, min_score=SIMILARITY_REUSE_THRESHOLD)
+    if not matches:
+        return None
+    return await session.get(sql_models.SavedStory, matches[0].id)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, Text, Integer, JSON, ForeignKey, BigInteger, Table, Boolean
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import Column, String, Text, Integer, Float, JSON, ForeignKey, BigInteger, Table, Boolean, UniqueConstraint, Index, event
+from sqlalchemy.orm import relationship, Mapped, mapped_column, Session, with_loader_criteria
 from typing import List, Optional, Any
 from .database import Base
+from .association_codec import CompactAssociations
 import uuid
 
 # Association table for Many-to-Many relationship between Playlists and Stories
@@ -10,6 +11,9 @@ playlist_stories = Table(
     Base.metadata,
     Column("playlist_id", String, ForeignKey("playlists.id", ondelete="CASCADE"), primary_key=True),
     Column("story_id", String, ForeignKey("saved_stories.id", ondelete="CASCADE"), primary_key=True),
+    # Order within the playlist; gaps are fine, only the relative order matters
+    Column("position", Integer, nullable=False, default=0, server_default="0"),
+    Index("ix_playlist_stories_playlist_position", "playlist_id", "position"),
 )
 
 class User(Base):
@@ -72,10 +76,12 @@ class SavedStory(Base):
     topic: Mapped[str] = mapped_column(String) # This serves as the title/main topic name for individual stories
     facts: Mapped[List[str]] = mapped_column(JSON) # Storing List[str]
     story: Mapped[str] = mapped_column(Text)
-    associations: Mapped[List[Any]] = mapped_column(JSON) # Storing List[MnemonicAssociation] objects
+    associations: Mapped[List[Any]] = mapped_column(CompactAssociations) # List[MnemonicAssociation] dicts, stored compactly (see association_codec)
     visualPrompt: Mapped[str] = mapped_column(Text)
     imageData: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     createdAt: Mapped[int] = mapped_column(BigInteger) # Using BigInt for timestamp (ms)
+    # Tombstone (ms) set by delete; the reaper purges the row and everything hanging off it later
+    deletedAt: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
 
     user: Mapped["User"] = relationship("User", back_populates="stories")
     concept: Mapped[Optional["Concept"]] = relationship("Concept", back_populates="stories")
@@ -84,6 +90,22 @@ class SavedStory(Base):
         secondary=playlist_stories,
         back_populates="stories"
     )
+    artifacts: Mapped[List["StoryArtifact"]] = relationship("StoryArtifact", back_populates="story", cascade="all, delete-orphan")
+    quiz_questions: Mapped[List["QuizQuestion"]] = relationship("QuizQuestion", back_populates="story", cascade="all, delete-orphan")
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_stories(execute_state):
+    # Soft-deleted stories are invisible to every ORM query (including relationship loads like
+    # Playlist.stories) unless the statement opts in with execution_options(include_deleted=True)
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(SavedStory, lambda cls: cls.deletedAt.is_(None), include_aliases=True)
+        )
 
 class Playlist(Base):
     __tablename__ = "playlists"
@@ -98,5 +120,70 @@ class Playlist(Base):
     stories: Mapped[List["SavedStory"]] = relationship(
         "SavedStory",
         secondary=playlist_stories,
-        back_populates="playlists"
+        back_populates="playlists",
+        order_by=playlist_stories.c.position
     )
+
+class StoryArtifact(Base):
+    # Derived content generated ahead of time for a story (quiz, narration audio, image)
+    __tablename__ = "story_artifacts"
+    __table_args__ = (UniqueConstraint("story_id", "kind"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    story_id: Mapped[str] = mapped_column(String, ForeignKey("saved_stories.id", ondelete="CASCADE"), index=True)
+    kind: Mapped[str] = mapped_column(String) # "quiz" | "speech" | "image"
+    status: Mapped[str] = mapped_column(String, default="pending") # "pending" | "ready" | "failed"
+    data: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    updatedAt: Mapped[int] = mapped_column(BigInteger)
+
+    story: Mapped["SavedStory"] = relationship("SavedStory", back_populates="artifacts")
+
+class QuizQuestion(Base):
+    # Bank of generated questions per story association, sampled instead of calling the LLM on every quiz
+    __tablename__ = "quiz_questions"
+    __table_args__ = (Index("ix_quiz_questions_story_language", "story_id", "language"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    story_id: Mapped[str] = mapped_column(String, ForeignKey("saved_stories.id", ondelete="CASCADE"))
+    associationIndex: Mapped[int] = mapped_column(Integer)
+    # Hash of the association's character + term; questions for an edited association are no longer served
+    associationKey: Mapped[str] = mapped_column(String)
+    language: Mapped[str] = mapped_column(String, default="en")
+    question: Mapped[str] = mapped_column(Text)
+    options: Mapped[List[str]] = mapped_column(JSON)
+    correctOptionIndex: Mapped[int] = mapped_column(Integer)
+    explanation: Mapped[str] = mapped_column(Text)
+    timesServed: Mapped[int] = mapped_column(Integer, default=0)
+    createdAt: Mapped[int] = mapped_column(BigInteger)
+
+    story: Mapped["SavedStory"] = relationship("SavedStory", back_populates="quiz_questions")
+
+class SchedulerWeights(Base):
+    # FSRS weights fitted to one user's review history (scheduler.fit_weights); absent means the defaults
+    __tablename__ = "scheduler_weights"
+
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    weights: Mapped[List[float]] = mapped_column(JSON)
+    reviews: Mapped[int] = mapped_column(Integer) # Reviews the fit was based on
+    loss: Mapped[float] = mapped_column(Float) # Log loss with these weights (lower is better)
+    updatedAt: Mapped[int] = mapped_column(BigInteger)
+
+class ReviewEvent(Base):
+    # Append-only log of SRS reviews (see review_log); rows are never updated
+    __tablename__ = "review_events"
+    __table_args__ = (
+        # Per-user queries, and replay's card-by-card scan in review order
+        Index("ix_review_events_user_card", "user_id", "story_id", "associationIndex", "reviewedAt"),
+        Index("ix_review_events_reviewedAt", "reviewedAt"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id", ondelete="CASCADE"))
+    story_id: Mapped[str] = mapped_column(String) # No foreign key: the history outlives purged stories
+    associationIndex: Mapped[int] = mapped_column(Integer)
+    quality: Mapped[int] = mapped_column(Integer) # 0-5, as sent by the client
+    reviewedAt: Mapped[int] = mapped_column(BigInteger) # ms
+    previousReview: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True) # ms; null on a card's first review
+    scheduler: Mapped[str] = mapped_column(String) # Scheduler that set the next interval
+    interval: Mapped[int] = mapped_column(Integer) # Days until the next review, as scheduled
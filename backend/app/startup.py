@@ -0,0 +1,68 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from sqlalchemy import text
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+# Bump whenever a migration is added to the lifespan in main.py. On SQLite the version is
+# kept in PRAGMA user_version, so a warm database skips create_all and every ALTER attempt
+# (each one is a round trip to the volume on Modal). Postgres always runs them.
+SCHEMA_VERSION = 4
+FORCE_MIGRATIONS = os.getenv("FORCE_MIGRATIONS", "0") == "1"
+
+startup_phase_duration = metrics.registry.register(metrics.Histogram(
+    "startup_phase_duration_seconds", "Time spent in each startup phase", ["phase"]))
+
+async def get_schema_version(conn) -> Optional[int]:
+    if conn.dialect.name != "sqlite":
+        return None
+    return (await conn.execute(text("PRAGMA user_version"))).scalar()
+
+async def set_schema_version(conn, version: int = SCHEMA_VERSION):
+    if conn.dialect.name == "sqlite":
+        # PRAGMA arguments can't be bound parameters
+        await conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+async def schema_is_current(conn) -> bool:
+    if FORCE_MIGRATIONS:
+        return False
+    version = await get_schema_version(conn)
+    return version is not None and version >= SCHEMA_VERSION
+
+class StartupTimer:
+    """Times named startup phases and reports them once the app is ready."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.notes: Dict[str, str] = {}
+
+    def record(self, name: str, seconds: float, note: str = ""):
+        self.phases[name] = seconds
+        if note:
+            self.notes[name] = note
+        if metrics.METRICS_ENABLED:
+            startup_phase_duration.observe(seconds, name)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def note(self, name: str, note: str):
+        self.notes[name] = note
+
+    def report(self) -> str:
+        parts = [f"{name} {seconds * 1000:.0f}ms" + (f" ({self.notes[name]})" if name in self.notes else "")
+                 for name, seconds in self.phases.items()]
+        total = time.perf_counter() - self.started
+        line = f"Startup: ready in {total * 1000:.0f}ms: " + ", ".join(parts)
+        print(line)
+        return line
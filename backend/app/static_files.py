@@ -0,0 +1,128 @@
+import os
+import sys
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from .compression import _COMPRESSIBLE, accepted_encodings, brotli
+
+# Serves the built React app from an index built once at startup: no filesystem checks per
+# request, precompressed .br/.gz variants written at build time (python -m app.static_files),
+# immutable caching for content-hashed Vite assets and ETag revalidation for everything else.
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"  # Cache, but check the ETag every time (index.html must pick up new builds)
+
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+@dataclass
+class StaticFile:
+    path: str
+    stat: os.stat_result
+    media_type: str
+    etag: str
+    cache_control: str
+    variants: Dict[str, Tuple[str, os.stat_result]] = field(default_factory=dict)  # encoding -> precompressed copy
+
+def _etag(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+def is_hashed_asset(rel_path: str) -> bool:
+    # Vite content-hashes what it emits under assets/ (index-BQ3x9Zk1.js). Files from public/
+    # keep their names across builds, whatever they look like, so they must revalidate.
+    return rel_path.startswith("assets/")
+
+class StaticIndex:
+    def __init__(self, root: str):
+        self.root = root
+        self.files: Dict[str, StaticFile] = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith((".br", ".gz")):
+                    continue
+                path = os.path.join(directory, name)
+                rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+                self.files[rel_path] = StaticFile(
+                    path=path,
+                    stat=os.stat(path),
+                    media_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    etag=_etag(path),
+                    cache_control=IMMUTABLE if is_hashed_asset(rel_path) else REVALIDATE,
+                    variants={enc: (path + ext, os.stat(path + ext)) for enc, ext in _ENCODINGS if os.path.isfile(path + ext)},
+                )
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def lookup(self, rel_path: str) -> Optional[StaticFile]:
+        return self.files.get(rel_path)
+
+    def respond(self, request: Request, entry: StaticFile) -> Response:
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((enc for enc, _ in _ENCODINGS if enc in entry.variants and enc in accepted), None)
+        # Each representation gets its own validator, so caches never mix encodings
+        etag = f'"{entry.etag}-{encoding}"' if encoding else f'"{entry.etag}"'
+        headers = {"ETag": etag, "Cache-Control": entry.cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        path, stat = entry.path, entry.stat
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            path, stat = entry.variants[encoding]
+        # Passing the indexed stat saves FileResponse its own os.stat per request
+        return FileResponse(path, media_type=entry.media_type, headers=headers, stat_result=stat)
+
+def mount_spa(app: FastAPI, root: str) -> StaticIndex:
+    """Serves files from root, falling back to index.html for client-side routes."""
+    index = StaticIndex(root)
+    print(f"Static: indexed {len(index)} files in {root}")
+
+    @app.get("/{full_path:path}", include_in_schema=False)
+    async def serve_react_app(full_path: str, request: Request):
+        if full_path.startswith("api"):
+            raise HTTPException(status_code=404, detail="Not Found")
+        entry = index.lookup(full_path)
+        if entry is None:
+            if is_hashed_asset(full_path):
+                # A missing hashed asset is a stale page asking for an old build; index.html won't help
+                raise HTTPException(status_code=404, detail="Not Found")
+            entry = index.lookup("index.html")
+            if entry is None:
+                raise HTTPException(status_code=404, detail="Not Found")
+        return index.respond(request, entry)
+
+    return index
+
+def precompress(root: str, minimum_size: int = 1024) -> int:
+    """Writes .gz (and .br when brotli is installed) next to each compressible file. Returns files written."""
+    written = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            media_type = mimetypes.guess_type(name)[0] or ""
+            path = os.path.join(directory, name)
+            if name.endswith((".br", ".gz")) or not media_type.startswith(_COMPRESSIBLE) or os.path.getsize(path) < minimum_size:
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            # Build time, so spend the CPU on the smallest output
+            variants = [(".gz", gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", brotli.compress(body, quality=11)))
+            for ext, compressed in variants:
+                if len(compressed) < len(body):
+                    with open(path + ext, "wb") as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "static")
+    print(f"Precompressed {precompress(root)} files in {root}" + ("" if brotli else " (gzip only; brotli not installed)"))
@@ -0,0 +1,93 @@
+import os
+import sys
+import functools
+from contextlib import contextmanager
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, StatusCode
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+from dotenv import load_dotenv
+from .metrics import route_template
+
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "console")  # "console" (stdout) or "file"
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+
+# Until setup_tracing() installs the SDK provider this is a no-op tracer,
+# so instrumented code costs next to nothing when tracing is off.
+tracer = trace.get_tracer("medmnemonic")
+_propagator = TraceContextTextMapPropagator()
+
+def setup_tracing():
+    if not TRACING_ENABLED:
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    out = open(TRACE_FILE, "a") if TRACE_EXPORTER == "file" else sys.stdout
+    # One JSON object per line, in the OTel SDK's span JSON format
+    exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "medmnemonic-api"}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATE)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+@contextmanager
+def span(name: str, **attributes):
+    with tracer.start_as_current_span(name) as current:
+        if attributes and current.is_recording():
+            current.set_attributes({k: v for k, v in attributes.items() if v is not None})
+        yield current
+
+def traced(fn):
+    """Wraps an async function (e.g. a crud call) in a span named after it."""
+    if not TRACING_ENABLED:
+        return fn
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with tracer.start_as_current_span(name):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+class TracingMiddleware:
+    """One SERVER span per HTTP request; honours an incoming W3C `traceparent`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        parent = _propagator.extract(carrier)
+        status_holder = {"status": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(f"{scope['method']} {scope['path']}", context=parent, kind=SpanKind.SERVER) as current:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if current.is_recording():
+                    route = route_template(scope)
+                    current.update_name(f"{scope['method']} {route}")
+                    current.set_attribute("http.request.method", scope["method"])
+                    current.set_attribute("http.route", route)
+                    current.set_attribute("url.path", scope["path"])
+                    if status_holder["status"] is not None:
+                        current.set_attribute("http.response.status_code", status_holder["status"])
+                        if status_holder["status"] >= 500:
+                            current.set_status(StatusCode.ERROR)
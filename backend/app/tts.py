@@ -0,0 +1,149 @@
+import os
+import re
+import asyncio
+import struct
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+from . import prompt as prompts
+from .blob_store import blob_store, content_key, LocalBlobStore
+
+load_dotenv()
+
+TTS_MAX_CHUNK_CHARS = int(os.getenv("TTS_MAX_CHUNK_CHARS", "400"))
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# Bump when the audio format or voice settings change; prompt changes are covered by the template key
+TTS_CACHE_VERSION = "1"
+
+# Gemini TTS returns 16-bit little-endian mono PCM at 24 kHz
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+SynthesizeFn = Callable[[str, str, str], Awaitable[bytes]]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?¡¿…])\s+")
+
+def split_sentences(text: str, max_chars: Optional[int] = None) -> List[str]:
+    """Splits text into sentence-aligned chunks of at most max_chars (short sentences are merged)."""
+    max_chars = max_chars or TTS_MAX_CHUNK_CHARS
+    chunks: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        # A single overlong sentence is split on word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def chunk_key(chunk: str, voice: str, language: str) -> str:
+    return content_key("tts", TTS_CACHE_VERSION, prompts.TEMPLATES["speech"].key, prompts.MODEL_TTS, voice, language, chunk)
+
+def full_key(chunk_keys: List[str]) -> str:
+    return content_key("tts-full", *chunk_keys)
+
+def wav_header(data_len: Optional[int] = None) -> bytes:
+    # Unknown length (streaming): 0xFFFFFFFF sizes are accepted by browsers and ffmpeg
+    data_size = 0xFFFFFFFF if data_len is None else data_len
+    riff_size = 0xFFFFFFFF if data_len is None else 36 + data_len
+    byte_rate = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, CHANNELS, SAMPLE_RATE, byte_rate, CHANNELS * SAMPLE_WIDTH, SAMPLE_WIDTH * 8)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+class Synthesizer:
+    """Sentence-chunked, cached speech synthesis.
+
+    Each chunk is cached in the blob store under (text hash, voice, language), so replays
+    and shared sentences cost nothing; misses are synthesized in parallel."""
+
+    def __init__(self, synthesize: SynthesizeFn, store: Optional[LocalBlobStore] = None, concurrency: int = TTS_CONCURRENCY):
+        self._synthesize = synthesize
+        self.store = store or blob_store
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _chunk(self, key: str, text: str, voice: str, language: str) -> bytes:
+        cached = await self.store.aget(key)
+        if cached is not None:
+            return cached
+        async with self._semaphore:
+            pcm = await self._synthesize(text, voice, language)
+        await self.store.aput(key, pcm)
+        return pcm
+
+    def _start(self, text: str, voice: str, language: str) -> Tuple[List[str], List[asyncio.Task]]:
+        chunks = split_sentences(text)
+        keys = [chunk_key(c, voice, language) for c in chunks]
+        tasks = [asyncio.ensure_future(self._chunk(k, c, voice, language)) for k, c in zip(keys, chunks)]
+        return keys, tasks
+
+    async def missing_chunks(self, text: str, voice: str, language: str, full: bool = True) -> int:
+        """How many model calls synthesizing `text` would take right now (uncached chunks).
+        With full=False the cached full audio isn't considered (stream() doesn't use it)."""
+        keys = [chunk_key(c, voice, language) for c in split_sentences(text)]
+        if full and keys and await self.store.aget(full_key(keys)) is not None:
+            return 0
+        return sum([await self.store.aget(k) is None for k in keys])
+
+    async def synthesize(self, text: str, voice: str, language: str) -> Tuple[str, bytes]:
+        """Returns (blob key of the full audio, PCM bytes)."""
+        keys, tasks = self._start(text, voice, language)
+        key = full_key(keys)
+        cached = await self.store.aget(key)
+        if cached is not None:
+            for task in tasks:
+                task.cancel()
+            return key, cached
+        try:
+            pcm = b"".join(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        await self.store.aput(key, pcm)
+        return key, pcm
+
+    async def stream(self, text: str, voice: str, language: str) -> AsyncIterator[bytes]:
+        """WAV stream that starts as soon as the first sentence is ready.
+
+        The first chunk is awaited before returning, so provider errors still
+        surface as a normal HTTP error instead of a truncated stream."""
+        keys, tasks = self._start(text, voice, language)
+        try:
+            first = await tasks[0] if tasks else b""
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        async def body():
+            pcm_parts = [first]
+            try:
+                yield wav_header() + first
+                for task in tasks[1:]:
+                    part = await task
+                    pcm_parts.append(part)
+                    yield part
+                await self.store.aput(full_key(keys), b"".join(pcm_parts))
+            finally:
+                # Client went away: don't keep paying for the rest of the story
+                for task in tasks:
+                    task.cancel()
+
+        return body()
@@ -0,0 +1,129 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from dotenv import load_dotenv
+from . import metrics
+from .database import get_session_factory
+
+load_dotenv()
+
+# SQLite allows one writer at a time. Rather than letting requests race for the file lock
+# (and lose read-modify-write updates such as SRS reviews, whose SELECT runs outside the
+# write transaction), writes are funneled through one task per process. It runs queued jobs
+# back to back in one transaction and commits once per batch (group commit); each caller
+# is answered only after that commit. On Postgres the queue is off and jobs lock the rows
+# they modify instead (SELECT ... FOR UPDATE), which gives callers the same guarantees.
+# Story, review, playlist, artifact, quiz bank, reaper and review log writes all go through
+# it. Left out on purpose: the curriculum router (admin topic/concept edits and concept
+# progress, rare single-row writes), startup migrations, which run before the queue exists,
+# and the offline review_log.fit command, which runs outside the server.
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "1") != "0"
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "64"))
+WRITE_QUEUE_MAX_DELAY_MS = float(os.getenv("WRITE_QUEUE_MAX_DELAY_MS", "2"))  # Wait for more jobs before committing
+
+Job = Callable[[AsyncSession], Awaitable[Any]]
+
+write_batch_size = metrics.registry.register(metrics.Histogram(
+    "db_write_batch_size", "Jobs committed per write-queue transaction", [], buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+
+class DirectWriter:
+    """Runs each job in its own transaction (Postgres, or with the queue disabled)."""
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def submit(self, job: Job) -> Any:
+        async with self.session_factory() as session:
+            result = await job(session)
+            await session.commit()
+            return result
+
+class WriteQueue:
+    def __init__(self, session_factory: async_sessionmaker, max_batch: Optional[int] = None, max_delay: Optional[float] = None):
+        self.session_factory = session_factory
+        self.max_batch = max_batch or WRITE_QUEUE_MAX_BATCH
+        self.max_delay = WRITE_QUEUE_MAX_DELAY_MS / 1000 if max_delay is None else max_delay
+        self._queue: "asyncio.Queue[Tuple[Job, asyncio.Future]]" = asyncio.Queue()
+        self.batches = 0
+        self.jobs = 0
+
+    async def submit(self, job: Job) -> Any:
+        """Queues a write and waits until it is committed. The job gets a session shared with
+        the rest of its batch: it must not commit, and should read what it modifies itself."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Job, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _commit_batch(self, batch: List[Tuple[Job, asyncio.Future]]) -> bool:
+        results = []
+        async with self.session_factory() as session:
+            try:
+                for job, _ in batch:
+                    results.append(await job(session))
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                if len(batch) == 1:
+                    _, future = batch[0]
+                    if not future.done():
+                        future.set_exception(e)
+                    return True
+                return False
+        self.batches += 1
+        self.jobs += len(batch)
+        if metrics.METRICS_ENABLED:
+            write_batch_size.observe(len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        return True
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                if not await self._commit_batch(batch):
+                    # One job failed and took the batch's transaction with it: retry each on
+                    # its own so only the failing caller sees the error
+                    for item in batch:
+                        await self._commit_batch([item])
+            except Exception as e:
+                print(f"WriteQueue: batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def drain(self):
+        await self._queue.join()
+
+writer: Optional[WriteQueue] = None
+
+def writer_for(session_factory: async_sessionmaker):
+    """The running queue, or a DirectWriter for background jobs that bring their own sessions."""
+    if writer is not None:
+        return writer
+    return DirectWriter(session_factory)
+
+def get_writer(session_factory: async_sessionmaker = Depends(get_session_factory)):
+    return writer_for(session_factory)
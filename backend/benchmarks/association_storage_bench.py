@@ -0,0 +1,112 @@
+"""Associations storage benchmark.
+
+Seeds the same stories twice, once in the old layout (full keys, default JSON separators)
+and once in the compact one (app/association_codec.py), then compares the stored size of
+saved_stories.associations and the cost of a review write (load story, update one
+association's SRS state, commit):
+
+    python -m benchmarks.association_storage_bench --stories 500 --output benchmarks/results/associations.json
+
+Runs in-process against temporary SQLite files.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import List
+
+from benchmarks.load_test import git_commit, percentile
+
+def make_associations(story_index: int, count: int) -> List[dict]:
+    return [
+        {
+            "medicalTerm": f"Term {k} of story {story_index}",
+            "character": f"Character {k}",
+            "explanation": f"Character {k} stands for term {k}: it holds the clue that links the scene to the fact.",
+            "boundingBox": [10.0 * k + 0.5, 10.25, 10.0 * k + 8.75, 30.5],
+            "shape": "rect",
+            "srs": {"n": 3, "ef": 2.3600000000000003, "i": 16, "lastReview": 1700000000000 + k, "nextReview": 1701382400000 + k},
+        }
+        for k in range(count)
+    ]
+
+async def run_layout(compact: bool, db_path: str, args) -> dict:
+    from sqlalchemy import insert, text
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app import association_codec, crud, database, sql_models
+    from app.database import Base
+
+    association_codec.COMPACT_ASSOCIATIONS_ENABLED = compact
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", **({"json_serializer": database._json_dumps} if compact else {}))
+    async with engine.begin() as conn:
+        await conn.execute(text("PRAGMA journal_mode=WAL"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(sql_models.User), [{"id": "u", "username": "u", "email": "u@example.com", "hashed_password": "x"}])
+        await conn.execute(insert(sql_models.SavedStory), [
+            {"id": f"s{i}", "user_id": "u", "topic": f"Topic {i}", "facts": [f"Fact {i}"], "story": "Once upon a time... " * 20,
+             "associations": make_associations(i, args.associations), "visualPrompt": "p", "createdAt": i}
+            for i in range(args.stories)
+        ])
+    async with engine.connect() as conn:
+        avg_bytes = (await conn.execute(text("SELECT avg(length(CAST(associations AS BLOB))) FROM saved_stories"))).scalar()
+
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+    rng = random.Random(0)
+    samples = []
+    for r in range(args.reviews):
+        story_id, index = f"s{rng.randrange(args.stories)}", rng.randrange(args.associations)
+        started = time.perf_counter()
+        async with sessions() as session:
+            story = await crud.get_story(session, "u", story_id)
+            associations = list(story.associations)
+            associations[index] = dict(associations[index], srs={"n": r, "ef": 2.5, "i": 1, "lastReview": r, "nextReview": r + 1})
+            story.associations = associations
+            await session.commit()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM"))
+        db_bytes = (await conn.execute(text("PRAGMA page_count"))).scalar() * (await conn.execute(text("PRAGMA page_size"))).scalar()
+    await engine.dispose()
+    return {
+        "associations_avg_bytes": round(avg_bytes, 1),
+        "db_bytes": db_bytes,
+        "review_p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "review_p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+    }
+
+async def run(args) -> dict:
+    tmp_dir = tempfile.mkdtemp(prefix="medmnemonic-bench-")
+    report = {
+        "meta": {"commit": git_commit(), "timestamp": int(time.time()), "stories": args.stories,
+                 "associations": args.associations, "reviews": args.reviews},
+    }
+    for name, compact in (("legacy", False), ("compact", True)):
+        result = await run_layout(compact, os.path.join(tmp_dir, f"{name}.db"), args)
+        report[name] = result
+        print(f"{name:<8} associations={result['associations_avg_bytes']:>8.1f} B/row  db={result['db_bytes'] / 1024:>8.1f} KiB  "
+              f"review p50={result['review_p50_ms']:>7.3f}ms p95={result['review_p95_ms']:>7.3f}ms")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=500)
+    parser.add_argument("--associations", type=int, default=8, help="Associations per story")
+    parser.add_argument("--reviews", type=int, default=500)
+    parser.add_argument("--output", default="benchmarks/results/associations.json")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""End-to-end load test for the API.
+
+Seeds N users x M stories, drives the main endpoints concurrently with httpx.AsyncClient
+and reports p50/p95/p99 latency and throughput per endpoint. Results are written as JSON
+so runs can be compared between commits:
+
+    python -m benchmarks.load_test --users 20 --stories 10,100,1000 --output before.json
+    python -m benchmarks.load_test --users 20 --stories 10,100,1000 --compare before.json
+
+By default the app runs in-process against a fresh temporary SQLite file with the offline
+AI stub. Use --database-url for Postgres (tables are dropped and recreated: use a
+throwaway database) and --base-url to drive an already running server that uses that DB.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+SCENARIOS = ["list_stories", "get_story", "review", "list_playlists", "topics", "ai_mnemonic"]
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "throughput_rps": round(len(values) / wall, 2) if wall > 0 else 0.0,
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def make_story(user_index: int, story_index: int, image_kb: int) -> dict:
+    associations = [
+        {
+            "medicalTerm": f"Term {k}",
+            "character": f"Character {k}",
+            "explanation": f"Character {k} stands for term {k} of story {story_index}.",
+            "boundingBox": [10.0 * k, 10.0, 10.0 * k + 8, 30.0],
+            "shape": "rect",
+            "srs": None,
+        }
+        for k in range(5)
+    ]
+    return {
+        "id": f"bench-{user_index}-{story_index}",
+        "topic": f"Benchmark topic {story_index}",
+        "facts": [f"Fact {k} for story {story_index}" for k in range(5)],
+        "story": "Once upon a time in the hospital... " * 20,
+        "associations": associations,
+        "visualPrompt": "A cartoon ward full of characters " * 5,
+        "imageData": ("data:image/png;base64," + "A" * (image_kb * 1024)) if image_kb else None,
+        "createdAt": int(time.time() * 1000),
+    }
+
+async def seed(users: int, stories: int, image_kb: int) -> List[dict]:
+    from sqlalchemy import insert
+    from app.database import engine, Base
+    from app import sql_models
+    from app.auth import create_access_token, get_password_hash
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    # bcrypt is deliberately slow: hash once and share it between the seeded users
+    hashed = get_password_hash("benchmark")
+    seeded = []
+    async with engine.begin() as conn:
+        user_rows = [
+            {"id": f"bench-user-{u}", "username": f"bench_{u}", "email": f"bench_{u}@example.com",
+             "hashed_password": hashed, "is_admin": False}
+            for u in range(users)
+        ]
+        await conn.execute(insert(sql_models.User), user_rows)
+        for u in range(users):
+            rows = [dict(make_story(u, s, image_kb), user_id=f"bench-user-{u}") for s in range(stories)]
+            if rows:
+                await conn.execute(insert(sql_models.SavedStory), rows)
+            seeded.append({
+                "headers": {"Authorization": f"Bearer {create_access_token({'sub': f'bench_{u}'})}"},
+                "story_ids": [r["id"] for r in rows],
+            })
+    return seeded
+
+def build_request(scenario: str, user: dict, rng: random.Random):
+    story_id = rng.choice(user["story_ids"]) if user["story_ids"] else "missing"
+    if scenario == "list_stories":
+        return "GET", "/api/stories", None
+    if scenario == "get_story":
+        return "GET", f"/api/stories/{story_id}", None
+    if scenario == "review":
+        return "POST", f"/api/stories/{story_id}/review", {"associationIndex": rng.randrange(5), "quality": rng.randint(2, 5)}
+    if scenario == "list_playlists":
+        return "GET", "/api/playlists", None
+    if scenario == "topics":
+        return "GET", "/api/curriculum/topics", None
+    if scenario == "ai_mnemonic":
+        return "POST", "/api/ai/generate/mnemonic", {"text": f"Beta blockers side effects {rng.randrange(1000)}"}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+async def run_scenario(http, scenario: str, users: List[dict], requests: int, concurrency: int, seed_value: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+    rng = random.Random(seed_value)
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            user = rng.choice(users)
+            method, path, body = build_request(scenario, user, rng)
+            start = time.perf_counter()
+            try:
+                response = await http.request(method, path, json=body, headers=user["headers"])
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - wall_start)
+
+async def run(args) -> dict:
+    import httpx
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "database": os.environ["DATABASE_URL"].split(":")[0],
+            "base_url": args.base_url or "in-process",
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "image_kb": args.image_kb,
+            "python": platform.python_version(),
+        },
+        "runs": [],
+    }
+
+    for stories in args.stories:
+        users = await seed(args.users, stories, args.image_kb)
+        if args.base_url:
+            http = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+            lifespan = None
+        else:
+            from app.main import app
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+        results: Dict[str, dict] = {}
+        async with http:
+            for scenario in args.scenarios:
+                # Warm up connections, caches and lazy imports outside the measurement
+                await run_scenario(http, scenario, users, min(args.concurrency, args.requests), args.concurrency, 0)
+                results[scenario] = await run_scenario(http, scenario, users, args.requests, args.concurrency, args.seed)
+                r = results[scenario]
+                print(f"stories/user={stories:<6} {scenario:<15} p50={r['p50_ms']:>9.2f}ms p95={r['p95_ms']:>9.2f}ms "
+                      f"p99={r['p99_ms']:>9.2f}ms {r['throughput_rps']:>9.2f} req/s errors={r['errors']}")
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        report["runs"].append({"stories_per_user": stories, "results": results})
+    return report
+
+def compare(report: dict, baseline: dict):
+    print(f"\nComparison against {baseline['meta'].get('commit')} (negative latency delta = faster):")
+    old_runs = {r["stories_per_user"]: r["results"] for r in baseline["runs"]}
+    for run_ in report["runs"]:
+        old = old_runs.get(run_["stories_per_user"], {})
+        for scenario, new in run_["results"].items():
+            if scenario not in old:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                before, after = old[scenario][key], new[key]
+                pct = (after - before) / before * 100 if before else 0.0
+                deltas.append(f"{key}={after:.2f} ({pct:+.1f}%)")
+            print(f"stories/user={run_['stories_per_user']:<6} {scenario:<15} " + " ".join(deltas))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--stories", type=lambda s: [int(x) for x in s.split(",")], default=[10, 100],
+                        help="Stories per user; comma separated values run a library-size sweep")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--image-kb", type=int, default=64, help="Size of the fake imageData per story")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=SCENARIOS)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--base-url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--ai-latency-ms", type=float, default=0, help="Stub AI latency for in-process runs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    # The app reads its configuration at import time, so set it up before importing anything from it
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="medmnemonic-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ.setdefault("AI_PROVIDER", "stub")
+    os.environ.setdefault("AI_STUB_LATENCY_MS", str(args.ai_latency_ms))
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("SQL_ECHO", "0")
+
+    report = asyncio.run(run(args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    sys.exit(main())
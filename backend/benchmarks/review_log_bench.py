@@ -0,0 +1,111 @@
+"""Review log benchmark.
+
+Appends events to review_events one per transaction (as a naive logger would) and in batches
+(app/review_log.py), then replays the whole log and reports throughput and peak Python
+memory, which should stay flat as the log grows:
+
+    python -m benchmarks.review_log_bench --events 1000000 --output benchmarks/results/review_log.json
+
+Runs in-process against a temporary SQLite file.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+from benchmarks.load_test import git_commit
+
+def make_events(count: int, users: int, cards_per_user: int, seed: int = 0):
+    """Events in arrival order: cards interleave, each card's reviews are spaced out in time."""
+    rng = random.Random(seed)
+    clock = {}
+    for k in range(count):
+        user, card = rng.randrange(users), rng.randrange(cards_per_user)
+        previous = clock.get((user, card))
+        at = (previous or 0) + rng.randrange(1, 30) * 86400000
+        clock[(user, card)] = at
+        yield {"user_id": f"u{user}", "story_id": f"s{user}-{card // 8}", "associationIndex": card % 8,
+               "quality": rng.choice((1, 3, 4, 4, 4, 5)), "reviewedAt": at, "previousReview": previous,
+               "scheduler": "sm2", "interval": 1}
+
+async def run(args) -> dict:
+    from sqlalchemy import insert, text
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app import review_log, sql_models
+    from app.database import Base
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="medmnemonic-bench-"), "review_log.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.execute(text("PRAGMA journal_mode=WAL"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(sql_models.User), [
+            {"id": f"u{u}", "username": f"u{u}", "email": f"u{u}@example.com", "hashed_password": "x"} for u in range(args.users)
+        ])
+        association = {"medicalTerm": "Term", "character": "Character", "explanation": "Explanation", "srs": None}
+        await conn.execute(insert(sql_models.SavedStory), [
+            {"id": f"s{u}-{k}", "user_id": f"u{u}", "topic": "T", "facts": [], "story": "s", "associations": [association] * 8,
+             "visualPrompt": "p", "createdAt": 0}
+            for u in range(args.users) for k in range((args.cards + 7) // 8)
+        ])
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+    events = make_events(args.events, args.users, args.cards)
+    report = {"meta": {"commit": git_commit(), "timestamp": int(time.time()), "events": args.events,
+                       "users": args.users, "cards_per_user": args.cards, "batch": args.batch}}
+
+    single = [next(events) for _ in range(args.single)]
+    started = time.perf_counter()
+    for event in single:
+        await review_log.insert_events(sessions, [event])
+    report["single_insert_events_per_s"] = round(len(single) / (time.perf_counter() - started))
+
+    started, batch = time.perf_counter(), []
+    for event in events:
+        batch.append(event)
+        if len(batch) == args.batch:
+            await review_log.insert_events(sessions, batch)
+            batch = []
+    if batch:
+        await review_log.insert_events(sessions, batch)
+    report["batched_insert_events_per_s"] = round((args.events - len(single)) / (time.perf_counter() - started))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    stats = await review_log.replay(engine, "sm2", batch_size=args.replay_batch, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - started
+    report["replay"] = {**stats, "seconds": round(elapsed, 2), "events_per_s": round(stats["events"] / elapsed),
+                        "peak_python_mib": round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)}
+    tracemalloc.stop()
+    report["db_bytes"] = os.path.getsize(db_path)
+    await engine.dispose()
+
+    print(f"insert   one per transaction {report['single_insert_events_per_s']:>8}/s   batches of {args.batch} {report['batched_insert_events_per_s']:>8}/s")
+    print(f"replay   {stats['events']} events, {stats['cards']} cards, {stats['stories']} stories in {elapsed:.1f}s "
+          f"({report['replay']['events_per_s']}/s), peak Python memory {report['replay']['peak_python_mib']} MiB")
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=400, help="Cards per user")
+    parser.add_argument("--batch", type=int, default=500, help="Events per batched insert")
+    parser.add_argument("--single", type=int, default=2000, help="Events inserted one per transaction first")
+    parser.add_argument("--replay-batch", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Replay without writing stories back")
+    parser.add_argument("--output", default="benchmarks/results/review_log.json")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Story list serialization benchmark.
+
+Compares the response_model path (ORM objects -> Pydantic from_attributes validation ->
+JSON) with the trusted-row path (column rows -> orjson) for one library, then measures
+GET /api/stories end to end with and without compression:
+
+    python -m benchmarks.serialization_bench --stories 1000 --output benchmarks/results/serialization.json
+
+Runs in-process against a temporary SQLite file seeded by benchmarks.load_test.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+from benchmarks.load_test import git_commit, percentile
+
+async def timed(fn: Callable, repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {"p50_ms": round(percentile(samples, 0.5) * 1000, 2), "p95_ms": round(percentile(samples, 0.95) * 1000, 2)}
+
+async def run(args) -> dict:
+    import httpx
+    from pydantic import TypeAdapter
+    from app import crud, serialization
+    from app.database import AsyncSessionLocal
+    from app.main import app
+    from app.models import SavedStory
+    from benchmarks.load_test import seed
+
+    users = await seed(1, args.stories, args.image_kb)
+    user_id, headers = "bench-user-0", users[0]["headers"]
+    adapter = TypeAdapter(List[SavedStory])
+    report = {
+        "meta": {
+            "commit": git_commit(), "timestamp": int(time.time()), "stories": args.stories,
+            "image_kb": args.image_kb, "orjson": serialization.orjson is not None,
+        },
+        "encode": {}, "http": {},
+    }
+
+    # 1. Query + encode only, no HTTP
+    async def pydantic_path():
+        async with AsyncSessionLocal() as session:
+            rows = await crud.get_stories(session, user_id)
+            return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+    async def trusted_path():
+        async with AsyncSessionLocal() as session:
+            rows = await crud.get_story_rows(session, user_id)
+            return serialization.stories_response(rows).body
+
+    assert json.loads(await pydantic_path()) == json.loads(await trusted_path()), "paths disagree"
+    for name, fn in (("response_model", pydantic_path), ("trusted_rows", trusted_path)):
+        report["encode"][name] = await timed(fn, args.repeat)
+        print(f"encode  {name:<15} p50={report['encode'][name]['p50_ms']:>9.2f}ms p95={report['encode'][name]['p95_ms']:>9.2f}ms")
+
+    # 2. GET /api/stories end to end
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as http:
+        for fast in (False, True):
+            serialization.FAST_JSON_ENABLED = fast
+            for encoding in ("identity", "gzip", "br"):
+                wire = {}
+
+                async def fetch():
+                    # httpx decodes the body; the header still reports what went over the wire
+                    response = await http.get("/api/stories", headers={**headers, "Accept-Encoding": encoding})
+                    response.raise_for_status()
+                    wire["bytes"] = int(response.headers.get("content-length", len(response.content)))
+                    wire["encoding"] = response.headers.get("content-encoding", "identity")
+
+                await fetch()
+                name = f"{'trusted_rows' if fast else 'response_model'}/{encoding}"
+                result = await timed(fetch, args.repeat)
+                result.update(wire)
+                report["http"][name] = result
+                print(f"http    {name:<24} p50={result['p50_ms']:>9.2f}ms p95={result['p95_ms']:>9.2f}ms "
+                      f"{result['bytes'] / 1024:>9.1f} KiB ({result['encoding']})")
+    await lifespan.__aexit__(None, None, None)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=1000)
+    parser.add_argument("--image-kb", type=int, default=0, help="Size of the fake imageData per story")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="benchmarks/results/serialization.json")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp(prefix="medmnemonic-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ.setdefault("AI_PROVIDER", "stub")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("REAPER_ENABLED", "0")
+
+    report = asyncio.run(run(args))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
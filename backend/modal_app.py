@@ -18,13 +18,18 @@ image = (
         "google-genai>=1.56.0",
         "greenlet>=3.3.0",
         "httpx>=0.28.1",
+        "opentelemetry-api>=1.27.0",
+        "opentelemetry-sdk>=1.27.0",
+        "orjson>=3.9.0",
+        "brotli>=1.1.0",
         "passlib[bcrypt]>=1.7.4",
+        "pillow>=10.0.0",
         "pydantic>=2.12.5",
         "python-dotenv>=1.2.1",
         "python-jose[cryptography]>=3.5.0",
         "python-multipart>=0.0.21"
     )
-    .env({"DATABASE_URL": "sqlite+aiosqlite:////data/medmnemonic.db"})
+    .env({"DATABASE_URL": "sqlite+aiosqlite:////data/medmnemonic.db", "BLOB_STORE_DIR": "/data/blobs"})
     .add_local_dir("app", remote_path="/root/app")
 )
 
@@ -36,8 +41,13 @@ volume = modal.Volume.from_name("medmnemonic-data", create_if_missing=True)
     # Mount the volume to /data
     volumes={"/data": volume},
     # Load secrets from local .env file (e.g. GEMINI_API_KEY)
-    secrets=[modal.Secret.from_dotenv()]
+    secrets=[modal.Secret.from_dotenv()],
+    # SQLite on a Volume needs a single writer: one container funnels all writes through
+    # app/write_queue.py. Only raise this with DATABASE_URL pointing at Postgres.
+    max_containers=int(os.getenv("MODAL_MAX_CONTAINERS", "1")),
 )
+# One container serves many requests at once (async app); scale up rather than out
+@modal.concurrent(max_inputs=int(os.getenv("MODAL_MAX_INPUTS", "100")))
 @modal.asgi_app()
 def fastapi_app():
     from app.main import app as web_app
@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+
+# Point the app at a throwaway SQLite file before it is imported (the engine is created at
+# import time), so migrations and test writes never touch the checked-in medmnemonic.db
+_db_dir = tempfile.mkdtemp(prefix="medmnemonic-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.blob_store import LocalBlobStore
+from app import bbox, reaper, tts
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    # Create the schema and apply startup migrations (new columns, search index) once, as the
+    # server would, before any module-level TestClient is used.
+    with TestClient(app):
+        pass
+    yield
+    shutil.rmtree(_db_dir, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def blob_store(tmp_path, monkeypatch):
+    # Cached audio and boxes go to a fresh store per test instead of ./blobs
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(tts, "blob_store", store)
+    monkeypatch.setattr(bbox, "blob_store", store)
+    monkeypatch.setattr(reaper, "blob_store", store)
+    return store
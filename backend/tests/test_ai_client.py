@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from google.genai import errors as genai_errors
+from app.ai_client import ResilientModels, FakeModels, FakeResponse, CircuitBreaker
+
+def server_error(code=503):
+    return genai_errors.ServerError(code, {"error": {"message": "unavailable", "status": "UNAVAILABLE"}})
+
+def make_models(outcomes, **kwargs):
+    options = dict(timeout=2.0, max_attempts=3, base_delay=0.0, max_delay=0.0, breaker_threshold=2, breaker_reset=60)
+    options.update(kwargs)
+    fake = FakeModels(outcomes)
+    return fake, ResilientModels(fake, **options)
+
+async def test_retries_transient_errors_then_succeeds():
+    ok = FakeResponse(text='{"ok": true}')
+    fake, models = make_models([server_error(), server_error(429), ok])
+    response = await models.generate_content(model="m", contents="hi")
+    assert response is ok
+    assert len(fake.calls) == 3
+    assert models.breaker("m").state == "closed"
+
+async def test_non_retryable_error_is_not_retried():
+    fake, models = make_models([genai_errors.ClientError(400, {"error": {"message": "bad"}})])
+    with pytest.raises(HTTPException) as exc:
+        await models.generate_content(model="m", contents="hi")
+    assert exc.value.status_code == 502
+    assert exc.value.detail == "AI provider error"  # The provider's own message isn't sent to clients
+    assert len(fake.calls) == 1
+
+async def test_deadline_returns_504():
+    fake, models = make_models(["hang"], timeout=0.05)
+    with pytest.raises(HTTPException) as exc:
+        await models.generate_content(model="m", contents="hi")
+    assert exc.value.status_code == 504
+
+async def test_breaker_opens_and_fails_fast():
+    fake, models = make_models([server_error()] * 2, max_attempts=1)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await models.generate_content(model="m", contents="hi")
+        assert exc.value.status_code == 503
+
+    with pytest.raises(HTTPException) as exc:
+        await models.generate_content(model="m", contents="hi")
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+    assert len(fake.calls) == 2  # third call never reached the provider
+
+    # Other models have their own breaker
+    await models.generate_content(model="other", contents="hi")
+
+def test_breaker_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 11
+    assert breaker.allow()       # single probe
+    assert not breaker.allow()   # concurrent callers still fail fast
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+async def test_cancelled_half_open_probe_releases_the_breaker():
+    fake, models = make_models(["hang"], breaker_threshold=1, breaker_reset=10)
+    breaker = models.breaker("m")
+    now = [0.0]
+    breaker.clock = lambda: now[0]
+    breaker.record_failure()
+    now[0] = 11
+
+    probe = asyncio.create_task(models.generate_content(model="m", contents="hi"))
+    await asyncio.sleep(0.01)
+    assert breaker.probe_in_flight
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert not breaker.probe_in_flight
+    assert breaker.allow()  # the next caller gets to probe
@@ -0,0 +1,61 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app.ai_routing import AIRouter, ROUTES, AI_SLO_MIN_SAMPLES
+from app import rate_limit, prompt as prompts
+
+client = TestClient(app)
+
+def test_route_headers_and_fast_mode(monkeypatch):
+    provider = StubProvider()
+    monkeypatch.setattr(ai, "client", ResilientClient(provider))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(ai.ai_routing, "router", AIRouter(ROUTES))
+
+    res = client.post("/api/ai/generate/mnemonic", json={"text": "ACE inhibitors cause cough"})
+    assert res.status_code == 200
+    assert res.headers["X-AI-Route"] == "mnemonic:default"
+    assert res.headers["X-AI-Model"] == prompts.MODEL_FLASH
+    assert res.headers["X-AI-Thinking"] == "high"
+
+    res = client.post("/api/ai/generate/mnemonic", json={"text": "ACE inhibitors cause cough"}, headers={"X-AI-Mode": "fast"})
+    assert res.headers["X-AI-Route"] == "mnemonic:fast"
+    assert res.headers["X-AI-Thinking"] == "low"
+
+    # Cheap tasks no longer use high thinking by default
+    res = client.post("/api/ai/generate/visual-prompt", json={"topic": "t", "story": "s", "associations": []})
+    assert res.headers["X-AI-Thinking"] == "low"
+
+def test_slo_breach_falls_back_then_recovers():
+    now = [0.0]
+    router = AIRouter(ROUTES, clock=lambda: now[0])
+    slo = ROUTES["quiz"].slo_seconds
+
+    for _ in range(AI_SLO_MIN_SAMPLES):
+        route, name = router.choose("quiz")
+        assert name == "default"
+        router.record("quiz", name, slo + 5)
+
+    route, name = router.choose("quiz")
+    assert name == "fallback"
+    assert route.model == prompts.MODEL_FLASH_LITE
+    router.record("quiz", name, slo + 5)  # fallback latency doesn't extend the degradation
+
+    now[0] += 10_000
+    assert router.choose("quiz")[1] == "default"
+
+def test_budget_is_charged_to_the_routed_model(monkeypatch):
+    monkeypatch.setattr(ai, "client", ResilientClient(StubProvider()))
+    router = AIRouter(ROUTES)
+    router.degraded_until["visual_prompt"] = float("inf")
+    monkeypatch.setattr(ai.ai_routing, "router", router)
+    rate_limit.limiter.backend.reset()
+
+    res = client.post("/api/ai/generate/visual-prompt", json={"topic": "t", "story": "s", "associations": []})
+    assert res.headers["X-AI-Model"] == prompts.MODEL_FLASH_LITE
+    usage = {u["model"]: u for u in client.get("/api/ai/budget").json()}
+    assert usage[prompts.MODEL_FLASH_LITE]["user_remaining"] == rate_limit.MODEL_BUDGETS[prompts.MODEL_FLASH_LITE].per_user.capacity - 1
+    assert usage[prompts.MODEL_VISUAL_PROMPT]["user_remaining"] == rate_limit.MODEL_BUDGETS[prompts.MODEL_VISUAL_PROMPT].per_user.capacity
+    rate_limit.limiter.backend.reset()
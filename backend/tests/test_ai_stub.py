@@ -0,0 +1,61 @@
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import AIProvider, StubProvider
+from app.models import MnemonicResponse, QuizQuestion
+from app import rate_limit
+
+client = TestClient(app)
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    monkeypatch.setattr(ai, "client", ResilientClient(StubProvider(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+def test_stub_endpoints_return_schema_valid_data(stub_client):
+    res = client.post("/api/ai/generate/mnemonic", json={"text": "Beta blockers cause bradycardia and fatigue"})
+    assert res.status_code == 200
+    mnemonic = MnemonicResponse(**res.json())
+    assert mnemonic.associations
+
+    # Deterministic: same input, same output
+    again = client.post("/api/ai/generate/mnemonic", json={"text": "Beta blockers cause bradycardia and fatigue"})
+    assert again.json() == res.json()
+
+    res = client.post("/api/ai/generate/quiz", json={"mnemonicData": mnemonic.model_dump()})
+    assert res.status_code == 200
+    questions = [QuizQuestion(**q) for q in res.json()]
+    assert len(questions) == len(mnemonic.associations)
+    assert all(0 <= q.correctOptionIndex < len(q.options) for q in questions)
+
+    res = client.post("/api/ai/generate/image", json={"visualPrompt": mnemonic.visualPrompt})
+    assert res.status_code == 200
+    png = base64.b64decode(res.json()["imageData"].split("base64,")[1])
+    assert png.startswith(b"\x89PNG")
+
+    res = client.post("/api/ai/generate/speech", json={"text": mnemonic.story})
+    assert res.status_code == 200
+    assert len(base64.b64decode(res.json()["audioData"])) > 0
+
+    res = client.post("/api/ai/analyze/bounding-boxes", json={
+        "imageBase64": res.json()["audioData"],
+        "associations": [a.model_dump() for a in mnemonic.associations],
+    })
+    assert res.status_code == 200
+    assert all(a["boundingBox"] for a in res.json())
+
+async def test_stub_error_injection():
+    provider = StubProvider(error_rate=1.0)
+    with pytest.raises(Exception) as exc:
+        await provider.generate_content(model="m", contents="hi")
+    assert getattr(exc.value, "code", None) == 503
+
+def test_provider_must_implement_generate_content():
+    class Incomplete(AIProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
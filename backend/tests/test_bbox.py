@@ -0,0 +1,83 @@
+import io
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import bbox, rate_limit
+
+client = TestClient(app)
+
+class CountingStub(StubProvider):
+    calls = 0
+    images = []
+
+    async def generate_content(self, **kwargs):
+        CountingStub.calls += 1
+        CountingStub.images.append(kwargs["contents"][0].parts[0].inline_data)
+        return await super().generate_content(**kwargs)
+
+@pytest.fixture
+def stub_bbox(monkeypatch):
+    CountingStub.calls, CountingStub.images = 0, []
+    monkeypatch.setattr(ai, "client", ResilientClient(CountingStub(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+def _png(width, height):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+ASSOCIATIONS = [
+    {"medicalTerm": "Bradycardia", "character": "The Slow Clock", "explanation": "Slow heart rate"},
+    {"medicalTerm": "Fatigue", "character": "Sleepy Betty", "explanation": "Tiredness"},
+]
+
+def test_match_is_one_to_one_and_normalized():
+    boxes = [
+        {"character": "slow clock", "box_2d": [1, 1, 2, 2]},
+        {"character": "Clock", "box_2d": [3, 3, 4, 4]},
+        {"character": "Sleepy BETTY!", "box_2d": [5, 5, 6, 6]},
+    ]
+    # "Clock" would win a first-substring scan for both clock characters; assignment gives each its own box
+    matches = bbox.match_boxes(["The Slow Clock", "Big Clock", "Sleepy Betty", "Nobody"], boxes)
+    assert matches == [[1, 1, 2, 2], [3, 3, 4, 4], [5, 5, 6, 6], None]
+
+def test_match_ignores_empty_boxes_and_accents():
+    boxes = [{"character": "Corazón Lento", "box_2d": [0, 0, 0, 0]}, {"character": "corazon lento", "box_2d": [1, 2, 3, 4]}]
+    assert bbox.match_boxes(["El Corazón Lento"], boxes) == [[1, 2, 3, 4]]
+
+def test_hungarian_finds_minimum_cost():
+    cost = [[4, 1, 3], [2, 0, 5], [3, 2, 2]]
+    assignment = bbox.hungarian(cost)
+    assert sorted(assignment) == [0, 1, 2]
+    assert sum(cost[i][j] for i, j in enumerate(assignment)) == 5
+
+def test_downscale_large_images_only():
+    small = _png(200, 100)
+    assert bbox.downscale(small, 1024) == (small, "image/png")
+    data, mime = bbox.downscale(_png(4096, 2048), 1024)
+    assert mime == "image/jpeg"
+    assert Image.open(io.BytesIO(data)).size == (1024, 512)
+
+def test_analysis_is_cached_by_image_and_association_set(stub_bbox):
+    image = base64.b64encode(_png(3000, 2000)).decode()
+    res = client.post("/api/ai/analyze/bounding-boxes", json={"imageBase64": "data:image/png;base64," + image, "associations": ASSOCIATIONS})
+    assert res.status_code == 200
+    first = res.json()
+    assert all(a["boundingBox"] and a["shape"] == "rect" for a in first)
+    assert CountingStub.calls == 1
+    assert CountingStub.images[0].mime_type == "image/jpeg"
+    assert max(Image.open(io.BytesIO(CountingStub.images[0].data)).size) <= bbox.BBOX_MAX_IMAGE_PX
+
+    # Same image and association set (in any order) is served from the cache
+    res = client.post("/api/ai/analyze/bounding-boxes", json={"imageBase64": image, "associations": list(reversed(ASSOCIATIONS))})
+    assert CountingStub.calls == 1
+    assert list(reversed(res.json())) == first
+
+    # A different association set is a new analysis
+    client.post("/api/ai/analyze/bounding-boxes", json={"imageBase64": image, "associations": ASSOCIATIONS[:1]})
+    assert CountingStub.calls == 2
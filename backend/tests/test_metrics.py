@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app import metrics
+
+client = TestClient(app)
+
+def test_metrics_endpoint_reports_routes_and_sql(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    client.get("/api/curriculum/topics")
+    client.get("/api/stories/some-id")  # 401, but still timed under its template
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/curriculum/topics",status="200"}' in body
+    assert 'route="/api/stories/{id}",status="401"' in body
+    assert 'db_query_duration_seconds_count{statement="SELECT"}' in body
+
+def test_metrics_endpoint_needs_the_configured_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+def test_record_ai_call_tracks_tokens_and_failures():
+    class Usage:
+        prompt_token_count = 120
+        candidates_token_count = 40
+        thoughts_token_count = 300
+
+    class Response:
+        usage_metadata = Usage()
+
+    metrics.record_ai_call("test-model", 1.5, "ok", Response())
+    metrics.record_ai_call("test-model", 0.0, "circuit_open")
+
+    body = metrics.registry.render()
+    assert 'ai_tokens_total{model="test-model",kind="thinking"} 300.0' in body
+    assert 'ai_failures_total{model="test-model",reason="circuit_open"} 1.0' in body
+    assert 'ai_call_duration_seconds_bucket{model="test-model",outcome="ok",le="2.5"} 1' in body
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import prompt as prompts
+from app.prompt_templates import TemplateRegistry, PromptTooLarge, estimate_tokens, truncate_to_tokens
+
+client = TestClient(app)
+
+def test_estimate_tokens_is_roughly_four_chars_per_token():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Beta blockers cause bradycardia.") == 1 + 2 + 2 + 3 + 1
+    prose = "The patient presented with chest pain radiating to the left arm. " * 20
+    assert len(prose) / 6 < estimate_tokens(prose) < len(prose) / 3
+
+def test_truncate_to_tokens_cuts_on_word_boundary():
+    text = "alpha beta gamma delta " * 50
+    cut = truncate_to_tokens(text, 20)
+    assert estimate_tokens(cut) <= 20
+    assert text.startswith(cut) and not cut.endswith(" ")
+    assert truncate_to_tokens("short", 20) == "short"
+
+def test_templates_are_dedented_and_versioned():
+    registry = TemplateRegistry()
+    template = registry.register("greeting", 1, """
+        Hello {name}.
+          Indented line
+        """)
+    assert template.render(name="Ada").text == "Hello Ada.\n  Indented line"
+    v2 = TemplateRegistry().register("greeting", 2, template.source)
+    assert v2.key != template.key and v2.key.startswith("greeting@v2:")
+    with pytest.raises(ValueError):
+        registry.register("greeting", 3, "dup")
+
+def test_oversize_input_is_truncated_or_rejected():
+    registry = TemplateRegistry()
+    registry.register("notes", 1, "Summarize: {text}", max_tokens=50, truncate="text")
+    registry.register("strict", 1, "Boxes for: {targets}", max_tokens=50)
+
+    rendered = registry.render("notes", text="word " * 500)
+    assert rendered.tokens <= 50
+    with pytest.raises(PromptTooLarge) as exc:
+        registry.render("strict", targets="word " * 500)
+    assert exc.value.status_code == 413
+
+    stats = {s["name"]: s for s in registry.describe()}
+    assert stats["notes"]["truncated"] == 1 and stats["notes"]["maxTokensSeen"] <= 50
+    assert stats["strict"]["rejected"] == 1
+
+def test_prompt_functions_render_through_registry():
+    before = prompts.TEMPLATES["quiz"].stats.calls
+    text = prompts.get_quiz_prompt("", "es")
+    assert "SPANISH" in text and text == text.strip()
+    assert prompts.TEMPLATES["quiz"].stats.calls == before + 1
+
+    res = client.get("/api/ai/prompts")
+    assert res.status_code == 200
+    names = {t["name"]: t for t in res.json()}
+    assert {"mnemonic", "quiz", "speech", "bbox"} <= set(names)
+    assert names["quiz"]["calls"] >= 1
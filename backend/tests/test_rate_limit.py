@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app import rate_limit, prompt as prompts
+from app.rate_limit import Budget, ModelBudget, RateLimiter, InMemoryBackend, SQLiteBackend
+from fastapi import HTTPException
+import pytest
+
+client = TestClient(app)
+
+def make_limiter(backend):
+    budgets = {"test-model": ModelBudget(Budget.per(2, 60), Budget.per(3, 60))}
+    return RateLimiter(backend, budgets)
+
+@pytest.mark.parametrize("backend_factory", [
+    lambda tmp_path: InMemoryBackend(),
+    lambda tmp_path: SQLiteBackend(str(tmp_path / "limits.db")),
+])
+def test_user_and_global_buckets(tmp_path, backend_factory):
+    limiter = make_limiter(backend_factory(tmp_path))
+
+    limiter.check("test-model", "alice")
+    limiter.check("test-model", "alice")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("test-model", "alice")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+    # bob gets a fresh user bucket, but the global bucket only has one token left
+    limiter.check("test-model", "bob")
+    with pytest.raises(HTTPException):
+        limiter.check("test-model", "bob")
+
+    usage = {u["model"]: u for u in limiter.usage("bob")}
+    assert usage["test-model"]["user_remaining"] == pytest.approx(1, abs=0.1)
+    assert usage["test-model"]["global_remaining"] == pytest.approx(0, abs=0.1)
+
+def test_cost_above_capacity_is_413_not_429():
+    limiter = make_limiter(InMemoryBackend())
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("test-model", "alice", cost=5)
+    assert exc.value.status_code == 413
+    # Nothing was taken from the buckets
+    limiter.check("test-model", "alice", cost=2)
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first = make_limiter(SQLiteBackend(path))
+    second = make_limiter(SQLiteBackend(path))
+    first.check("test-model", "alice")
+    first.check("test-model", "alice")
+    with pytest.raises(HTTPException):
+        second.check("test-model", "alice")
+
+def test_endpoint_returns_429_with_retry_after():
+    rate_limit.limiter.backend.reset()
+    identity = "ip:testclient"
+    budget = rate_limit.MODEL_BUDGETS[prompts.MODEL_IMAGE_GEN].per_user
+    for _ in range(int(budget.capacity)):
+        rate_limit.limiter.check(prompts.MODEL_IMAGE_GEN, identity)
+
+    response = client.post("/api/ai/generate/image", json={"visualPrompt": "a cat"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+    response = client.get("/api/ai/budget")
+    assert response.status_code == 200
+    usage = {u["model"]: u for u in response.json()}
+    assert usage[prompts.MODEL_IMAGE_GEN]["user_remaining"] < 1
+    rate_limit.limiter.backend.reset()
+
+def test_anonymous_identity_ignores_client_supplied_forwarded_hops(monkeypatch):
+    from starlette.requests import Request
+
+    def identity(forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        request = Request({"type": "http", "headers": headers, "client": ("10.0.0.9", 1234)})
+        return rate_limit.client_identity(request, None)
+
+    # The proxy appends the real peer; spoofed hops before it don't change the bucket
+    assert identity("1.1.1.1, 203.0.113.7") == identity("2.2.2.2, 203.0.113.7") == "ip:203.0.113.7"
+    assert identity() == "ip:10.0.0.9"
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 2)
+    assert identity("1.1.1.1, 203.0.113.7, 10.1.1.1") == "ip:203.0.113.7"
+    assert identity("203.0.113.7") == "ip:10.0.0.9"  # Fewer hops than proxies: the header is forged
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 0)
+    assert identity("1.1.1.1") == "ip:10.0.0.9"
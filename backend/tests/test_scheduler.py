@@ -0,0 +1,97 @@
+import math
+import random
+import pytest
+from app import scheduler
+
+DAY = scheduler.DAY_MS
+
+def simulate(weights, cards=200, reviews=8, seed=0):
+    """Review histories of a student whose memory follows FSRS with `weights`."""
+    rng, model, histories = random.Random(seed), scheduler.FSRSScheduler(weights), []
+    for _ in range(cards):
+        s, d, history = model.w[2], model.init_difficulty(3), [(0, 3)]
+        for _ in range(reviews):
+            elapsed = max(1, round(s * rng.uniform(0.5, 2)))
+            r = scheduler.retrievability(elapsed, s)
+            g = 3 if rng.random() < r else 1
+            history.append((elapsed, g))
+            s, d = model.next_stability(d, s, r, g), model.next_difficulty(d, g)
+        histories.append(history)
+    return histories
+
+def test_sm2_matches_the_original_schedule():
+    sm2 = scheduler.get_scheduler("sm2")
+    srs = sm2.review(None, 4, 0)
+    assert (srs["n"], srs["i"], srs["nextReview"]) == (1, 1, DAY)
+    srs = sm2.review(srs, 5, DAY)
+    assert (srs["n"], srs["i"]) == (2, 6)
+    srs = sm2.review(srs, 4, 7 * DAY)
+    assert (srs["n"], srs["i"]) == (3, round(6 * srs["ef"]))
+    lapsed = sm2.review(srs, 1, 30 * DAY)
+    assert (lapsed["n"], lapsed["i"]) == (0, 1) and lapsed["ef"] >= 1.3
+    assert "s" not in lapsed
+
+def test_fsrs_spaces_good_answers_and_shortens_after_a_lapse():
+    fsrs = scheduler.get_scheduler("fsrs")
+    srs, now, intervals = None, 0, []
+    for quality in (4, 4, 4):
+        srs = fsrs.review(srs, quality, now)
+        intervals.append(srs["i"])
+        now = srs["nextReview"]
+    assert intervals == sorted(intervals) and intervals[-1] > 30
+    lapsed = fsrs.review(srs, 1, now)
+    assert lapsed["n"] == 0 and lapsed["i"] < intervals[-1] and lapsed["s"] < srs["s"]
+    # Higher target retention means shorter intervals
+    strict = scheduler.FSRSScheduler(desired_retention=0.97).review(srs, 4, now)
+    assert strict["i"] < fsrs.review(srs, 4, now)["i"]
+
+def test_fsrs_takes_over_sm2_cards():
+    srs = scheduler.get_scheduler("sm2").review(None, 4, 0)
+    srs = scheduler.get_scheduler("fsrs").review(srs, 4, srs["nextReview"])
+    assert srs["n"] == 2 and srs["s"] > 1 and 1 <= srs["d"] <= 10
+
+def test_fsrs_difficulty_reverts_toward_a_good_first_answer():
+    # Reference values with the default weights: D0(good) = w4 = 5.1618, w6 = 0.8975, w7 = 0.031
+    fsrs = scheduler.FSRSScheduler()
+    assert fsrs.next_difficulty(5.1618, 3) == pytest.approx(5.1618)  # "good" leaves the mean unchanged
+    assert fsrs.next_difficulty(5.1618, 1) == pytest.approx(0.031 * 5.1618 + 0.969 * (5.1618 + 2 * 0.8975))
+    assert fsrs.next_difficulty(5.1618, 4) == pytest.approx(0.031 * 5.1618 + 0.969 * (5.1618 - 0.8975))
+    srs = fsrs.review(fsrs.review(None, 4, 0), 1, 4 * DAY)
+    assert (srs["s"], srs["d"]) == (1.4332, 6.9012)
+
+def test_fit_loss_steps_cards_like_the_scheduler():
+    pytest.importorskip("numpy")
+    import numpy as np
+    fsrs, history = scheduler.FSRSScheduler(), [(0, 3), (4, 1), (1, 3), (3, 4), (9, 2)]
+    s, d, expected = fsrs.w[2], fsrs.init_difficulty(3), 0.0
+    for elapsed, g in history[1:]:
+        r = scheduler.retrievability(elapsed, s)
+        expected -= math.log(r if g > 1 else 1 - r)
+        s, d = fsrs.next_stability(d, s, r, g), fsrs.next_difficulty(d, g)
+    loss = scheduler._log_loss(np.array(fsrs.w), *scheduler._pad([history]))
+    assert loss == pytest.approx(expected / (len(history) - 1))
+
+def test_scheduler_must_implement_review():
+    class Incomplete(scheduler.Scheduler):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_unknown_scheduler():
+    with pytest.raises(ValueError):
+        scheduler.get_scheduler("leitner")
+
+def test_fit_weights_improves_on_the_defaults():
+    pytest.importorskip("numpy")
+    true = list(scheduler.DEFAULT_WEIGHTS)
+    true[8] = 2.0  # This student's recall grows faster than the population default
+    result = scheduler.fit_weights(simulate(true), iterations=60)
+    assert result.reviews == 200 * 8
+    assert result.loss < result.default_loss
+    assert result.weights[8] > scheduler.DEFAULT_WEIGHTS[8]
+    assert all(low <= w <= high for w, (low, high) in zip(result.weights, scheduler.WEIGHT_BOUNDS))
+
+def test_fit_weights_without_history_keeps_the_defaults():
+    pytest.importorskip("numpy")
+    assert scheduler.fit_weights([]).weights == scheduler.DEFAULT_WEIGHTS
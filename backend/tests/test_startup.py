@@ -0,0 +1,45 @@
+import os
+import sys
+import subprocess
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import startup
+
+def test_importing_the_app_does_not_load_the_gemini_sdk():
+    # Fresh interpreter: other tests in this process have already imported google.genai
+    code = "import sys, app.main; assert 'google.genai' not in sys.modules, 'google.genai imported at startup'"
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "x")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_importing_the_app_does_not_load_numpy():
+    # Only offline FSRS fitting (scheduler.fit_weights) uses it
+    code = "import sys, app.main; assert 'numpy' not in sys.modules, 'numpy imported at startup'"
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "x")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+async def test_schema_version_gates_migrations(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}")
+    async with engine.begin() as conn:
+        assert await startup.get_schema_version(conn) == 0
+        assert not await startup.schema_is_current(conn)
+        await startup.set_schema_version(conn)
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA user_version"))).scalar() == startup.SCHEMA_VERSION
+        assert await startup.schema_is_current(conn)
+        monkeypatch.setattr(startup, "FORCE_MIGRATIONS", True)
+        assert not await startup.schema_is_current(conn)
+    await engine.dispose()
+
+def test_startup_timer_reports_phases():
+    timer = startup.StartupTimer()
+    timer.record("import", 0.25)
+    with timer.phase("schema"):
+        timer.note("schema", "v1 current, skipped")
+    line = timer.report()
+    assert "import 250ms" in line
+    assert "(v1 current, skipped)" in line
+    assert list(timer.phases) == ["import", "schema"]
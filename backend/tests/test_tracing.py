@@ -0,0 +1,44 @@
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from app.main import app
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import rate_limit, tracing
+
+@pytest.fixture
+def exporter(monkeypatch):
+    # A local provider handed to the app's tracer: the global provider can only be set once per process
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "tracer", provider.get_tracer("medmnemonic"))
+    yield exporter
+    provider.shutdown()
+
+def test_request_span_wraps_gemini_and_parse_spans(monkeypatch, exporter):
+    monkeypatch.setattr(ai, "client", ResilientClient(StubProvider()))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+    client = TestClient(tracing.TracingMiddleware(app))
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    res = client.post("/api/ai/generate/mnemonic", json={"text": "Statins cause myopathy"}, headers={"traceparent": traceparent})
+    assert res.status_code == 200
+
+    # Later spans win: the middleware's SERVER span is the outermost one and finishes last
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+
+    request_span = spans["POST /api/ai/generate/mnemonic"]
+    gemini_span = spans["gemini.generate_content"]
+    parse_span = spans["mnemonic.parse"]
+
+    for s in (request_span, gemini_span, parse_span):
+        assert format(s.context.trace_id, "032x") == "0af7651916cd43dd8448eb211c80319c"
+    assert request_span.start_time <= gemini_span.start_time <= parse_span.start_time <= request_span.end_time
+    assert gemini_span.attributes["gen_ai.request.model"]
+    assert gemini_span.attributes["gen_ai.request.thinking_level"]
+    assert gemini_span.attributes["medmnemonic.prompt_chars"] > 0
+    assert request_span.attributes["http.response.status_code"] == 200
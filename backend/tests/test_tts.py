@@ -0,0 +1,108 @@
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import rate_limit, tts
+
+client = TestClient(app)
+
+STORY = (
+    "Captain Beta walks slowly through the hospital. His heart beats like a lazy drum. "
+    "He yawns at every door, too tired to climb the stairs! Nurses whisper that he blocks every alarm."
+)
+
+class CountingStub(StubProvider):
+    calls = 0
+
+    async def generate_content(self, **kwargs):
+        CountingStub.calls += 1
+        return await super().generate_content(**kwargs)
+
+@pytest.fixture
+def stub_tts(monkeypatch):
+    CountingStub.calls = 0
+    monkeypatch.setattr(ai, "client", ResilientClient(CountingStub(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(tts, "TTS_MAX_CHUNK_CHARS", 80)
+
+def test_split_sentences_merges_short_and_splits_long():
+    chunks = tts.split_sentences("One. Two. " + "word " * 50, max_chars=40)
+    assert chunks[0] == "One. Two."
+    assert all(len(c) <= 40 for c in chunks)
+    assert " ".join(chunks[1:]).split() == ["word"] * 50
+
+def test_speech_is_cached_per_chunk(stub_tts):
+    res = client.post("/api/ai/generate/speech", json={"text": STORY})
+    assert res.status_code == 200
+    body = res.json()
+    chunks = tts.split_sentences(STORY)
+    assert len(chunks) > 1
+    assert CountingStub.calls == len(chunks)
+
+    # Replay is free and returns identical audio
+    again = client.post("/api/ai/generate/speech", json={"text": STORY})
+    assert again.json() == body
+    assert CountingStub.calls == len(chunks)
+
+    # A different voice is a different cache entry
+    client.post("/api/ai/generate/speech", json={"text": STORY, "voice": "Kore"})
+    assert CountingStub.calls == 2 * len(chunks)
+
+    # Editing one sentence only re-synthesizes that sentence's chunk
+    edited = STORY.replace("lazy drum", "sleepy drum")
+    client.post("/api/ai/generate/speech", json={"text": edited})
+    assert CountingStub.calls == 2 * len(chunks) + 1
+
+    cached = client.get(f"/api/ai/speech/{body['audioKey']}")
+    assert cached.status_code == 200
+    assert cached.content.startswith(b"RIFF")
+    assert cached.content[44:] == base64.b64decode(body["audioData"])
+    assert "immutable" in cached.headers["cache-control"]
+
+def test_speech_stream_is_wav_of_all_chunks(stub_tts):
+    res = client.post("/api/ai/generate/speech/stream", json={"text": STORY})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "audio/wav"
+    assert res.content.startswith(b"RIFF") and res.content[8:12] == b"WAVE"
+
+    full = client.post("/api/ai/generate/speech", json={"text": STORY}).json()
+    assert res.content[44:] == base64.b64decode(full["audioData"])
+    # The stream already filled the cache
+    assert CountingStub.calls == len(tts.split_sentences(STORY))
+
+def test_unknown_audio_key_is_404(stub_tts):
+    assert client.get("/api/ai/speech/tts/" + "0" * 64).status_code == 404
+    assert client.get("/api/ai/speech/quiz/" + "0" * 64).status_code == 404
+
+def test_speech_budget_is_charged_per_uncached_chunk(stub_tts, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    rate_limit.limiter.backend.reset()
+    capacity = rate_limit.MODEL_BUDGETS[rate_limit.prompts.MODEL_TTS].per_user.capacity
+
+    def remaining():
+        usage = {u["model"]: u for u in client.get("/api/ai/budget").json()}
+        return usage[rate_limit.prompts.MODEL_TTS]["user_remaining"]
+
+    chunks = tts.split_sentences(STORY)
+    assert client.post("/api/ai/generate/speech/stream", json={"text": STORY}).status_code == 200
+    assert remaining() == pytest.approx(capacity - len(chunks), abs=0.1)
+    client.post("/api/ai/generate/speech", json={"text": STORY.replace("lazy drum", "sleepy drum")})
+    assert remaining() == pytest.approx(capacity - len(chunks) - 1, abs=0.1)
+    rate_limit.limiter.backend.reset()
+
+def test_speech_larger_than_the_budget_is_rejected_up_front(stub_tts, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    rate_limit.limiter.backend.reset()
+    capacity = rate_limit.MODEL_BUDGETS[rate_limit.prompts.MODEL_TTS].per_user.capacity
+    text = " ".join(f"Sentence number {i} is about the heart." for i in range(int(capacity) * 3))
+    assert len(tts.split_sentences(text)) > capacity
+
+    for path in ("/api/ai/generate/speech", "/api/ai/generate/speech/stream"):
+        res = client.post(path, json={"text": text})
+        assert res.status_code == 413
+        assert "Retry-After" not in res.headers
+    assert CountingStub.calls == 0
+    rate_limit.limiter.backend.reset()
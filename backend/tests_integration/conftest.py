@@ -2,14 +2,17 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_session_factory
 from app.auth import create_access_token
+from app.blob_store import LocalBlobStore
+from app import bbox, tts
 
-# Use in-memory SQLite for testing
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-
+# Use a throwaway SQLite file per test. An in-memory database lives on a single shared
+# connection, so concurrent sessions (background pipeline jobs) would see each other's
+# transactions and rollbacks.
 @pytest.fixture(scope="function")
-async def db_session():
+async def db_session(tmp_path):
+    TEST_DATABASE_URL = f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
     # Create engine and tables
     # check_same_thread=False is needed for SQLite + asyncio
     engine = create_async_engine(
@@ -37,12 +40,24 @@ async def db_session():
     
     await engine.dispose()
 
+@pytest.fixture(autouse=True)
+def blob_store(tmp_path, monkeypatch):
+    # Fresh blob store per test so cached audio and boxes don't leak between tests
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(tts, "blob_store", store)
+    monkeypatch.setattr(bbox, "blob_store", store)
+    return store
+
 @pytest.fixture(scope="function")
 async def client(db_session):
     async def override_get_db():
         yield db_session
     
     app.dependency_overrides[get_db] = override_get_db
+    # Background jobs open their own sessions on the same test engine
+    app.dependency_overrides[get_session_factory] = lambda: async_sessionmaker(
+        bind=db_session.bind, expire_on_commit=False, autoflush=False
+    )
     
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
         yield c
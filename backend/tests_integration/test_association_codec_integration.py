@@ -0,0 +1,72 @@
+import json
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from app import association_codec
+from test_stories_integration import get_auth_headers
+
+def association(k, srs=None):
+    return {
+        "medicalTerm": f"Bradycardia {k}", "character": f"Slow clock {k}", "explanation": "Ticks slowly",
+        "boundingBox": [1.5, 2.0, 30.0, 40.25] if k % 2 else None, "shape": "ellipse" if k % 2 else None, "srs": srs,
+    }
+
+SRS = {"n": 2, "ef": 2.6, "i": 6, "lastReview": 1700000000000, "nextReview": 1700518400000}
+
+def test_compact_round_trip():
+    entries = [association(0), association(1, SRS), {"medicalTerm": "x", "character": "y", "explanation": "z", "note": "kept"}, "odd"]
+    stored = [association_codec.compact(a) for a in entries]
+    assert stored[1] == {"t": "Bradycardia 1", "c": "Slow clock 1", "e": "Ticks slowly", "b": [1.5, 2.0, 30.0, 40.25], "h": "ellipse",
+                         "r": [2, 2.6, 6, 1700000000000, 1700518400000]}
+    assert stored[2] == entries[2] and stored[3] == "odd"  # Unknown shapes are stored untouched
+    assert [association_codec.expand(a) for a in stored] == entries
+    assert len(json.dumps(stored[1])) < len(json.dumps(entries[1])) * 0.7
+
+def test_fsrs_state_is_packed_after_the_sm2_fields():
+    fsrs = association(0, {**SRS, "s": 12.5, "d": 4.2})
+    assert association_codec.compact(fsrs)["r"] == [2, 2.6, 6, 1700000000000, 1700518400000, 12.5, 4.2]
+    assert association_codec.expand(association_codec.compact(fsrs)) == fsrs
+    # Unset FSRS fields (SM-2 cards sent by a client) add nothing
+    assert association_codec.compact(association(0, {**SRS, "s": None, "d": None}))["r"] == list(SRS.values())
+
+@pytest.mark.asyncio
+async def test_api_shape_is_unchanged_and_storage_is_compact(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "compact")
+    story = {"id": "c1", "topic": "Heart", "facts": ["f"], "story": "s", "visualPrompt": "p", "createdAt": 1,
+             "associations": [association(0), association(1, SRS)]}
+    assert (await client.post("/api/stories", json=story, headers=headers)).status_code == 201
+    reviewed = (await client.post("/api/stories/c1/review", json={"associationIndex": 0, "quality": 5}, headers=headers)).json()
+    assert reviewed["associations"][0]["srs"]["n"] == 1
+    assert reviewed["associations"][1] == association(1, SRS)
+    assert (await client.get("/api/stories/c1", headers=headers)).json() == reviewed
+
+    raw = (await db_session.execute(text("SELECT associations FROM saved_stories WHERE id = 'c1'"))).scalar_one()
+    assert [sorted(a) for a in json.loads(raw)] == [["c", "e", "r", "t"], ["b", "c", "e", "h", "r", "t"]]
+    hits = (await client.get("/api/stories/search", params={"q": "slow clock"}, headers=headers)).json()
+    assert [h["id"] for h in hits["hits"]] == ["c1"]
+
+@pytest.mark.asyncio
+async def test_legacy_rows_are_read_and_migrated(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "legacy")
+    user_id = (await client.get("/api/auth/me", headers=headers)).json()["id"]
+    legacy = json.dumps([association(0, SRS), association(1)])  # Full keys, default separators
+    for story_id, deleted in (("old", None), ("old-deleted", 5)):
+        await db_session.execute(text(
+            'INSERT INTO saved_stories (id, user_id, topic, facts, story, associations, "visualPrompt", "createdAt", "deletedAt") '
+            "VALUES (:id, :uid, 'Old', '[]', 's', :a, 'p', 1, :deleted)"
+        ), {"id": story_id, "uid": user_id, "a": legacy, "deleted": deleted})
+    await db_session.commit()
+
+    before = (await client.get("/api/stories/old", headers=headers)).json()
+    assert before["associations"] == [association(0, SRS), association(1)]
+
+    async with db_session.bind.begin() as conn:
+        assert await association_codec.compact_existing(conn, batch_size=1) == 2
+        assert await association_codec.compact_existing(conn) == 0
+    raw = (await db_session.execute(text("SELECT group_concat(associations) FROM saved_stories"))).scalar_one()
+    assert "medicalTerm" not in raw
+
+    db_session.expire_all()
+    assert (await client.get("/api/stories/old", headers=headers)).json() == before
+    hits = (await client.get("/api/stories/search", params={"q": "bradycardia"}, headers=headers)).json()
+    assert [h["id"] for h in hits["hits"]] == ["old"]
@@ -0,0 +1,73 @@
+import os
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import crud, search
+from app.main import run_migrations
+
+# The schema as it was before the soft-delete, playlist order and search migrations
+OLD_SCHEMA = [
+    "CREATE TABLE users (id VARCHAR PRIMARY KEY, username VARCHAR UNIQUE, email VARCHAR UNIQUE, hashed_password VARCHAR, is_admin BOOLEAN)",
+    "CREATE TABLE saved_stories (id VARCHAR PRIMARY KEY, user_id VARCHAR REFERENCES users(id), concept_id VARCHAR, topic VARCHAR, "
+    'facts JSON, story TEXT, associations JSON, "visualPrompt" TEXT, "imageData" TEXT, "createdAt" BIGINT)',
+    'CREATE TABLE playlists (id VARCHAR PRIMARY KEY, user_id VARCHAR REFERENCES users(id), name VARCHAR, description TEXT, "createdAt" BIGINT)',
+    "CREATE TABLE playlist_stories (playlist_id VARCHAR REFERENCES playlists(id) ON DELETE CASCADE, "
+    "story_id VARCHAR REFERENCES saved_stories(id) ON DELETE CASCADE, PRIMARY KEY (playlist_id, story_id))",
+]
+OLD_ROWS = [
+    "INSERT INTO users (id, username, email, hashed_password, is_admin) VALUES ('u1', 'old', 'old@test.com', 'x', FALSE)",
+    "INSERT INTO saved_stories (id, user_id, topic, facts, story, associations, \"visualPrompt\", \"createdAt\") VALUES "
+    "('s1', 'u1', 'Beta blockers', '[\"Cause bradycardia\"]', 'Betty slowed the clock', "
+    "'[{\"medicalTerm\": \"Bradycardia\", \"character\": \"Slow clock\", \"explanation\": \"Slow heart\", \"srs\": null}]', 'p', 1)",
+    "INSERT INTO saved_stories (id, user_id, topic, facts, story, associations, \"visualPrompt\", \"createdAt\") VALUES "
+    "('s2', 'u1', 'Statins', '[\"Cause myopathy\"]', 'Stan ached', '[]', 'p', 2)",
+    "INSERT INTO playlists (id, user_id, name, \"createdAt\") VALUES ('p1', 'u1', 'Cardio', 1)",
+    "INSERT INTO playlist_stories (playlist_id, story_id) VALUES ('p1', 's2')",
+    "INSERT INTO playlist_stories (playlist_id, story_id) VALUES ('p1', 's1')",
+]
+
+def database_urls():
+    urls = ["sqlite"]
+    # Postgres aborts a transaction on the first failed statement; set this to check the migrations there too
+    if os.getenv("POSTGRES_TEST_URL"):
+        urls.append(os.getenv("POSTGRES_TEST_URL"))
+    return urls
+
+@pytest.fixture(params=database_urls())
+async def old_engine(request, tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'old.db'}" if request.param == "sqlite" else request.param
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("DROP SCHEMA public CASCADE"))
+            await conn.execute(text("CREATE SCHEMA public"))
+        for statement in OLD_SCHEMA + OLD_ROWS:
+            await conn.execute(text(statement))
+    yield engine
+    await engine.dispose()
+
+async def columns(engine, table):
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns(table)})
+
+@pytest.mark.asyncio
+async def test_boot_upgrades_an_old_database(old_engine):
+    # The second run finds every column in place: each failing step must be rolled back on its own
+    for _ in range(2):
+        async with old_engine.begin() as conn:
+            await run_migrations(conn)
+
+    assert "deletedAt" in await columns(old_engine, "saved_stories")
+    assert "position" in await columns(old_engine, "playlist_stories")
+    sessions = async_sessionmaker(bind=old_engine, expire_on_commit=False)
+    async with sessions() as session:
+        # Existing links are numbered in the order they were added, not left tied at 0
+        assert await crud.get_playlist_story_ids(session, "p1") == ["s2", "s1"]
+        assert [s.id for s, _ in await crud.get_playlist_stories_page(session, "p1", None, 10)] == ["s2", "s1"]
+        assert {s.id for s in await crud.get_stories(session, "u1")} == {"s1", "s2"}
+        assert (await crud.get_story(session, "u1", "s1")).associations[0]["medicalTerm"] == "Bradycardia"
+        assert await crud.delete_story(session, "u1", "s2")
+        assert [s.id for s in await crud.get_stories(session, "u1")] == ["s1"]
+        # Stories from before the search index are backfilled into it
+        total, hits = await search.search_stories(session, "u1", "bradycardia", 10, 0)
+        assert total == 1 and hits[0]["id"] == "s1"
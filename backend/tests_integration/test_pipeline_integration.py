@@ -0,0 +1,76 @@
+import pytest
+from httpx import AsyncClient
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import rate_limit
+from test_stories_integration import get_auth_headers
+
+@pytest.fixture
+def stub_ai(monkeypatch):
+    monkeypatch.setattr(ai, "client", ResilientClient(StubProvider(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+STORY = {
+    "id": "pipeline-story",
+    "topic": "Beta blockers",
+    "facts": ["Cause bradycardia"],
+    "story": "Betty the Blocker slowed the heart clock.",
+    "associations": [
+        {"medicalTerm": "Bradycardia", "character": "Slow clock", "explanation": "Slow heart rate"},
+        {"medicalTerm": "Fatigue", "character": "Sleepy Betty", "explanation": "Tiredness"},
+    ],
+    "visualPrompt": "Betty holding a slow clock",
+    "createdAt": 1,
+}
+
+@pytest.mark.asyncio
+async def test_prepare_generates_all_artifacts(client: AsyncClient, stub_ai):
+    headers = await get_auth_headers(client, "pipeline")
+    await client.post("/api/stories", json=STORY, headers=headers)
+
+    res = await client.post("/api/stories/pipeline-story/prepare", json={"language": "en"}, headers=headers)
+    assert res.status_code == 202
+
+    # The ASGI transport waits for background tasks, so the jobs are done here
+    res = await client.get("/api/stories/pipeline-story/artifacts", headers=headers)
+    artifacts = {a["kind"]: a for a in res.json()}
+    assert {k: a["status"] for k, a in artifacts.items()} == {"quiz": "ready", "speech": "ready", "image": "ready"}
+    assert len(artifacts["quiz"]["data"]) == 2
+    assert artifacts["speech"]["data"]
+
+    story = (await client.get("/api/stories/pipeline-story", headers=headers)).json()
+    assert story["imageData"].startswith("data:image/png;base64,")
+
+    # Ready artifacts are not regenerated
+    res = await client.post("/api/stories/pipeline-story/prepare", headers=headers)
+    assert {a["status"] for a in res.json()} == {"ready"}
+
+@pytest.mark.asyncio
+async def test_create_with_prepare_and_failures(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(ai, "client", ResilientClient(StubProvider(error_rate=1.0), base_delay=0, max_delay=0, max_attempts=1))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    headers = await get_auth_headers(client, "pipeline_fail")
+
+    res = await client.post("/api/stories?prepare=true", json=dict(STORY, id="failing-story"), headers=headers)
+    assert res.status_code == 201
+
+    res = await client.get("/api/stories/failing-story/artifacts", headers=headers)
+    artifacts = res.json()
+    assert len(artifacts) == 3
+    assert all(a["status"] == "failed" and a["error"] for a in artifacts)
+
+@pytest.mark.asyncio
+async def test_forced_prepare_replaces_the_image(client: AsyncClient, stub_ai):
+    headers = await get_auth_headers(client, "pipeline_force")
+    old_image = "data:image/png;base64,b2xk"
+    await client.post("/api/stories", json=dict(STORY, id="forced-story", imageData=old_image), headers=headers)
+
+    res = await client.post("/api/stories/forced-story/prepare", json={"kinds": ["image"]}, headers=headers)
+    assert {a["kind"]: a["status"] for a in res.json()} == {"image": "ready"}
+    assert (await client.get("/api/stories/forced-story", headers=headers)).json()["imageData"] == old_image
+
+    res = await client.post("/api/stories/forced-story/prepare", json={"kinds": ["image"], "force": True}, headers=headers)
+    assert res.status_code == 202
+    image = (await client.get("/api/stories/forced-story", headers=headers)).json()["imageData"]
+    assert image.startswith("data:image/png;base64,") and image != old_image
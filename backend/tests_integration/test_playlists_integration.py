@@ -0,0 +1,175 @@
+import json
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from test_stories_integration import get_auth_headers
+
+def story_payload(id):
+    return {
+        "id": id, "topic": f"Topic {id}", "facts": [], "story": "S", "associations": [],
+        "visualPrompt": "", "imageData": "data:image/png;base64," + "A" * 1000, "createdAt": 1,
+    }
+
+async def setup_playlist(client, headers, n):
+    for i in range(n):
+        await client.post("/api/stories", json=story_payload(f"s{i}"), headers=headers)
+    return (await client.post("/api/playlists", json={"name": "Pharm"}, headers=headers)).json()["id"]
+
+async def story_ids(client, headers, playlist_id):
+    return (await client.get(f"/api/playlists/{playlist_id}", headers=headers)).json()["story_ids"]
+
+@pytest.mark.asyncio
+async def test_bulk_add_remove_keeps_order_and_ignores_duplicates(client: AsyncClient):
+    headers = await get_auth_headers(client, "bulkplaylist")
+    pid = await setup_playlist(client, headers, 5)
+
+    res = await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ["s3", "s1", "s3", "missing"]}, headers=headers)
+    assert res.status_code == 200
+    assert res.json()["added"] == 2
+    res = await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ["s1", "s0"]}, headers=headers)
+    assert res.json()["added"] == 1
+    assert await story_ids(client, headers, pid) == ["s3", "s1", "s0"]
+
+    # The single-story endpoints go through the same statements
+    assert (await client.post(f"/api/playlists/{pid}/stories/s4", headers=headers)).status_code == 200
+    assert (await client.post(f"/api/playlists/{pid}/stories/s4", headers=headers)).status_code == 200
+    assert (await client.post(f"/api/playlists/{pid}/stories/nope", headers=headers)).status_code == 404
+    assert await story_ids(client, headers, pid) == ["s3", "s1", "s0", "s4"]
+
+    res = await client.request("DELETE", f"/api/playlists/{pid}/stories", json={"storyIds": ["s1", "s4", "s2"]}, headers=headers)
+    assert res.json()["removed"] == 2
+    assert await story_ids(client, headers, pid) == ["s3", "s0"]
+
+@pytest.mark.asyncio
+async def test_reorder_moves_listed_stories_to_front(client: AsyncClient):
+    headers = await get_auth_headers(client, "reorder")
+    pid = await setup_playlist(client, headers, 4)
+    await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ["s0", "s1", "s2", "s3"]}, headers=headers)
+
+    res = await client.put(f"/api/playlists/{pid}/order", json={"storyIds": ["s2", "s0", "unknown"]}, headers=headers)
+    assert res.json()["story_ids"] == ["s2", "s0", "s1", "s3"]
+    assert await story_ids(client, headers, pid) == ["s2", "s0", "s1", "s3"]
+
+    # New stories are appended after the reordered ones
+    await client.post("/api/stories", json=story_payload("s9"), headers=headers)
+    await client.post(f"/api/playlists/{pid}/stories/s9", headers=headers)
+    assert await story_ids(client, headers, pid) == ["s2", "s0", "s1", "s3", "s9"]
+
+    # Moving again stacks in front of the previously moved stories
+    res = await client.put(f"/api/playlists/{pid}/order", json={"storyIds": ["s9", "s1"]}, headers=headers)
+    assert res.json()["story_ids"] == ["s9", "s1", "s2", "s0", "s3"]
+    assert await story_ids(client, headers, pid) == ["s9", "s1", "s2", "s0", "s3"]
+
+@pytest.mark.asyncio
+async def test_membership_is_scoped_to_owner(client: AsyncClient):
+    owner = await get_auth_headers(client, "owner")
+    intruder = await get_auth_headers(client, "intruder")
+    pid = await setup_playlist(client, owner, 1)
+    await client.post("/api/stories", json=story_payload("theirs"), headers=intruder)
+
+    assert (await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ["s0"]}, headers=intruder)).status_code == 404
+    assert (await client.put(f"/api/playlists/{pid}/order", json={"storyIds": []}, headers=intruder)).status_code == 404
+    # The owner can't add someone else's story either
+    res = await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ["theirs", "s0"]}, headers=owner)
+    assert res.json()["added"] == 1
+    assert await story_ids(client, owner, pid) == ["s0"]
+
+@pytest.mark.asyncio
+async def test_bulk_add_never_loads_story_rows(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "lean")
+    pid = await setup_playlist(client, headers, 50)
+    ids = [f"s{i}" for i in range(50)]
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ids}, headers=headers)
+        await client.put(f"/api/playlists/{pid}/order", json={"storyIds": list(reversed(ids))}, headers=headers)
+        await client.request("DELETE", f"/api/playlists/{pid}/stories", json={"storyIds": ids[:10]}, headers=headers)
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", record)
+
+    assert not any("imageData" in s or "saved_stories.story" in s for s in statements)
+    # A constant number of statements, whatever the playlist size (auth lookups included)
+    assert len(statements) < 20
+    assert (await story_ids(client, headers, pid))[:2] == ["s49", "s48"]
+
+@pytest.mark.asyncio
+async def test_reorder_rewrites_only_moved_rows(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "mover")
+    pid = await setup_playlist(client, headers, 30)
+    ids = [f"s{i}" for i in range(30)]
+    await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": ids}, headers=headers)
+
+    updated = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE playlist_stories"):
+            updated.extend(parameters if executemany else [parameters])
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        await client.put(f"/api/playlists/{pid}/order", json={"storyIds": ["s29", "s7"]}, headers=headers)
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", record)
+
+    assert len(updated) == 2
+    assert await story_ids(client, headers, pid) == ["s29", "s7"] + [sid for sid in ids if sid not in ("s29", "s7")]
+
+@pytest.mark.asyncio
+async def test_listing_uses_one_aggregate_and_skips_deleted(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "lister")
+    first = await setup_playlist(client, headers, 6)
+    second = (await client.post("/api/playlists", json={"name": "Empty"}, headers=headers)).json()["id"]
+    await client.post(f"/api/playlists/{first}/stories", json={"storyIds": ["s5", "s0", "s3", "s1"]}, headers=headers)
+    await client.delete("/api/stories/s3", headers=headers)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        res = await client.get("/api/playlists", headers=headers)
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", record)
+
+    by_id = {p["id"]: p for p in res.json()}
+    assert by_id[first]["story_ids"] == ["s5", "s0", "s1"]
+    assert by_id[first]["story_count"] == 3
+    assert by_id[second]["story_ids"] == [] and by_id[second]["story_count"] == 0
+    playlist_queries = [s for s in statements if "playlists" in s]
+    assert len(playlist_queries) == 1
+    assert "imageData" not in playlist_queries[0]
+
+@pytest.mark.asyncio
+async def test_study_session_streams_pages_and_resumes(client: AsyncClient):
+    headers = await get_auth_headers(client, "studier")
+    pid = await setup_playlist(client, headers, 7)
+    order = ["s6", "s2", "s4", "s0", "s1", "s5", "s3"]
+    await client.post(f"/api/playlists/{pid}/stories", json={"storyIds": order}, headers=headers)
+
+    res = await client.get(f"/api/playlists/{pid}/study", params={"pageSize": 3}, headers=headers)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    pages = [json.loads(line) for line in res.text.splitlines()]
+    assert [len(p["stories"]) for p in pages] == [3, 3, 1]
+    assert [s["id"] for p in pages for s in p["stories"]] == order
+    assert pages[0]["stories"][0]["imageData"].startswith("data:image/png")
+    assert pages[-1]["nextCursor"] is None
+
+    # Resume from the first page's cursor, capped at 2 stories
+    res = await client.get(
+        f"/api/playlists/{pid}/study", params={"pageSize": 3, "cursor": pages[0]["nextCursor"], "limit": 2}, headers=headers
+    )
+    pages = [json.loads(line) for line in res.text.splitlines()]
+    assert [s["id"] for p in pages for s in p["stories"]] == ["s0", "s1"]
+    assert pages[-1]["nextCursor"] is None
+
+    # A playlist that fills its pages exactly ends on a full page, not an empty one
+    res = await client.get(f"/api/playlists/{pid}/study", params={"pageSize": 7}, headers=headers)
+    pages = [json.loads(line) for line in res.text.splitlines()]
+    assert [len(p["stories"]) for p in pages] == [7]
+    assert pages[0]["nextCursor"] is None
+
+    assert (await client.get(f"/api/playlists/{pid}/study", params={"cursor": "bogus"}, headers=headers)).status_code == 400
+    assert (await client.get("/api/playlists/nope/study", headers=headers)).status_code == 404
@@ -0,0 +1,82 @@
+import pytest
+from httpx import AsyncClient
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import rate_limit, quiz_bank
+from test_stories_integration import get_auth_headers
+from test_pipeline_integration import STORY
+
+class CountingStub(StubProvider):
+    calls = 0
+
+    async def generate_content(self, **kwargs):
+        CountingStub.calls += 1
+        return await super().generate_content(**kwargs)
+
+@pytest.fixture
+def stub_ai(monkeypatch):
+    CountingStub.calls = 0
+    monkeypatch.setattr(ai, "client", ResilientClient(CountingStub(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+@pytest.mark.asyncio
+async def test_repeat_quizzes_come_from_bank(client: AsyncClient, stub_ai, monkeypatch):
+    monkeypatch.setattr(quiz_bank, "QUIZ_BANK_TARGET", 2)
+    headers = await get_auth_headers(client, "quizbank")
+    await client.post("/api/stories", json=dict(STORY, id="bank-story"), headers=headers)
+
+    # First quiz generates, and the background top-up fills the bank to the target
+    res = await client.get("/api/stories/bank-story/quiz", headers=headers)
+    assert res.status_code == 200
+    assert sorted(q["associationIndex"] for q in res.json()) == [0, 1]
+    assert CountingStub.calls == 2
+
+    for _ in range(3):
+        res = await client.get("/api/stories/bank-story/quiz", headers=headers)
+        questions = res.json()
+        assert len(questions) == 2
+        assert all(0 <= q["correctOptionIndex"] < len(q["options"]) for q in questions)
+    assert CountingStub.calls == 2
+
+    # Spanish has its own bank
+    await client.get("/api/stories/bank-story/quiz?language=es", headers=headers)
+    assert CountingStub.calls == 4
+
+@pytest.mark.asyncio
+async def test_edited_association_gets_new_questions(client: AsyncClient, stub_ai, monkeypatch):
+    monkeypatch.setattr(quiz_bank, "QUIZ_BANK_TARGET", 1)
+    headers = await get_auth_headers(client, "quizbank_edit")
+    await client.post("/api/stories", json=dict(STORY, id="edit-story"), headers=headers)
+    await client.get("/api/stories/edit-story/quiz", headers=headers)
+    assert CountingStub.calls == 1
+
+    # Reordering keeps the bank; the served index follows the story
+    reordered = dict(STORY, id="edit-story", associations=list(reversed(STORY["associations"])))
+    await client.put("/api/stories/edit-story", json=reordered, headers=headers)
+    res = await client.get("/api/stories/edit-story/quiz", headers=headers)
+    assert sorted(q["associationIndex"] for q in res.json()) == [0, 1]
+    assert CountingStub.calls == 1
+
+    edited = dict(reordered, associations=[dict(reordered["associations"][0], character="Snail clock"), reordered["associations"][1]])
+    await client.put("/api/stories/edit-story", json=edited, headers=headers)
+    await client.get("/api/stories/edit-story/quiz", headers=headers)
+    assert CountingStub.calls == 2
+
+@pytest.mark.asyncio
+async def test_prepare_seeds_bank(client: AsyncClient, stub_ai, monkeypatch):
+    monkeypatch.setattr(quiz_bank, "QUIZ_BANK_TARGET", 1)
+    headers = await get_auth_headers(client, "quizbank_prepare")
+    await client.post("/api/stories", json=dict(STORY, id="seeded-story"), headers=headers)
+    await client.post("/api/stories/seeded-story/prepare", json={"kinds": ["quiz"]}, headers=headers)
+    assert CountingStub.calls == 1
+
+    res = await client.get("/api/stories/seeded-story/quiz", headers=headers)
+    assert len(res.json()) == 2
+    assert CountingStub.calls == 1
+
+@pytest.mark.asyncio
+async def test_quiz_for_missing_story_is_404(client: AsyncClient, stub_ai):
+    headers = await get_auth_headers(client, "quizbank_missing")
+    res = await client.get("/api/stories/nope/quiz", headers=headers)
+    assert res.status_code == 404
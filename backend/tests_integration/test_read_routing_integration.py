@@ -0,0 +1,63 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import database, read_routing
+from app.database import Base
+from test_stories_integration import get_auth_headers
+
+@pytest.fixture
+async def stale_replica(tmp_path, monkeypatch):
+    # A "replica" that never receives anything: whatever it returns is maximally stale
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(database, "read_engine", engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", async_sessionmaker(bind=engine, expire_on_commit=False))
+    read_routing.recent_writers.clear()
+    yield engine
+    read_routing.recent_writers.clear()
+    await engine.dispose()
+
+def story_payload(story_id):
+    return {"id": story_id, "topic": "T", "facts": [], "story": "s", "associations": [], "visualPrompt": "p", "createdAt": 1}
+
+@pytest.mark.asyncio
+async def test_reads_use_primary_without_a_replica(client: AsyncClient):
+    headers = await get_auth_headers(client, "noreplica")
+    res = await client.post("/api/stories", json=story_payload("s1"), headers=headers)
+    assert read_routing.WROTE_COOKIE not in res.cookies  # No routing to do
+    assert [s["id"] for s in (await client.get("/api/stories", headers=headers)).json()] == ["s1"]
+
+@pytest.mark.asyncio
+async def test_recent_writers_read_from_primary(client: AsyncClient, stale_replica):
+    headers = await get_auth_headers(client, "replicated")
+    res = await client.post("/api/stories", json=story_payload("s1"), headers=headers)
+    assert res.status_code == 201
+    assert read_routing.WROTE_COOKIE in res.cookies
+
+    # Same client right after its write: cookie and token both pin it to the primary
+    assert [s["id"] for s in (await client.get("/api/stories", headers=headers)).json()] == ["s1"]
+
+    # Another container (no in-process memory) still honours the cookie
+    read_routing.recent_writers.clear()
+    assert [s["id"] for s in (await client.get("/api/stories", headers=headers)).json()] == ["s1"]
+
+    # And this container honours the token without the cookie
+    client.cookies.clear()
+    read_routing.recent_writers.mark(headers["Authorization"])
+    assert (await client.get("/api/stories/s1", headers=headers)).status_code == 200
+
+    # Once the window has passed, reads go to the (stale) replica
+    read_routing.recent_writers.clear()
+    assert (await client.get("/api/stories", headers=headers)).json() == []
+    assert (await client.get("/api/stories/s1", headers=headers)).status_code == 404
+
+@pytest.mark.asyncio
+async def test_failed_writes_do_not_pin_reads(client: AsyncClient, stale_replica):
+    headers = await get_auth_headers(client, "failing")
+    client.cookies.clear()
+    read_routing.recent_writers.clear()
+    res = await client.put("/api/stories/missing", json=story_payload("missing"), headers=headers)
+    assert res.status_code == 404
+    assert read_routing.WROTE_COOKIE not in res.cookies
+    assert not read_routing.recent_writers.recent(headers["Authorization"])
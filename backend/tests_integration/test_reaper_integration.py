@@ -0,0 +1,89 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import crud, reaper, sql_models
+from test_stories_integration import get_auth_headers
+
+def story_payload(id, topic="Macrolides"):
+    return {
+        "id": id,
+        "topic": topic,
+        "facts": ["Macrolides prolong the QT interval"],
+        "story": "Mac the slide stretched the heart tracing.",
+        "associations": [{"medicalTerm": "QT prolongation", "character": "Stretchy slide", "explanation": ""}],
+        "visualPrompt": "",
+        "createdAt": 1,
+    }
+
+@pytest.fixture
+def session_factory(db_session, blob_store, monkeypatch):
+    monkeypatch.setattr(reaper, "blob_store", blob_store)
+    return async_sessionmaker(bind=db_session.bind, expire_on_commit=False, autoflush=False)
+
+async def count(session_factory, table, **where):
+    async with session_factory() as session:
+        stmt = select(func.count()).select_from(table)
+        for column, value in where.items():
+            stmt = stmt.where(table.c[column] == value)
+        return (await session.execute(stmt)).scalar_one()
+
+@pytest.mark.asyncio
+async def test_delete_hides_story_everywhere_then_reaper_purges(client: AsyncClient, session_factory, blob_store):
+    headers = await get_auth_headers(client, "reaped")
+    await client.post("/api/stories", json=story_payload("doomed"), headers=headers)
+    await client.post("/api/stories", json=story_payload("kept", "Macrolide interactions"), headers=headers)
+    playlist = (await client.post("/api/playlists", json={"name": "Antibiotics"}, headers=headers)).json()
+    for story_id in ("doomed", "kept"):
+        await client.post(f"/api/playlists/{playlist['id']}/stories/{story_id}", headers=headers)
+
+    # Narration shared with the surviving story must outlive the purge
+    blob_store.put("tts/doomed-only", b"pcm")
+    blob_store.put("tts/shared", b"pcm")
+    async with session_factory() as session:
+        await crud.upsert_story_artifact(session, "doomed", "speech", "ready", data={"audioKey": "tts/doomed-only"})
+        await crud.upsert_story_artifact(session, "kept", "speech", "ready", data={"audioKey": "tts/shared"})
+        await crud.add_quiz_questions(session, "doomed", "en", [{
+            "associationIndex": 0, "associationKey": "k", "question": "Q?", "options": ["a", "b"],
+            "correctOptionIndex": 0, "explanation": "",
+        }])
+    async with session_factory() as session:
+        await crud.upsert_story_artifact(session, "doomed", "image", "ready")
+
+    assert (await client.delete("/api/stories/doomed", headers=headers)).status_code == 204
+    assert (await client.delete("/api/stories/doomed", headers=headers)).status_code == 404
+
+    # Tombstoned: gone from every read path, but nothing purged yet
+    assert (await client.get("/api/stories/doomed", headers=headers)).status_code == 404
+    assert [s["id"] for s in (await client.get("/api/stories", headers=headers)).json()] == ["kept"]
+    assert (await client.get(f"/api/playlists/{playlist['id']}", headers=headers)).json()["story_ids"] == ["kept"]
+    hits = (await client.get("/api/stories/search", params={"q": "macrolide"}, headers=headers)).json()["hits"]
+    assert [h["id"] for h in hits] == ["kept"]
+    assert await count(session_factory, sql_models.SavedStory.__table__, id="doomed") == 1
+
+    assert await reaper.purge_deleted(session_factory) == 1
+
+    assert await count(session_factory, sql_models.SavedStory.__table__, id="doomed") == 0
+    assert await count(session_factory, sql_models.playlist_stories, story_id="doomed") == 0
+    assert await count(session_factory, sql_models.StoryArtifact.__table__, story_id="doomed") == 0
+    assert await count(session_factory, sql_models.QuizQuestion.__table__, story_id="doomed") == 0
+    assert not blob_store.exists("tts/doomed-only")
+    assert blob_store.exists("tts/shared")
+    assert await count(session_factory, sql_models.playlist_stories, story_id="kept") == 1
+    async with session_factory() as session:
+        assert (await session.execute(text("SELECT count(*) FROM story_search"))).scalar_one() == 1
+
+    # Nothing left to do
+    assert await reaper.purge_deleted(session_factory) == 0
+
+@pytest.mark.asyncio
+async def test_reaper_works_in_batches(client: AsyncClient, session_factory):
+    headers = await get_auth_headers(client, "bulk")
+    for i in range(7):
+        await client.post("/api/stories", json=story_payload(f"s{i}"), headers=headers)
+        await client.delete(f"/api/stories/s{i}", headers=headers)
+
+    assert await reaper.purge_batch(session_factory, batch_size=3) == 3
+    assert await count(session_factory, sql_models.SavedStory.__table__) == 4
+    assert await reaper.purge_deleted(session_factory, batch_size=3) == 4
+    assert await count(session_factory, sql_models.SavedStory.__table__) == 0
@@ -0,0 +1,76 @@
+import random
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import crud, review_log, scheduler, sql_models
+from test_stories_integration import get_auth_headers
+
+DAY = scheduler.DAY_MS
+SRS = {"n": 2, "ef": 2.6, "i": 6, "lastReview": 1700000000000, "nextReview": 1700518400000}
+
+async def create_story(client, headers, story_id, srs=(None, None)):
+    story = {"id": story_id, "topic": "T", "facts": ["f"], "story": "s", "visualPrompt": "p", "createdAt": 1,
+             "associations": [{"medicalTerm": f"T{k}", "character": f"C{k}", "explanation": "E", "srs": s} for k, s in enumerate(srs)]}
+    assert (await client.post("/api/stories", json=story, headers=headers)).status_code == 201
+
+async def events(db_session):
+    result = await db_session.execute(select(sql_models.ReviewEvent).order_by(sql_models.ReviewEvent.id))
+    return list(result.scalars().all())
+
+@pytest.mark.asyncio
+async def test_reviews_are_logged_and_replay_recomputes_them(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "logger")
+    await create_story(client, headers, "log1", srs=(None, SRS))
+    for index, quality in ((0, 4), (0, 5), (0, 2), (1, 4)):
+        res = await client.post("/api/stories/log1/review", json={"associationIndex": index, "quality": quality}, headers=headers)
+    reviewed = res.json()["associations"]
+
+    logged = await events(db_session)
+    assert [(e.associationIndex, e.quality, e.scheduler) for e in logged] == [(0, 4, "sm2"), (0, 5, "sm2"), (0, 2, "sm2"), (1, 4, "sm2")]
+    assert logged[0].previousReview is None and logged[1].previousReview == logged[0].reviewedAt
+    assert logged[3].previousReview == SRS["lastReview"]  # Reviewed before the log existed
+    assert [e.interval for e in logged[:3]] == [1, 6, 1]
+
+    # SM-2 replay reproduces the live state; the card with pre-log history is left alone
+    stats = await review_log.replay(db_session.bind, "sm2")
+    assert stats == {"events": 3, "cards": 1, "stories": 1, "skipped": 1}
+    db_session.expire_all()
+    assert (await client.get("/api/stories/log1", headers=headers)).json()["associations"] == reviewed
+
+    await review_log.replay(db_session.bind, "fsrs")
+    replayed = (await client.get("/api/stories/log1", headers=headers)).json()["associations"]
+    assert replayed[0]["srs"]["s"] is not None and replayed[0]["srs"]["n"] == 0
+    assert replayed[1] == reviewed[1]
+
+@pytest.mark.asyncio
+async def test_buffered_log_writes_in_batches(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "buffered")
+    user_id = (await client.get("/api/auth/me", headers=headers)).json()["id"]
+    log = review_log.ReviewLog(async_sessionmaker(bind=db_session.bind, expire_on_commit=False), max_batch=4)
+    for k in range(10):
+        await log.record({"user_id": user_id, "story_id": "s", "associationIndex": 0, "quality": 4, "reviewedAt": k,
+                          "previousReview": k - 1 if k else None, "scheduler": "sm2", "interval": 1})
+    assert await events(db_session) == []  # Nothing written until a flush
+    assert await log.flush() == 10
+    assert [e.reviewedAt for e in await events(db_session)] == list(range(10))
+
+@pytest.mark.asyncio
+async def test_fit_saves_per_user_weights(client: AsyncClient, db_session):
+    pytest.importorskip("numpy")
+    headers = await get_auth_headers(client, "fitter")
+    user_id = (await client.get("/api/auth/me", headers=headers)).json()["id"]
+    rng, rows = random.Random(0), []
+    for card in range(40):
+        at, previous, s = 0, None, 3.0
+        for _ in range(6):
+            rows.append({"user_id": user_id, "story_id": f"s{card // 4}", "associationIndex": card % 4,
+                         "quality": 4 if rng.random() < 0.85 else 1, "reviewedAt": at, "previousReview": previous,
+                         "scheduler": "fsrs", "interval": round(s)})
+            previous, at, s = at, at + round(s * DAY), s * 2.5
+    await review_log.insert_events(async_sessionmaker(bind=db_session.bind), rows)
+
+    assert await review_log.fit(db_session.bind, min_reviews=1000) == {}
+    results = await review_log.fit(db_session.bind, min_reviews=100, iterations=5)
+    assert results[user_id].reviews == 40 * 5
+    assert await crud.get_scheduler_weights(db_session, user_id) == results[user_id].weights
@@ -0,0 +1,111 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, text
+from app import search, sql_models
+from test_stories_integration import get_auth_headers
+
+def make_story(id, topic, facts, story, terms):
+    return {
+        "id": id,
+        "topic": topic,
+        "facts": facts,
+        "story": story,
+        "associations": [
+            {"medicalTerm": term, "character": character, "explanation": "",
+             "srs": {"n": 0, "ef": 2.5, "i": 0, "lastReview": 0, "nextReview": 0}}
+            for term, character in terms
+        ],
+        "visualPrompt": "",
+        "createdAt": 1,
+    }
+
+BETA = make_story(
+    "beta", "Beta blockers", ["Beta blockers cause bradycardia", "They can mask hypoglycemia"],
+    "Betty the Blocker slowed the heart clock.", [("Bradycardia", "Slow clock")],
+)
+ACE = make_story(
+    "ace", "ACE inhibitors", ["ACE inhibitors cause a dry cough", "Angioedema is rare but serious"],
+    "Ace the pilot coughed while flying over the kidney.", [("Dry cough", "Coughing pilot")],
+)
+DIURETIC = make_story(
+    "diuretic", "Thiazide diuretics", ["Thiazides cause hypokalemia", "Thiazides may cause hyperglycemia"],
+    "Tia the tide washed potassium away; a slow clock ticked on the beach.", [("Hypokalemia", "Melting banana")],
+)
+
+@pytest.mark.asyncio
+async def test_search_ranks_and_highlights(client: AsyncClient):
+    headers = await get_auth_headers(client, "searcher")
+    for story in (BETA, ACE, DIURETIC):
+        assert (await client.post("/api/stories", json=story, headers=headers)).status_code == 201
+
+    res = await client.get("/api/stories/search", params={"q": "cough"}, headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["total"] == 1
+    assert body["hits"][0]["id"] == "ace"
+    assert "<mark>" in body["hits"][0]["snippet"]
+
+    # Association terms are indexed, and a topic/term match outranks a passing mention in the story
+    res = await client.get("/api/stories/search", params={"q": "slow clock"}, headers=headers)
+    assert [h["id"] for h in res.json()["hits"]] == ["beta", "diuretic"]
+
+    # Prefix matching and diacritics folding
+    res = await client.get("/api/stories/search", params={"q": "hypoglycémia"}, headers=headers)
+    assert [h["id"] for h in res.json()["hits"]] == ["beta"]
+    res = await client.get("/api/stories/search", params={"q": "hypo"}, headers=headers)
+    assert {h["id"] for h in res.json()["hits"]} == {"beta", "diuretic"}
+
+    # Query syntax characters are ignored rather than raising
+    res = await client.get("/api/stories/search", params={"q": 'ACE" (inhib*'}, headers=headers)
+    assert res.status_code == 200
+    assert [h["id"] for h in res.json()["hits"]] == ["ace"]
+
+@pytest.mark.asyncio
+async def test_search_paginates_and_is_scoped_to_user(client: AsyncClient):
+    headers = await get_auth_headers(client, "pager")
+    other = await get_auth_headers(client, "other")
+    for i in range(5):
+        story = make_story(f"s{i}", f"Cardiology {i}", ["Heart facts"], "A heart story.", [])
+        await client.post("/api/stories", json=story, headers=headers)
+    await client.post("/api/stories", json=make_story("x", "Cardiology", [], "heart", []), headers=other)
+
+    first = (await client.get("/api/stories/search", params={"q": "cardiology", "limit": 2}, headers=headers)).json()
+    rest = (await client.get("/api/stories/search", params={"q": "cardiology", "limit": 10, "offset": 2}, headers=headers)).json()
+    assert first["total"] == 5 and len(first["hits"]) == 2
+    assert len(rest["hits"]) == 3
+    assert {h["id"] for h in first["hits"] + rest["hits"]} == {f"s{i}" for i in range(5)}
+
+@pytest.mark.asyncio
+async def test_search_index_follows_updates_and_deletes(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "editor")
+    await client.post("/api/stories", json=BETA, headers=headers)
+
+    updated = {**BETA, "topic": "Propranolol", "facts": ["Propranolol treats tremor"]}
+    assert (await client.put("/api/stories/beta", json=updated, headers=headers)).status_code == 200
+    res = await client.get("/api/stories/search", params={"q": "tremor"}, headers=headers)
+    assert [h["id"] for h in res.json()["hits"]] == ["beta"]
+    res = await client.get("/api/stories/search", params={"q": "hypoglycemia"}, headers=headers)
+    assert res.json()["total"] == 0
+
+    await db_session.execute(delete(sql_models.SavedStory).where(sql_models.SavedStory.id == "beta"))
+    await db_session.commit()
+    res = await client.get("/api/stories/search", params={"q": "tremor"}, headers=headers)
+    assert res.json()["total"] == 0
+    assert (await db_session.execute(text("SELECT count(*) FROM story_search"))).scalar_one() == 0
+
+@pytest.mark.asyncio
+async def test_ensure_installed_backfills_existing_rows(client: AsyncClient, db_session):
+    headers = await get_auth_headers(client, "legacy")
+    await client.post("/api/stories", json=ACE, headers=headers)
+    # Simulate a database that predates the search index
+    await db_session.execute(text("DROP TABLE story_search"))
+    for name in ("insert", "update", "delete"):
+        await db_session.execute(text(f"DROP TRIGGER saved_stories_search_{name}"))
+    await db_session.commit()
+
+    async with db_session.bind.begin() as conn:
+        await search.ensure_installed(conn)
+        await search.ensure_installed(conn)  # Idempotent
+
+    res = await client.get("/api/stories/search", params={"q": "angioedema"}, headers=headers)
+    assert res.json()["total"] == 1
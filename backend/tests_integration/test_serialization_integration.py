@@ -0,0 +1,61 @@
+import pytest
+from httpx import AsyncClient
+from app import serialization
+from test_stories_integration import get_auth_headers
+
+def story_payload(i):
+    return {
+        "id": f"story-{i}",
+        "topic": f"Topic {i} — naïve café",
+        "facts": [f"Fact {k}" for k in range(3)],
+        "story": "A long story about the ward. " * 20,
+        "associations": [{
+            "medicalTerm": "Term", "character": "Char", "explanation": "Why",
+            "boundingBox": [1.5, 2.0, 30.0, 40.25], "shape": "ellipse",
+            "srs": {"n": 1, "ef": 2.36, "i": 1, "lastReview": 1700000000000, "nextReview": 1700086400000},
+        }],
+        "visualPrompt": "Prompt",
+        "imageData": None,
+        "createdAt": 1700000000000 + i,
+    }
+
+@pytest.mark.asyncio
+async def test_trusted_rows_match_response_model_output(client: AsyncClient, monkeypatch):
+    headers = await get_auth_headers(client, "serializer")
+    for i in range(3):
+        await client.post("/api/stories", json=story_payload(i), headers=headers)
+    review = await client.post("/api/stories/story-1/review", json={"associationIndex": 0, "quality": 4}, headers=headers)
+
+    fast_list = (await client.get("/api/stories", headers=headers)).json()
+    fast_one = (await client.get("/api/stories/story-1", headers=headers)).json()
+    monkeypatch.setattr(serialization, "FAST_JSON_ENABLED", False)
+    slow_list = (await client.get("/api/stories", headers=headers)).json()
+    slow_one = (await client.get("/api/stories/story-1", headers=headers)).json()
+
+    assert sorted(fast_list, key=lambda s: s["id"]) == sorted(slow_list, key=lambda s: s["id"])
+    assert fast_one == slow_one == review.json()
+    assert fast_one["topic"] == "Topic 1 — naïve café"
+
+@pytest.mark.asyncio
+async def test_large_json_is_compressed_small_and_streamed_bodies_are_not(client: AsyncClient):
+    headers = await get_auth_headers(client, "compressor")
+    for i in range(10):
+        await client.post("/api/stories", json=story_payload(i), headers=headers)
+
+    res = await client.get("/api/stories", headers={**headers, "Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in res.headers["vary"].lower()
+    assert int(res.headers["content-length"]) < len(res.content)
+    assert len(res.json()) == 10
+
+    res = await client.get("/api/stories", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+
+    res = await client.get("/api/auth/me", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+    playlist = (await client.post("/api/playlists", json={"name": "P"}, headers=headers)).json()
+    await client.post(f"/api/playlists/{playlist['id']}/stories", json={"storyIds": [f"story-{i}" for i in range(10)]}, headers=headers)
+    res = await client.get(f"/api/playlists/{playlist['id']}/study", params={"pageSize": 2}, headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert len(res.text.splitlines()) == 5
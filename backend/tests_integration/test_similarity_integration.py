@@ -0,0 +1,126 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, update
+from app.routers import ai
+from app.ai_client import ResilientClient
+from app.ai_providers import StubProvider
+from app import rate_limit, similarity, sql_models
+from app.similarity import SimilarityIndex, tokenize
+from test_stories_integration import get_auth_headers
+
+class CountingStub(StubProvider):
+    calls = 0
+
+    async def generate_content(self, **kwargs):
+        CountingStub.calls += 1
+        return await super().generate_content(**kwargs)
+
+@pytest.fixture
+def stub_ai(monkeypatch):
+    CountingStub.calls = 0
+    monkeypatch.setattr(ai, "client", ResilientClient(CountingStub(), base_delay=0, max_delay=0))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(similarity, "index", SimilarityIndex())
+
+BETA_BLOCKERS = {
+    "id": "public-beta",
+    "topic": "Beta blockers side effects",
+    "facts": [
+        "Beta blockers cause bradycardia",
+        "Beta blockers cause fatigue",
+        "Non-selective beta blockers can cause bronchospasm in asthmatics",
+    ],
+    "story": "Betty the Blocker slowed the heart clock and yawned.",
+    "associations": [
+        {"medicalTerm": "Bradycardia", "character": "Slow clock", "explanation": "Slow heart rate",
+         "srs": {"n": 2, "ef": 2.5, "i": 3, "lastReview": 1, "nextReview": 2}},
+    ],
+    "visualPrompt": "Betty holding a slow clock",
+    "createdAt": 1,
+}
+STATINS = dict(
+    BETA_BLOCKERS, id="public-statins", topic="Statins",
+    facts=["Statins inhibit HMG-CoA reductase", "Statins can cause myopathy and raised liver enzymes"],
+)
+
+async def _admin_headers(client, db_session, username):
+    headers = await get_auth_headers(client, username)
+    await db_session.execute(update(sql_models.User).where(sql_models.User.username == username).values(is_admin=True))
+    await db_session.commit()
+    return headers
+
+def test_tokenize_folds_plurals_accents_and_stopwords():
+    assert tokenize("The Beta-Blockers") == ["beta", "blocker", "beta_blocker"]
+    assert tokenize("los betabloqueantes, bradicardia")[:2] == tokenize("Betabloqueante bradicardia")[:2]
+
+@pytest.mark.asyncio
+async def test_near_duplicate_request_reuses_public_mnemonic(client: AsyncClient, db_session, stub_ai):
+    admin = await _admin_headers(client, db_session, "curator")
+    for story in (BETA_BLOCKERS, STATINS):
+        res = await client.post("/api/stories", json=story, headers=admin)
+        assert res.status_code == 201
+
+    notes = "Side effects of beta blockers: bradycardia, fatigue, and bronchospasm in asthmatics (non-selective beta blockers)."
+    res = await client.post("/api/ai/similar", json={"text": notes})
+    matches = res.json()
+    assert matches[0]["id"] == "public-beta" and matches[0]["kind"] == "story"
+    assert all(m["id"] != "public-statins" for m in matches)
+
+    # Reuse is opt-in: existing clients always get a fresh generation
+    res = await client.post("/api/ai/generate/mnemonic", json={"text": notes})
+    assert "x-mnemonic-reused" not in res.headers
+    assert CountingStub.calls == 1
+
+    res = await client.post("/api/ai/generate/mnemonic", json={"text": notes, "allowReuse": True})
+    assert res.status_code == 200
+    assert res.headers["x-mnemonic-reused"] == "public-beta"
+    assert res.json()["story"] == BETA_BLOCKERS["story"]
+    assert res.json()["associations"][0].get("srs") is None
+    assert CountingStub.calls == 1
+
+    # Unrelated notes or another language still generate
+    await client.post("/api/ai/generate/mnemonic", json={"text": "ACE inhibitors cause a dry cough", "allowReuse": True})
+    await client.post("/api/ai/generate/mnemonic", json={"text": notes, "language": "es", "allowReuse": True})
+    assert CountingStub.calls == 3
+
+    # Regenerating asks for a different story, so it never reuses
+    res = await client.post("/api/ai/generate/story", json={"topic": "Beta blockers side effects", "facts": BETA_BLOCKERS["facts"]})
+    assert "x-mnemonic-reused" not in res.headers
+    assert CountingStub.calls == 4
+
+@pytest.mark.asyncio
+async def test_private_stories_are_never_suggested(client: AsyncClient, db_session, stub_ai):
+    user = await get_auth_headers(client, "private_user")
+    await client.post("/api/stories", json=BETA_BLOCKERS, headers=user)
+
+    res = await client.post("/api/ai/similar", json={"facts": BETA_BLOCKERS["facts"]})
+    assert res.json() == []
+
+@pytest.mark.asyncio
+async def test_admin_edits_update_the_index(client: AsyncClient, db_session, stub_ai):
+    admin = await _admin_headers(client, db_session, "curator_edit")
+    await client.post("/api/stories", json=BETA_BLOCKERS, headers=admin)
+    res = await client.post("/api/ai/similar", json={"facts": STATINS["facts"]})
+    assert res.json() == []
+
+    await client.put("/api/stories/public-beta", json=dict(STATINS, id="public-beta"), headers=admin)
+    res = await client.post("/api/ai/similar", json={"facts": STATINS["facts"]})
+    assert [m["id"] for m in res.json()] == ["public-beta"]
+
+@pytest.mark.asyncio
+async def test_index_refresh_skips_story_images(client: AsyncClient, db_session, stub_ai):
+    admin = await _admin_headers(client, db_session, "curator_images")
+    await client.post("/api/stories", json=dict(BETA_BLOCKERS, imageData="data:image/png;base64," + "A" * 1000), headers=admin)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", record)
+    try:
+        res = await client.post("/api/ai/similar", json={"facts": BETA_BLOCKERS["facts"]})
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", record)
+
+    assert [m["id"] for m in res.json()] == ["public-beta"]
+    story_queries = [s for s in statements if "saved_stories" in s]
+    assert story_queries and not any("imageData" in s for s in story_queries)
@@ -0,0 +1,68 @@
+import gzip
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from app import static_files
+
+INDEX = b"<!doctype html><html><body><div id=root></div>" + b"<!-- padding -->" * 100 + b"</body></html>"
+BUNDLE = b"console.log('medmnemonic');" * 200
+
+@pytest.fixture
+def static_root(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(INDEX)
+    (tmp_path / "assets" / "index-BQ3x9Zk1.js").write_bytes(BUNDLE)
+    (tmp_path / "favicon.svg").write_bytes(b"<svg/>")
+    (tmp_path / "screenshot-homepage.png").write_bytes(b"png")  # From public/: looks hashed but isn't
+    return tmp_path
+
+async def spa_client(root):
+    app = FastAPI()
+    static_files.mount_spa(app, str(root))
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+@pytest.mark.asyncio
+async def test_hashed_assets_are_immutable_and_index_revalidates(static_root):
+    async with await spa_client(static_root) as http:
+        asset = await http.get("/assets/index-BQ3x9Zk1.js", headers={"Accept-Encoding": "identity"})
+        assert asset.status_code == 200
+        assert asset.content == BUNDLE
+        assert asset.headers["cache-control"] == static_files.IMMUTABLE
+        assert asset.headers["content-type"].startswith("text/javascript")
+
+        index = await http.get("/")
+        assert index.content == INDEX
+        assert index.headers["cache-control"] == "no-cache"
+        etag = index.headers["etag"]
+
+        cached = await http.get("/", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        # Client-side routes get index.html with the same validator
+        route = await http.get("/library/story-1", headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert route.status_code == 304
+
+        assert (await http.get("/screenshot-homepage.png")).headers["cache-control"] == "no-cache"
+
+        assert (await http.get("/assets/index-OLDBUILD1.js")).status_code == 404
+        assert (await http.get("/api/unknown")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_precompressed_variants_are_negotiated(static_root):
+    assert static_files.precompress(str(static_root)) >= 2
+    assert not (static_root / "favicon.svg.gz").exists()  # Below the size threshold
+    async with await spa_client(static_root) as http:
+        plain = await http.get("/assets/index-BQ3x9Zk1.js", headers={"Accept-Encoding": "identity"})
+        zipped = await http.get("/assets/index-BQ3x9Zk1.js", headers={"Accept-Encoding": "gzip"})
+        refused = await http.get("/assets/index-BQ3x9Zk1.js", headers={"Accept-Encoding": "gzip;q=0"})
+
+    assert "content-encoding" not in plain.headers
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert int(zipped.headers["content-length"]) == len(gzip.compress(BUNDLE, compresslevel=9, mtime=0))
+    assert zipped.content == BUNDLE  # httpx decodes it
+    assert zipped.headers["etag"] != plain.headers["etag"]
+    assert zipped.headers["vary"] == "Accept-Encoding"
+    assert zipped.headers["content-type"].startswith("text/javascript")
+    assert "content-encoding" not in refused.headers
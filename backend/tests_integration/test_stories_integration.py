@@ -96,6 +96,59 @@ async def test_srs_review(client: AsyncClient):
     # ef starts 2.5. updated: 2.5 + (0.1 - (0) * ...) = 2.6
     assert abs(assoc["srs"]["ef"] - 2.6) < 0.01
 
+@pytest.mark.asyncio
+async def test_update_keeps_reviewed_srs(client: AsyncClient):
+    headers = await get_auth_headers(client, "srs_update")
+    story_payload = {
+        "id": "edited-story",
+        "topic": "SRS Topic",
+        "facts": ["F1"],
+        "story": "S1",
+        "associations": [
+            {"medicalTerm": "T1", "character": "C1", "explanation": "E1", "srs": None},
+            {"medicalTerm": "T2", "character": "C2", "explanation": "E2", "srs": None},
+        ],
+        "visualPrompt": "VP",
+        "createdAt": 1000
+    }
+    await client.post("/api/stories", json=story_payload, headers=headers)
+    reviewed = (await client.post("/api/stories/edited-story/review", json={"associationIndex": 0, "quality": 5}, headers=headers)).json()
+
+    # The client saves an edit from its copy made before the review
+    edited = dict(story_payload, topic="Edited")
+    edited["associations"] = [dict(story_payload["associations"][0], character="C1b"), {"medicalTerm": "T3", "character": "C3", "explanation": "E3", "srs": None}]
+    res = await client.put("/api/stories/edited-story", json=edited, headers=headers)
+    assert res.status_code == 200
+
+    story = (await client.get("/api/stories/edited-story", headers=headers)).json()
+    assert story["topic"] == "Edited"
+    assert story["associations"][0]["character"] == "C1b"
+    assert story["associations"][0]["srs"] == reviewed["associations"][0]["srs"]
+    assert story["associations"][1]["medicalTerm"] == "T3"
+
+@pytest.mark.asyncio
+async def test_srs_review_with_fsrs_uses_fitted_weights(client: AsyncClient, db_session, monkeypatch):
+    from app import crud, scheduler
+    monkeypatch.setattr(scheduler, "SRS_SCHEDULER", "fsrs")
+    headers = await get_auth_headers(client, "fsrs")
+    user_id = (await client.get("/api/auth/me", headers=headers)).json()["id"]
+    story_payload = {
+        "id": "fsrs-story", "topic": "T", "facts": ["F"], "story": "S", "visualPrompt": "VP", "createdAt": 1,
+        "associations": [{"medicalTerm": f"T{k}", "character": f"C{k}", "explanation": "E", "srs": None} for k in range(2)],
+    }
+    await client.post("/api/stories", json=story_payload, headers=headers)
+
+    res = await client.post("/api/stories/fsrs-story/review", json={"associationIndex": 0, "quality": 4}, headers=headers)
+    srs = res.json()["associations"][0]["srs"]
+    assert srs["s"] == scheduler.DEFAULT_WEIGHTS[2] and srs["i"] == 4
+    assert (await client.get("/api/stories/fsrs-story", headers=headers)).json()["associations"][0]["srs"] == srs
+
+    weights = list(scheduler.DEFAULT_WEIGHTS)
+    weights[2] = 8.0  # A student who retains "good" first answers longer
+    await crud.save_scheduler_weights(db_session, user_id, weights, reviews=100, loss=0.3)
+    res = await client.post("/api/stories/fsrs-story/review", json={"associationIndex": 1, "quality": 4}, headers=headers)
+    assert res.json()["associations"][1]["srs"]["i"] == 8
+
 @pytest.mark.asyncio
 async def test_delete_story(client: AsyncClient):
     headers = await get_auth_headers(client, "delete")
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from app import reaper, write_queue
+from app.database import get_session_factory
+from app.main import app
+from test_stories_integration import get_auth_headers
+
+ASSOCIATIONS = 12
+REVIEWS_PER_ASSOCIATION = 4
+
+@pytest.fixture
+async def writer(client):
+    queue = write_queue.WriteQueue(app.dependency_overrides[get_session_factory](), max_delay=0.005)
+    task = asyncio.create_task(queue.run())
+    write_queue.writer = queue
+    yield queue
+    write_queue.writer = None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+def story_payload():
+    return {
+        "id": "stress-story", "topic": "Stress", "facts": ["f"], "story": "s", "visualPrompt": "p",
+        "associations": [{"medicalTerm": f"T{i}", "character": f"C{i}", "explanation": "e"} for i in range(ASSOCIATIONS)],
+        "createdAt": 1700000000000,
+    }
+
+@pytest.mark.asyncio
+async def test_parallel_reviews_are_not_lost(client: AsyncClient, writer):
+    headers = await get_auth_headers(client, "stress")
+    assert (await client.post("/api/stories", json=story_payload(), headers=headers)).status_code == 201
+
+    async def review(index):
+        res = await client.post("/api/stories/stress-story/review", json={"associationIndex": index, "quality": 5}, headers=headers)
+        assert res.status_code == 200, res.text
+
+    # Every association reviewed several times, all at once: each review reads and rewrites
+    # the whole associations JSON, so any interleaving outside the writer would drop some
+    await asyncio.gather(*(review(i) for _ in range(REVIEWS_PER_ASSOCIATION) for i in range(ASSOCIATIONS)))
+
+    story = (await client.get("/api/stories/stress-story", headers=headers)).json()
+    assert [a["srs"]["n"] for a in story["associations"]] == [REVIEWS_PER_ASSOCIATION] * ASSOCIATIONS
+    assert writer.jobs >= ASSOCIATIONS * REVIEWS_PER_ASSOCIATION
+    assert writer.batches < writer.jobs  # Commits were grouped
+
+@pytest.mark.asyncio
+async def test_a_failing_job_does_not_fail_its_batch(client: AsyncClient, writer):
+    headers = await get_auth_headers(client, "stress-errors")
+    await client.post("/api/stories", json=story_payload(), headers=headers)
+
+    responses = await asyncio.gather(
+        *(client.post("/api/stories/stress-story/review", json={"associationIndex": 0, "quality": 4}, headers=headers) for _ in range(5)),
+        client.post("/api/stories/missing/review", json={"associationIndex": 0, "quality": 4}, headers=headers),
+        client.post("/api/stories/stress-story/review", json={"associationIndex": 99, "quality": 4}, headers=headers),
+        client.post("/api/auth/guest"),
+    )
+    assert [r.status_code for r in responses] == [200] * 5 + [404, 400, 200]
+    story = (await client.get("/api/stories/stress-story", headers=headers)).json()
+    assert story["associations"][0]["srs"]["n"] == 5
+
+@pytest.mark.asyncio
+async def test_playlist_delete_and_purge_writes_go_through_the_queue(client: AsyncClient, writer):
+    headers = await get_auth_headers(client, "queued-writes")
+    await client.post("/api/stories", json=story_payload(), headers=headers)
+    playlist = (await client.post("/api/playlists", json={"name": "Queued"}, headers=headers)).json()
+    base = f"/api/playlists/{playlist['id']}"
+
+    jobs = writer.jobs
+    requests = [
+        client.post(f"{base}/stories", json={"storyIds": ["stress-story"]}, headers=headers),
+        client.put(f"{base}/order", json={"storyIds": ["stress-story"]}, headers=headers),
+        client.delete(f"{base}/stories/stress-story", headers=headers),
+        client.post(f"{base}/stories/stress-story", headers=headers),
+        client.delete("/api/stories/stress-story", headers=headers),
+        client.delete(base, headers=headers),
+    ]
+    for request in requests:
+        assert (await request).status_code in (200, 204)
+    assert writer.jobs == jobs + len(requests)
+
+    purged = await reaper.purge_deleted(app.dependency_overrides[get_session_factory]())
+    assert purged == 1
+    assert writer.jobs > jobs + len(requests)
@@ -10,7 +10,7 @@ import AuthModal from './components/AuthModal';
 import { generateFullMnemonic, generateMnemonicImage, analyzeImageForBoundingBoxes, generateQuiz } from './services/geminiService';
 import { isDue } from './services/srsService';
 import { auth, stories as storyApi, playlists as playlistApi, curriculum as curriculumApi } from './services/api';
-import { AppState, MnemonicResponse, SavedStory, Language, DailyReviewItem, SRSMetadata, User, Concept } from './types';
+import { AppState, MnemonicResponse, SavedStory, Language, DailyReviewItem, SRSMetadata, User, Concept, QuizQuestion } from './types';
 import ErrorBoundary from './components/ErrorBoundary';
 
 // Using small SVG data URLs as high-quality placeholders for demo images
@@ -432,7 +432,8 @@ const App: React.FC = () => {
     try {
       const dueItems: DailyReviewItem[] = [];
       for (const story of state.savedStories) {
-        const storyQuizzes = await generateQuiz(story, state.language);
+        if (!story.associations.some(assoc => isDue(assoc.srs))) continue;
+        const storyQuizzes: QuizQuestion[] = await storyApi.quiz(story.id, state.language);
         story.associations.forEach((assoc, idx) => {
           if (isDue(assoc.srs)) {
             const q = storyQuizzes.find(sq => sq.associationIndex === idx);
@@ -466,7 +467,11 @@ const App: React.FC = () => {
     if (!state.data) return;
     setState(prev => ({ ...prev, step: 'loading_quiz' }));
     try {
-      const quiz = await generateQuiz(state.data, state.language);
+      // Saved stories are quizzed from their server-side question bank
+      const savedId = (state.data as Partial<SavedStory>).id;
+      const quiz: QuizQuestion[] = savedId && state.savedStories.some(s => s.id === savedId)
+        ? await storyApi.quiz(savedId, state.language)
+        : await generateQuiz(state.data, state.language);
       setState(prev => ({ ...prev, step: 'quiz', quizData: quiz, highlightedIndex: null }));
     } catch (e) {
       console.error("Quiz generation failed", e);
@@ -1,6 +1,16 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { SavedStory, Playlist } from '../types';
 import { isDue } from '../services/srsService';
+import { stories as storiesApi } from '../services/api';
+
+// Renders a server snippet's <mark></mark> highlights without injecting HTML
+const Highlighted: React.FC<{ text: string }> = ({ text }) => (
+    <>
+        {text.split(/<mark>|<\/mark>/).map((part, i) => i % 2 === 1
+            ? <mark key={i} className="bg-amber-100 text-slate-900 rounded px-0.5">{part}</mark>
+            : <React.Fragment key={i}>{part}</React.Fragment>)}
+    </>
+);
 
 interface LibraryProps {
     savedStories: SavedStory[];
@@ -32,18 +42,45 @@ const Library: React.FC<LibraryProps> = ({
     const [newPlaylistName, setNewPlaylistName] = useState('');
     const [selectedPlaylistId, setSelectedPlaylistId] = useState<string | null>(null);
     const [showAddToPlaylist, setShowAddToPlaylist] = useState<string | null>(null); // storyId
+    const [query, setQuery] = useState('');
+    // Ranked server-side search results: story id -> snippet (null when not searching)
+    const [searchHits, setSearchHits] = useState<Map<string, string> | null>(null);
+
+    useEffect(() => {
+        const q = query.trim();
+        if (!q) {
+            setSearchHits(null);
+            return;
+        }
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const res = await storiesApi.search(q, 100);
+                if (!cancelled) setSearchHits(new Map(res.hits.map((h: any) => [h.id, h.snippet])));
+            } catch {
+                // Offline / not signed in: fall back to matching the topic locally
+                const lower = q.toLowerCase();
+                if (!cancelled) setSearchHits(new Map(savedStories.filter(s => s.topic.toLowerCase().includes(lower)).map(s => [s.id, ''])));
+            }
+        }, 250);
+        return () => { cancelled = true; clearTimeout(timer); };
+    }, [query, savedStories]);
 
     const dueCount = savedStories.reduce((acc, story) => {
         return acc + story.associations.filter(a => isDue(a.srs)).length;
     }, 0);
 
-    const filteredStories = selectedPlaylistId
+    const playlistStories = selectedPlaylistId
         ? savedStories.filter(s => {
             const p = playlists.find(pl => pl.id === selectedPlaylistId);
             return p?.story_ids.includes(s.id);
         })
         : savedStories;
 
+    const filteredStories = searchHits
+        ? [...searchHits.keys()].map(id => playlistStories.find(s => s.id === id)).filter((s): s is SavedStory => !!s)
+        : playlistStories;
+
     return (
         <div className="min-h-screen bg-stone-50">
             <div className="bg-white shadow-sm border-b border-stone-200 sticky top-0 z-50">
@@ -126,7 +163,21 @@ const Library: React.FC<LibraryProps> = ({
                     </div>
                 )}
 
-                {filteredStories.length === 0 ? (
+                <div className="mb-6">
+                    <input
+                        type="search"
+                        value={query}
+                        onChange={(e) => setQuery(e.target.value)}
+                        placeholder="Search topics, facts, stories and characters…"
+                        className="w-full px-4 py-3 bg-white border border-stone-200 rounded-xl text-sm shadow-sm focus:ring-2 focus:ring-teal-500 outline-none"
+                    />
+                </div>
+
+                {filteredStories.length === 0 && searchHits ? (
+                    <div className="text-center py-20 bg-white rounded-2xl border border-stone-200 border-dashed">
+                        <h3 className="text-lg font-medium text-slate-900 mb-2">No stories match "{query}"</h3>
+                    </div>
+                ) : filteredStories.length === 0 ? (
                     <div className="text-center py-20 bg-white rounded-2xl border border-stone-200 border-dashed">
                         <h3 className="text-lg font-medium text-slate-900 mb-2">{selectedPlaylistId ? "No stories in this playlist" : t('noSavedStories')}</h3>
                         <p className="text-slate-500 mb-6">{selectedPlaylistId ? "Add some stories from your library." : t('createFirst')}</p>
@@ -150,7 +201,9 @@ const Library: React.FC<LibraryProps> = ({
                                     </div>
                                     <div className="p-6 flex-grow">
                                         <h3 className="text-xl font-bold text-slate-900 mb-3">{story.topic}</h3>
-                                        <p className="text-sm text-slate-600 line-clamp-2 font-serif leading-relaxed mb-4">{story.story}</p>
+                                        <p className="text-sm text-slate-600 line-clamp-2 font-serif leading-relaxed mb-4">
+                                            {searchHits?.get(story.id) ? <Highlighted text={searchHits.get(story.id)!} /> : story.story}
+                                        </p>
                                     </div>
                                     <div className="bg-stone-50 px-6 py-4 border-t border-stone-100 flex flex-col gap-3">
                                         <div className="flex justify-between items-center">
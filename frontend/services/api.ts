@@ -50,6 +50,11 @@ export const stories = {
     delete: (id: string) => request<void>(`/stories/${id}`, { method: 'DELETE' }),
     review: (id: string, index: number, quality: number) =>
         request<any>(`/stories/${id}/review`, { method: 'POST', body: JSON.stringify({ associationIndex: index, quality }) }),
+    // Served from the story's quiz bank; only generates when the bank is empty
+    quiz: (id: string, language: string = 'en') => request<any[]>(`/stories/${id}/quiz?language=${language}`),
+    // Ranked full-text search; snippets wrap matches in <mark></mark>
+    search: (q: string, limit: number = 20, offset: number = 0) =>
+        request<any>(`/stories/search?q=${encodeURIComponent(q)}&limit=${limit}&offset=${offset}`),
 };
 
 export const playlists = {
@@ -5,6 +5,8 @@ export interface SRSMetadata {
   i: number;          // Interval in days
   lastReview: number; // Timestamp
   nextReview: number; // Timestamp
+  s?: number;         // FSRS stability in days (FSRS-scheduled cards only)
+  d?: number;         // FSRS difficulty, 1-10
 }
 
 export interface MnemonicAssociation {
@@ -40,6 +42,7 @@ export interface Playlist {
   description?: string;
   createdAt: number;
   story_ids: string[];
+  story_count?: number;
 }
 
 